@@ -0,0 +1,323 @@
+"""
+Run an ensemble of GridAPPS-D simulations.
+
+A base simulation request (see _simulationRequest in test_TestManager.py) is
+expanded over a parameter grid. Every combination of grid values becomes one
+scenario. Scenarios are submitted to goss.gridappsd.process.request.simulation
+concurrently, up to a configurable limit. The output stream of every scenario
+is written to its own result file and the ensemble throughput is reported in
+scenarios per hour.
+
+The parameter grid is a json object that maps dotted paths in the simulation
+request to lists of values, for example:
+
+    {
+        "simulation_config.model_creation_config.load_scaling_factor": ["0.8", "1.0", "1.2"],
+        "simulation_config.model_creation_config.z_fraction": ["0", "0.5"]
+    }
+
+Scenarios of the same feeder share a model key. The fncs_goss_bridge
+caches compiled measurement maps by the content of the model dictionary, so
+only the first scenario of a model compiles its map. Scenarios are submitted
+grouped by model key so that the cache is warm for the rest of the group.
+
+Usage:
+    python ensemble_runner.py base_request.json grid.json -o results -c 4
+"""
+import argparse
+import copy
+import hashlib
+import itertools
+import json
+import os
+import threading
+import time
+import uuid
+
+import stomp
+
+goss_sim = 'goss.gridappsd.process.request.simulation'
+simulation_output_topic = '/topic/goss.gridappsd.simulation.output.'
+simulation_log_topic = '/topic/goss.gridappsd.simulation.log.'
+reply_queue_prefix = '/temp-queue/ensemble.'
+
+# Simulation log statuses after which the simulation produces no more output.
+finished_statuses = ['COMPLETE', 'CLOSED', 'ERROR']
+
+# Parts of the simulation request that determine the compiled measurement map.
+model_keys = ['power_system_config']
+
+
+def _get_path(request, path):
+    """Return the value at a dotted path in a request, or None."""
+    value = request
+    for key in path.split('.'):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(key)
+    return value
+
+
+def _set_path(request, path, value):
+    """Set the value at a dotted path in a request, creating dictionaries as needed."""
+    keys = path.split('.')
+    target = request
+    for key in keys[:-1]:
+        target = target.setdefault(key, {})
+    target[keys[-1]] = value
+
+
+def expand_grid(base_request, parameter_grid):
+    """Return the list of scenarios for a base request and a parameter grid.
+
+    Function arguments:
+        base_request -- Type: dict. Description: The base simulation request.
+        parameter_grid -- Type: dict. Description: Dotted request paths mapped
+            to lists of values.
+    Function returns:
+        A list of Scenario instances sorted by model key.
+    """
+    paths = sorted(parameter_grid.keys())
+    scenarios = []
+    for number, values in enumerate(itertools.product(*[parameter_grid[p] for p in paths])):
+        request = copy.deepcopy(base_request)
+        for path, value in zip(paths, values):
+            _set_path(request, path, value)
+        scenarios.append(Scenario(number, request, dict(zip(paths, values))))
+    scenarios.sort(key=lambda s: (s.model_key, s.number))
+    return scenarios
+
+
+class Scenario(object):
+    """One simulation request of the ensemble and the state of its run."""
+
+    def __init__(self, number, request, parameters):
+        self.number = number
+        self.request = request
+        self.parameters = parameters
+        self.model_key = hashlib.sha1(json.dumps([_get_path(request, k) for k in model_keys],
+                                                 sort_keys=True).encode('utf-8')).hexdigest()[:12]
+        self.simulation_id = None
+        self.status = 'PENDING'
+        self.error = None
+        self.output_count = 0
+        self.start_time = None
+        self.end_time = None
+        self.finished = threading.Event()
+        self.result_stream = None
+
+    @property
+    def name(self):
+        return 'scenario_{:04d}'.format(self.number)
+
+    def summary(self):
+        return {
+            'name': self.name,
+            'simulation_id': self.simulation_id,
+            'model_key': self.model_key,
+            'parameters': self.parameters,
+            'status': self.status,
+            'error': self.error,
+            'output_messages': self.output_count,
+            'elapsed_seconds': (self.end_time - self.start_time) if self.end_time and self.start_time else None
+        }
+
+
+class EnsembleListener(object):
+    """Dispatch messages from the shared GOSS connection to their scenarios."""
+
+    def __init__(self, runner):
+        self.runner = runner
+
+    def on_message(self, headers, msg):
+        destination = headers.get('destination', '')
+        try:
+            if destination.startswith(reply_queue_prefix):
+                self.runner.on_simulation_id(destination, msg)
+            elif destination.startswith(simulation_output_topic):
+                self.runner.on_output(destination[len(simulation_output_topic):], msg)
+            elif destination.startswith(simulation_log_topic):
+                self.runner.on_log(destination[len(simulation_log_topic):], msg)
+        except Exception as e:
+            print('Error handling message on {}: {}'.format(destination, e))
+
+    def on_error(self, headers, msg):
+        print('ensemble listener error ', msg)
+
+    def on_disconnected(self):
+        self.runner.on_disconnected()
+
+
+class EnsembleRunner(object):
+    """Run scenarios concurrently through the GridAPPS-D process manager."""
+
+    def __init__(self, scenarios, output_dir, max_concurrent=4, scenario_timeout=3600,
+                 username='system', password='manager', goss_server='localhost', stomp_port='61613'):
+        if (goss_server == None or goss_server == ''
+                or type(goss_server) != str):
+            raise ValueError(
+                'goss_server must be a nonempty string.\n'
+                + 'goss_server = {0}'.format(goss_server))
+        if (stomp_port == None or stomp_port == ''
+                or type(stomp_port) != str):
+            raise ValueError(
+                'stomp_port must be a nonempty string.\n'
+                + 'stomp_port = {0}'.format(stomp_port))
+        self.scenarios = scenarios
+        self.output_dir = output_dir
+        self.max_concurrent = max_concurrent
+        self.scenario_timeout = scenario_timeout
+        self.username = username
+        self.password = password
+        self.goss_server = goss_server
+        self.stomp_port = stomp_port
+        self.goss_connection = None
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._lock = threading.Lock()
+        self._by_reply_queue = {}
+        self._by_simulation_id = {}
+        self._subscription_id = 0
+
+    def _subscribe(self, destination):
+        with self._lock:
+            self._subscription_id += 1
+            subscription_id = self._subscription_id
+        self.goss_connection.subscribe(destination, subscription_id)
+
+    def connect(self):
+        self.goss_connection = stomp.Connection12([(self.goss_server, self.stomp_port)])
+        self.goss_connection.set_listener('EnsembleListener', EnsembleListener(self))
+        self.goss_connection.start()
+        self.goss_connection.connect(self.username, self.password, wait=True)
+
+    def run(self):
+        """Run every scenario and return the ensemble summary."""
+        if not os.path.isdir(self.output_dir):
+            os.makedirs(self.output_dir)
+        self.connect()
+        ensemble_start = time.time()
+        workers = []
+        for scenario in self.scenarios:
+            self._slots.acquire()
+            worker = threading.Thread(target=self._run_scenario, args=(scenario,), name=scenario.name)
+            worker.daemon = True
+            worker.start()
+            workers.append(worker)
+        for worker in workers:
+            worker.join()
+        elapsed = time.time() - ensemble_start
+        self.goss_connection.disconnect()
+        return self._write_summary(elapsed)
+
+    def _run_scenario(self, scenario):
+        try:
+            scenario.result_stream = open(os.path.join(self.output_dir, scenario.name + '.json'), 'w')
+            reply_queue = reply_queue_prefix + uuid.uuid4().hex
+            with self._lock:
+                self._by_reply_queue[reply_queue] = scenario
+            self._subscribe(reply_queue)
+            scenario.status = 'SUBMITTED'
+            scenario.start_time = time.time()
+            self.goss_connection.send(body=json.dumps(scenario.request), destination=goss_sim,
+                                      headers={'reply-to': reply_queue})
+            if not scenario.finished.wait(self.scenario_timeout):
+                self._finish(scenario, 'TIMEOUT', 'No completion within {} seconds'.format(self.scenario_timeout))
+        except Exception as e:
+            self._finish(scenario, 'ERROR', str(e))
+        finally:
+            self._slots.release()
+
+    def _finish(self, scenario, status, error=None):
+        with self._lock:
+            if scenario.finished.is_set():
+                return
+            scenario.status = status
+            scenario.error = error
+            scenario.end_time = time.time()
+            if scenario.result_stream is not None:
+                scenario.result_stream.close()
+            scenario.finished.set()
+        print('{} ({}) {} after {:.1f}s with {} output messages'.format(
+            scenario.name, scenario.simulation_id, status,
+            scenario.end_time - (scenario.start_time or scenario.end_time), scenario.output_count))
+
+    def on_simulation_id(self, reply_queue, msg):
+        scenario = self._by_reply_queue.get(reply_queue)
+        if scenario is None or scenario.simulation_id is not None:
+            return
+        simulation_id = str(msg).strip()
+        if not simulation_id.isdigit():
+            self._finish(scenario, 'ERROR', 'Simulation request rejected: {}'.format(msg))
+            return
+        scenario.simulation_id = simulation_id
+        scenario.status = 'RUNNING'
+        with self._lock:
+            self._by_simulation_id[simulation_id] = scenario
+        self._subscribe(simulation_output_topic + simulation_id)
+        self._subscribe(simulation_log_topic + simulation_id)
+
+    def on_output(self, simulation_id, msg):
+        scenario = self._by_simulation_id.get(simulation_id)
+        if scenario is None:
+            return
+        with self._lock:
+            # Checked under the lock, since _finish closes the result stream under it.
+            if scenario.finished.is_set():
+                return
+            scenario.result_stream.write(str(msg).strip() + '\n')
+            scenario.output_count += 1
+
+    def on_log(self, simulation_id, msg):
+        scenario = self._by_simulation_id.get(simulation_id)
+        if scenario is None:
+            return
+        status = json.loads(msg).get('processStatus')
+        if status in finished_statuses:
+            self._finish(scenario, 'COMPLETE' if status != 'ERROR' else 'ERROR',
+                         None if status != 'ERROR' else json.loads(msg).get('logMessage'))
+
+    def on_disconnected(self):
+        for scenario in self.scenarios:
+            self._finish(scenario, 'ERROR', 'Disconnected from GOSS')
+
+    def _write_summary(self, elapsed):
+        completed = [s for s in self.scenarios if s.status == 'COMPLETE']
+        summary = {
+            'scenarios': len(self.scenarios),
+            'completed': len(completed),
+            'failed': len(self.scenarios) - len(completed),
+            'models': len(set(s.model_key for s in self.scenarios)),
+            'max_concurrent': self.max_concurrent,
+            'elapsed_seconds': elapsed,
+            'scenarios_per_hour': len(completed) * 3600.0 / elapsed if elapsed > 0 else 0.0,
+            'results': [s.summary() for s in self.scenarios]
+        }
+        with open(os.path.join(self.output_dir, 'ensemble_summary.json'), 'w') as summary_stream:
+            json.dump(summary, summary_stream, indent=2)
+        print('Ran {} scenarios ({} completed, {} models) in {:.1f}s: {:.1f} scenarios/hour'.format(
+            summary['scenarios'], summary['completed'], summary['models'], elapsed, summary['scenarios_per_hour']))
+        return summary
+
+
+def _get_opts():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("base_request", help="Json file with the base simulation request.")
+    parser.add_argument("parameter_grid", help="Json file mapping dotted request paths to lists of values.")
+    parser.add_argument("-o", "--output_dir", default="ensemble_results", help="Directory for per-scenario results.")
+    parser.add_argument("-c", "--max_concurrent", type=int, default=4, help="Maximum simultaneous simulations.")
+    parser.add_argument("-t", "--timeout", type=int, default=3600, help="Seconds to wait for each scenario.")
+    parser.add_argument("--goss_server", default="127.0.0.1", help="GOSS server address.")
+    parser.add_argument("--stomp_port", default="61613", help="GOSS stomp port.")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    opts = _get_opts()
+    with open(opts.base_request) as base_stream:
+        base_request = json.load(base_stream)
+    with open(opts.parameter_grid) as grid_stream:
+        parameter_grid = json.load(grid_stream)
+    runner = EnsembleRunner(expand_grid(base_request, parameter_grid), opts.output_dir,
+                            max_concurrent=opts.max_concurrent, scenario_timeout=opts.timeout,
+                            goss_server=opts.goss_server, stomp_port=opts.stomp_port)
+    runner.run()
@@ -48,6 +48,7 @@ import com.google.gson.JsonSyntaxException;
 public class FncsBridgeResponse {
 	public long timestamp;
 	public String command;
+	public String simulation_id;
 	public String response;
 	public Map<String,String> output = new HashMap<String, String>();
 	
@@ -64,6 +65,12 @@ public class FncsBridgeResponse {
 	public void setCommand(String command) {
 		this.command = command;
 	}
+	public String getSimulation_id() {
+		return simulation_id;
+	}
+	public void setSimulation_id(String simulation_id) {
+		this.simulation_id = simulation_id;
+	}
 	public String getResponse() {
 		return response;
 	}
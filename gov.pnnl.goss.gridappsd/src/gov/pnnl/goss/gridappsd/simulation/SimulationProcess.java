@@ -141,7 +141,7 @@ public class SimulationProcess extends Thread {
                         true),GridAppsDConstants.username,
                         GridAppsDConstants.topic_platformLog);
 
-                client.publish(GridAppsDConstants.topic_FNCS_input, "{\"command\": \"isInitialized\"}");
+                client.publish(GridAppsDConstants.topic_FNCS_input, "{\"command\": \"isInitialized\", \"simulation_id\": \""+simulationId+"\"}");
                 initAttempts++;
                 Thread.sleep(1000);
 
@@ -184,7 +184,7 @@ public class SimulationProcess extends Thread {
             }
 
             //call to stop the fncs broker
-            client.publish(GridAppsDConstants.topic_FNCS_input, "{\"command\":  \"stop\"}");
+            client.publish(GridAppsDConstants.topic_FNCS_input, "{\"command\":  \"stop\", \"simulation_id\": \""+simulationId+"\"}");
             logManager.log(new LogMessage(this.getClass().getSimpleName(),
                     Integer.toString(simulationId),
                     new Date().getTime(),
@@ -238,7 +238,7 @@ public class SimulationProcess extends Thread {
                 ProcessStatus.RUNNING,
                 true),GridAppsDConstants.username,
                 GridAppsDConstants.topic_platformLog);
-        String message = "{\"command\": \"StartSimulation\"}";
+        String message = "{\"command\": \"StartSimulation\", \"simulation_id\": \""+simulationId+"\"}";
         client.publish(GridAppsDConstants.topic_FNCS_input, message);
     }
 
@@ -293,6 +293,10 @@ public class SimulationProcess extends Thread {
 
                 FncsBridgeResponse responseJson = gson.fromJson(dataResponse.getData().toString(), FncsBridgeResponse.class);
                 log.debug("FNCS output message: "+responseJson);
+                //Bridges of concurrent simulations share the output topic, ignore responses for other simulations
+                if(responseJson.simulation_id!=null && !responseJson.simulation_id.equals(Integer.toString(simulationId))){
+                    return;
+                }
                 if("isInitialized".equals(responseJson.command)){
                     log.debug("FNCS Initialized response: "+responseJson);
                     if("True".equals(responseJson.response)){
@@ -0,0 +1,536 @@
+"""
+Load test the DNP3 outstation with pydnp3 masters on loopback.
+
+The harness starts an OutstationHost with a synthetic point map, connects one
+master to each outstation on a separate DNP3Manager, and runs a scenario:
+
+    integrity  -- every master polls all classes (an integrity poll) back to
+                  back. Reports polls and points per second and the poll
+                  round-trip latency.
+    events     -- the outstations' analog inputs change at --update_rate
+                  updates per second, and the masters poll the event classes
+                  every --poll_interval seconds. Reports the updates applied,
+                  the events received and the event buffer overflows the
+                  outstations signal in their IIN.
+    playback   -- the outstations' analog inputs play back a GridLAB-D player
+                  file (--schedule) every --playback_interval seconds, while
+                  the masters poll the event classes every --poll_interval
+                  seconds. Reports the updates applied and the duration of a
+                  playback tick.
+    client     -- the outstations play back --schedule as in playback, and one
+                  DNP3MasterClient polls all of them on a shared DNP3Manager,
+                  with event polls every --poll_interval seconds and integrity
+                  polls every --integrity_interval seconds. Measurements are
+                  published every --publish_interval seconds to a connection
+                  that only counts them, so no GOSS broker is needed. Reports
+                  the measurements and messages published per second and the
+                  latency from receiving a value to publishing it.
+    commands   -- every master issues SelectAndOperate (or --direct DirectOperate)
+                  commands back to back on the analog and binary outputs.
+                  Reports commands per second and the command round-trip
+                  latency, plus the outstations' command worker statistics.
+    processor  -- no DNP3 stack: Operate commands are passed straight to
+                  Processor.process_point_value, the call opendnp3 makes on
+                  its stack thread, back to back. Reports the commands per
+                  second accepted on the calling thread and processed by the
+                  command worker. With --value_store the processed commands
+                  are persisted to that file, to measure the store's overhead.
+    logging    -- the processor scenario once per LOG_MODES entry: quiet
+                  (warnings only), sampled (debug, with per-point messages
+                  rate-limited), verbose (every message, written on a writer
+                  thread) and verbose_sync (every message, written on the
+                  thread that logs it). The log goes to --log_file. Reports
+                  the commands per second of each mode.
+
+Every scenario also reports the CPU used by the process, which runs both the
+outstations and the masters.
+
+Usage:
+    python benchmark_master.py integrity --outstations 4 --points 1000 --seconds 30
+    python benchmark_master.py events --update_rate 5000 --poll_interval 1
+    python benchmark_master.py playback --points 10000 --playback_speed 60
+    python benchmark_master.py client --outstations 50 --points 1000 --publish_interval 1
+    python benchmark_master.py commands --outstations 10 --direct
+    python benchmark_master.py processor --outputs 1000 --seconds 10
+    python benchmark_master.py processor --value_store /tmp/bench.values
+    python benchmark_master.py logging --seconds 5
+"""
+import argparse
+import logging
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+
+import numpy
+
+from pydnp3 import opendnp3, openpal, asiopal, asiodnp3
+from dnp3.command_worker import CommandWorker
+from dnp3.log_control import AsyncLogHandler, configure_logging
+from dnp3.master_client import DNP3MasterClient
+from dnp3.outstation import MyLogger
+from dnp3.points import PointDefinitions
+from dnp3.value_store import CurrentValueStore
+from start_host import OutstationHost
+from start_service import Processor
+
+_log = logging.getLogger(__name__)
+
+
+# configure_logging() arguments of the logging scenario's modes.
+LOG_MODES = OrderedDict([
+    ('quiet', {'level': logging.WARNING}),
+    ('sampled', {'level': logging.DEBUG}),
+    ('verbose', {'level': logging.DEBUG, 'point_log_rate': None}),
+    ('verbose_sync', {'level': logging.DEBUG, 'point_log_rate': None, 'async_output': False})
+])
+DEFAULT_SCHEDULE = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                 '..', 'etc', 'zipload_schedule.player'))
+
+
+def synthetic_points(point_count, output_count, schedule=None, update_rate=None):
+    """
+        Return a points config with point_count analog inputs (event class 1) and output_count analog and binary outputs.
+        The analog inputs play back schedule, if one is given, at update_rate updates per second, and each is the
+        magnitude of its own measurement.
+    """
+    points = [{'name': 'AI{}'.format(i), 'group': 30, 'variation': 1, 'index': i, 'event_class': 1,
+               'measurement_mrid': '_AI{}'.format(i)}
+              for i in range(point_count)]
+    if schedule:
+        for point in points:
+            point['schedule'] = schedule
+            point['update_rate'] = update_rate
+    points.extend({'name': 'AO{}'.format(i), 'group': 41, 'variation': 1, 'index': i} for i in range(output_count))
+    points.extend({'name': 'BO{}'.format(i), 'group': 12, 'variation': 1, 'index': i} for i in range(output_count))
+    return points
+
+
+def percentiles(latencies):
+    """Return the 50th, 90th, 99th percentile and maximum of a list of latencies, in milliseconds."""
+    if not latencies:
+        return None
+    p50, p90, p99, p100 = numpy.percentile(numpy.array(latencies) * 1000.0, [50, 90, 99, 100])
+    return {'p50_ms': float(p50), 'p90_ms': float(p90), 'p99_ms': float(p99), 'max_ms': float(p100)}
+
+
+class CountingSOEHandler(opendnp3.ISOEHandler):
+    """Count the measurements a master receives."""
+
+    def __init__(self):
+        super(CountingSOEHandler, self).__init__()
+        self.value_count = 0
+
+    def Process(self, info, values):
+        self.value_count += values.Count()
+
+    def Start(self):
+        pass
+
+    def End(self):
+        pass
+
+
+class LoadMasterApplication(opendnp3.IMasterApplication):
+    """Signal completed user tasks and count the event buffer overflows reported by the outstation."""
+
+    def __init__(self):
+        super(LoadMasterApplication, self).__init__()
+        self.task_complete = threading.Event()
+        self.overflow_count = 0
+
+    def AssignClassDuringStartup(self):
+        return False
+
+    def OnClose(self):
+        pass
+
+    def OnOpen(self):
+        pass
+
+    def OnReceiveIIN(self, iin):
+        if iin.IsSet(opendnp3.IINBit.EVENT_BUFFER_OVERFLOW):
+            self.overflow_count += 1
+
+    def OnTaskComplete(self, info):
+        if info.type == opendnp3.MasterTaskType.USER_TASK:
+            self.task_complete.set()
+
+    def OnTaskStart(self, type, id):
+        pass
+
+
+class LoadMaster(object):
+    """One master channel connected to one outstation."""
+
+    def __init__(self, manager, name, port, link_remote_addr, response_timeout=5):
+        self.name = name
+        self.soe_handler = CountingSOEHandler()
+        self.application = LoadMasterApplication()
+        self.latencies = []
+        self.operations = 0
+        self.failures = 0
+        self.channel = manager.AddTCPClient('{}-client'.format(name),
+                                            opendnp3.levels.NORMAL,
+                                            asiopal.ChannelRetry().Default(),
+                                            '127.0.0.1',
+                                            '0.0.0.0',
+                                            port,
+                                            asiodnp3.PrintingChannelListener().Create())
+        stack_config = asiodnp3.MasterStackConfig()
+        stack_config.master.responseTimeout = openpal.TimeDuration().Seconds(response_timeout)
+        stack_config.master.disableUnsolOnStartup = True
+        stack_config.link.LocalAddr = 1
+        stack_config.link.RemoteAddr = link_remote_addr
+        self.master = self.channel.AddMaster(name, self.soe_handler, self.application, stack_config)
+        self.master.Enable()
+
+    def poll(self, class_field, timeout):
+        """Run one class poll and wait for it to complete. Return False if it timed out."""
+        self.application.task_complete.clear()
+        start = time.time()
+        self.master.ScanClasses(class_field, opendnp3.TaskConfig().Default())
+        if not self.application.task_complete.wait(timeout):
+            self.failures += 1
+            return False
+        self.latencies.append(time.time() - start)
+        self.operations += 1
+        return True
+
+    def operate(self, command, index, direct, timeout):
+        """Send one command and wait for its result. Return False if it failed or timed out."""
+        done = threading.Event()
+        results = []
+
+        def on_result(result):
+            results.append(result.summary)
+            done.set()
+
+        start = time.time()
+        if direct:
+            self.master.DirectOperate(command, index, on_result, opendnp3.TaskConfig().Default())
+        else:
+            self.master.SelectAndOperate(command, index, on_result, opendnp3.TaskConfig().Default())
+        if not done.wait(timeout) or results[0] != opendnp3.TaskCompletion.SUCCESS:
+            self.failures += 1
+            return False
+        self.latencies.append(time.time() - start)
+        self.operations += 1
+        return True
+
+    def shutdown(self):
+        self.master.Disable()
+        self.channel.Shutdown()
+
+
+class CountingConnection(object):
+    """Stand in for a stomp connection, counting the messages and bytes sent."""
+
+    def __init__(self):
+        self.message_count = 0
+        self.byte_count = 0
+
+    def send(self, destination, body):
+        self.message_count += 1
+        self.byte_count += len(body)
+
+
+class LoadGenerator(object):
+    """An OutstationHost and the masters polling it."""
+
+    def __init__(self, outstation_count, point_count, output_count, threads_to_allocate=2, base_port=20000,
+                 database_sizes=None, event_buffers=None, schedule=None, playback_speed=1.0, playback_interval=1.0):
+        outstation_config = {'link_local_addr': 10, 'link_remote_addr': 1}
+        if database_sizes:
+            outstation_config['database_sizes'] = database_sizes
+        if event_buffers:
+            outstation_config['event_buffers'] = event_buffers
+        self.host = OutstationHost({
+            'threads_to_allocate': threads_to_allocate,
+            'outstations': [{
+                'name': 'bench',
+                'count': outstation_count,
+                'port': base_port,
+                'points': synthetic_points(point_count, output_count, schedule, 1.0 / playback_interval),
+                'outstation': outstation_config,
+                'playback_speed': playback_speed,
+                'playback_interval': playback_interval
+            }]
+        })
+        self.point_count = point_count
+        self.output_count = output_count
+        self.threads_to_allocate = threads_to_allocate
+        self.master_manager = None
+        self.masters = []
+
+    def start(self, connect_wait=2.0, masters=True):
+        """Start the host and, unless masters is False, one LoadMaster per outstation."""
+        self.host.start()
+        if not masters:
+            return
+        self.master_manager = asiodnp3.DNP3Manager(self.threads_to_allocate, MyLogger())
+        # An outstation's TCP server accepts one connection, so each outstation gets one master.
+        for outstation in self.host.outstations:
+            self.masters.append(LoadMaster(self.master_manager, '{}-master'.format(outstation.name), outstation.port,
+                                           outstation.get_outstation_config().get('link_local_addr', 10)))
+        time.sleep(connect_wait)
+
+    def shutdown(self):
+        for master in self.masters:
+            master.shutdown()
+        if self.master_manager is not None:
+            self.master_manager.Shutdown()
+            self.master_manager = None
+        self.host.shutdown()
+
+    def run_masters(self, seconds, work):
+        """Call work(master) back to back on a thread per master for a number of seconds."""
+        deadline = time.time() + seconds
+
+        def run(master):
+            while time.time() < deadline:
+                work(master)
+
+        threads = [threading.Thread(target=run, args=(master,), name=master.name) for master in self.masters]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def integrity(self, seconds, timeout=10):
+        class_field = opendnp3.ClassField().AllClasses()
+        self.run_masters(seconds, lambda master: master.poll(class_field, timeout))
+        points = sum(master.soe_handler.value_count for master in self.masters)
+        return {'polls': sum(master.operations for master in self.masters),
+                'points_per_second': points / float(seconds)}
+
+    def events(self, seconds, update_rate, poll_interval, timeout=10):
+        """Change analog inputs at update_rate per outstation while the masters poll the event classes."""
+        stop = threading.Event()
+        applied = [0]
+
+        def update():
+            batch = max(1, int(update_rate / 100))
+            while not stop.is_set():
+                for outstation in self.host.outstations:
+                    applied[0] += outstation.apply_updates(
+                        [(opendnp3.Analog(random.random()), random.randrange(self.point_count)) for _ in range(batch)])
+                time.sleep(batch / float(update_rate))
+
+        updater = threading.Thread(target=update, name='updater')
+        updater.start()
+        class_field = opendnp3.ClassField().AllEventClasses()
+
+        def poll(master):
+            started = time.time()
+            master.poll(class_field, timeout)
+            time.sleep(max(0.0, poll_interval - (time.time() - started)))
+
+        try:
+            self.run_masters(seconds, poll)
+        finally:
+            stop.set()
+            updater.join()
+        return {'polls': sum(master.operations for master in self.masters),
+                'updates_per_second': applied[0] / float(seconds),
+                'events_per_second': sum(master.soe_handler.value_count for master in self.masters) / float(seconds),
+                'event_buffer_overflows': sum(master.application.overflow_count for master in self.masters),
+                'outstation_poll_window_overruns': sum(sum(outstation.poll_window_overrun_counts().values())
+                                                       for outstation in self.host.outstations)}
+
+    def playback(self, seconds, poll_interval, timeout=10):
+        """Let the outstations play back their schedules while the masters poll the event classes."""
+        class_field = opendnp3.ClassField().AllEventClasses()
+
+        def poll(master):
+            started = time.time()
+            master.poll(class_field, timeout)
+            time.sleep(max(0.0, poll_interval - (time.time() - started)))
+
+        start_updates = sum(player.update_count for player in self.host.players)
+        self.run_masters(seconds, poll)
+        updates = sum(player.update_count for player in self.host.players) - start_updates
+        return {'polls': sum(master.operations for master in self.masters),
+                'updates_per_second': updates / float(seconds),
+                'events_per_second': sum(master.soe_handler.value_count for master in self.masters) / float(seconds),
+                'playback': [player.playback_stats() for player in self.host.players]}
+
+    def client(self, seconds, poll_interval, integrity_interval, publish_interval, connect_wait=2.0):
+        """Poll the outstations with one DNP3MasterClient while they play back their schedules."""
+        connection = CountingConnection()
+        points = self.host.host_config['outstations'][0]['points']
+        client = DNP3MasterClient({
+            'threads_to_allocate': self.threads_to_allocate,
+            'simulation_id': 'benchmark',
+            'publish_interval': publish_interval,
+            'devices': [{
+                'name': '{}-device'.format(outstation.name),
+                'port': outstation.port,
+                'points': points,
+                'mrid_prefix': '{}_'.format(outstation.name),
+                'integrity_interval': integrity_interval,
+                'event_interval': poll_interval,
+                'master': {'link_remote_addr': outstation.get_outstation_config().get('link_local_addr', 10)}
+            } for outstation in self.host.outstations]
+        }, connection=connection)
+        client.start()
+        try:
+            time.sleep(connect_wait)
+            start_stats = client.publish_stats()
+            start_updates = sum(player.update_count for player in self.host.players)
+            time.sleep(seconds)
+            stats = client.publish_stats()
+            updates = sum(player.update_count for player in self.host.players) - start_updates
+        finally:
+            client.shutdown()
+        messages = stats['messages'] - start_stats['messages']
+        return {'updates_per_second': updates / float(seconds),
+                'measurements_per_second': (stats['measurements'] - start_stats['measurements']) / float(seconds),
+                'messages_per_second': messages / float(seconds),
+                'bytes_per_message': connection.byte_count / float(connection.message_count or 1),
+                'client': stats}
+
+    def commands(self, seconds, direct, timeout=10):
+        def operate(master):
+            index = random.randrange(self.output_count)
+            if random.random() < 0.5:
+                command = opendnp3.AnalogOutputInt32(random.randrange(1000))
+            else:
+                command = opendnp3.ControlRelayOutputBlock(opendnp3.ControlCode.LATCH_ON)
+            master.operate(command, index, direct, timeout)
+
+        self.run_masters(seconds, operate)
+        self.host.command_worker.wait_until_idle()
+        return {'commands_per_second': sum(master.operations for master in self.masters) / float(seconds),
+                'command_worker': self.host.command_worker.stats()}
+
+    def report(self, scenario, seconds, results, cpu):
+        results['scenario'] = scenario
+        results['outstations'] = len(self.host.outstations)
+        results['masters'] = len(self.masters)
+        results['failures'] = sum(master.failures for master in self.masters)
+        results['latency'] = percentiles([latency for master in self.masters for latency in master.latencies])
+        results['cores_used'] = cpu / seconds
+        _log.info('Benchmark results: {}'.format(results))
+        return results
+
+
+def processor_commands(seconds, output_count, value_store_path=None):
+    """Call Processor.process_point_value with Operate commands for a number of seconds, then wait for the worker."""
+    point_definitions = PointDefinitions()
+    point_definitions.load_points(synthetic_points(0, output_count))
+    value_store = CurrentValueStore(value_store_path) if value_store_path else None
+    # An unbounded queue, so commands the worker hasn't caught up with aren't rejected.
+    processor = Processor(point_definitions, CommandWorker(max_queue_size=0), value_store=value_store)
+    processor.warm_start()
+    processor.command_worker.start()
+    commands = [(opendnp3.AnalogOutputInt32(i), i) for i in range(output_count)]
+    commands.extend((opendnp3.ControlRelayOutputBlock(opendnp3.ControlCode.LATCH_ON), i) for i in range(output_count))
+    op_type = opendnp3.OperateType.DirectOperate
+    submitted = 0
+    start = time.time()
+    deadline = start + seconds
+    try:
+        while time.time() < deadline:
+            for command, index in commands:
+                processor.process_point_value('Operate', command, index, op_type)
+            submitted += len(commands)
+        elapsed = time.time() - start
+        processor.command_worker.wait_until_idle()
+        processed_elapsed = time.time() - start
+    finally:
+        processor.command_worker.stop()
+        if value_store is not None:
+            value_store.stop()
+    results = {'commands_per_second': submitted / elapsed,
+               'processed_per_second': processor.command_worker.processed_count / processed_elapsed,
+               'command_worker': processor.command_worker.stats()}
+    if value_store is not None:
+        results['value_store'] = value_store.stats()
+    return results
+
+
+def logging_modes(seconds, output_count, log_file=os.devnull):
+    """Run processor_commands once per LOG_MODES entry, logging to log_file. Return the results of each mode."""
+    results = OrderedDict()
+    try:
+        with open(log_file, 'a') as stream:
+            for mode, settings in LOG_MODES.items():
+                handler = configure_logging(stream=stream, **settings)
+                start_cpu = sum(os.times()[:2])
+                mode_results = processor_commands(seconds, output_count)
+                results[mode] = {'commands_per_second': mode_results['commands_per_second'],
+                                 'processed_per_second': mode_results['processed_per_second'],
+                                 'cores_used': (sum(os.times()[:2]) - start_cpu) / seconds}
+                if isinstance(handler, AsyncLogHandler):
+                    handler.flush()
+                    results[mode]['dropped_log_records'] = handler.dropped_total
+    finally:
+        configure_logging(logging.INFO)
+    return results
+
+
+def run_scenario(args):
+    if args.scenario == 'logging':
+        results = logging_modes(args.seconds, args.outputs, args.log_file)
+        _log.info('Benchmark results: {}'.format(dict(results, scenario=args.scenario)))
+        return results
+    if args.scenario == 'processor':
+        start_cpu = sum(os.times()[:2])
+        results = processor_commands(args.seconds, args.outputs, args.value_store)
+        results['scenario'] = args.scenario
+        results['cores_used'] = (sum(os.times()[:2]) - start_cpu) / args.seconds
+        _log.info('Benchmark results: {}'.format(results))
+        return results
+    generator = LoadGenerator(args.outstations, args.points, args.outputs, threads_to_allocate=args.threads,
+                              base_port=args.port, database_sizes=args.database_sizes,
+                              event_buffers=args.event_buffers,
+                              schedule=args.schedule if args.scenario in ('playback', 'client') else None,
+                              playback_speed=args.playback_speed, playback_interval=args.playback_interval)
+    generator.start(masters=args.scenario != 'client')
+    try:
+        start_cpu = sum(os.times()[:2])
+        if args.scenario == 'integrity':
+            results = generator.integrity(args.seconds)
+        elif args.scenario == 'events':
+            results = generator.events(args.seconds, args.update_rate, args.poll_interval)
+        elif args.scenario == 'playback':
+            results = generator.playback(args.seconds, args.poll_interval)
+        elif args.scenario == 'client':
+            results = generator.client(args.seconds, args.poll_interval, args.integrity_interval,
+                                       args.publish_interval)
+        else:
+            results = generator.commands(args.seconds, args.direct)
+        return generator.report(args.scenario, args.seconds, results, sum(os.times()[:2]) - start_cpu)
+    finally:
+        generator.shutdown()
+
+
+if __name__ == '__main__':
+    # Per-point debug logging would dominate the measurements.
+    configure_logging(logging.INFO)
+    parser = argparse.ArgumentParser()
+    parser.add_argument('scenario', choices=['integrity', 'events', 'playback', 'client', 'commands', 'processor',
+                                             'logging'])
+    parser.add_argument('--outstations', type=int, default=1, help="Number of outstations.")
+    parser.add_argument('--points', type=int, default=1000, help="Analog inputs per outstation.")
+    parser.add_argument('--outputs', type=int, default=100, help="Analog and binary outputs per outstation.")
+    parser.add_argument('--seconds', type=float, default=30, help="Scenario duration.")
+    parser.add_argument('--threads', type=int, default=2, help="Threads of each DNP3Manager.")
+    parser.add_argument('--port', type=int, default=20000, help="Port of the first outstation.")
+    parser.add_argument('--database_sizes', type=int, help="Outstation database size.")
+    parser.add_argument('--event_buffers', type=int, help="Outstation event buffer size.")
+    parser.add_argument('--update_rate', type=float, default=1000, help="Input updates per second per outstation.")
+    parser.add_argument('--poll_interval', type=float, default=1.0, help="Seconds between event polls.")
+    parser.add_argument('--integrity_interval', type=float, default=60,
+                        help="Client scenario: seconds between integrity polls.")
+    parser.add_argument('--publish_interval', type=float, default=1.0,
+                        help="Client scenario: seconds between published measurement messages.")
+    parser.add_argument('--schedule', default=DEFAULT_SCHEDULE, help="Player file of the playback scenario.")
+    parser.add_argument('--playback_speed', type=float, default=60, help="Schedule seconds played per second.")
+    parser.add_argument('--playback_interval', type=float, default=1.0, help="Seconds between playback ticks.")
+    parser.add_argument('--direct', action='store_true', help="Use DirectOperate instead of SelectAndOperate.")
+    parser.add_argument('--value_store', help="Processor scenario: persist current values to this file.")
+    parser.add_argument('--log_file', default=os.devnull, help="Logging scenario: the file to log to.")
+    run_scenario(parser.parse_args())
@@ -0,0 +1,126 @@
+"""
+Process Master commands off the DNP3 stack thread.
+
+opendnp3 calls OutstationCommandHandler.Select and Operate on a thread of the
+DNP3Manager, and the channels served by that thread wait while they run. The
+Processor only validates a command there: it looks up the point definition,
+copies the command's values (the opendnp3 command object is valid only during
+the callback) and returns a CommandStatus. It then submits the Operate to a
+CommandWorker, which builds the PointValue, updates the cached values and
+selector blocks and notifies the command listeners on its own thread.
+
+One CommandWorker can serve the Processors of many outstations. Commands are
+processed in the order they were submitted.
+"""
+import logging
+import threading
+import time
+
+try:
+    from Queue import Queue, Full
+except ImportError:
+    from queue import Queue, Full
+
+DEFAULT_MAX_QUEUE_SIZE = 10000
+
+_log = logging.getLogger(__name__)
+
+
+class CommandWorker(object):
+    """A queue of submitted commands and the thread that processes them."""
+
+    def __init__(self, name='dnp3-commands', max_queue_size=DEFAULT_MAX_QUEUE_SIZE):
+        """
+        :param name: The name of the worker thread.
+        :param max_queue_size: The number of commands that can wait for processing, 0 for no limit.
+        """
+        self.name = name
+        self._queue = Queue(max_queue_size)
+        self._thread = None
+        self.processed_count = 0
+        self.failed_count = 0
+        self.rejected_count = 0
+        self.max_queue_depth = 0
+        self.last_latency = None
+        self.max_latency = 0.0
+        self._total_latency = 0.0
+
+    def start(self):
+        """Start the worker thread, if it isn't already running."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name=self.name)
+            self._thread.daemon = True
+            self._thread.start()
+
+    def stop(self, timeout=None):
+        """Process the commands that are already queued, then stop the worker thread."""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout)
+            self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    @property
+    def queue_depth(self):
+        """Return the number of commands waiting for processing."""
+        return self._queue.qsize()
+
+    def submit(self, process, *args):
+        """
+            Queue a command for processing. This doesn't block.
+
+        :param process: The function that processes the command, called on the worker thread with args.
+        :return: False if the queue is full and the command was rejected.
+        """
+        try:
+            self._queue.put_nowait((time.time(), process, args))
+        except Full:
+            self.rejected_count += 1
+            return False
+        depth = self._queue.qsize()
+        if depth > self.max_queue_depth:
+            self.max_queue_depth = depth
+        return True
+
+    def wait_until_idle(self):
+        """Block until every submitted command has been processed."""
+        self._queue.join()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                submitted, process, args = item
+                try:
+                    process(*args)
+                    self.processed_count += 1
+                except Exception as err:
+                    self.failed_count += 1
+                    _log.error('Error processing DNP3 command: {}'.format(err))
+                self._record_latency(time.time() - submitted)
+            finally:
+                self._queue.task_done()
+
+    def _record_latency(self, latency):
+        self.last_latency = latency
+        self.max_latency = max(self.max_latency, latency)
+        self._total_latency += latency
+
+    def stats(self):
+        """Return the queue depth and the command latency, from submission until processed, in seconds."""
+        completed = self.processed_count + self.failed_count
+        return {
+            'queue_depth': self.queue_depth,
+            'max_queue_depth': self.max_queue_depth,
+            'processed': self.processed_count,
+            'failed': self.failed_count,
+            'rejected': self.rejected_count,
+            'last': self.last_latency,
+            'mean': self._total_latency / completed if completed else None,
+            'max': self.max_latency
+        }
@@ -0,0 +1,191 @@
+"""
+Report-by-exception filtering of DNP3 input point updates.
+
+Every update applied to the outstation database becomes an event in its event
+buffers, whether or not the value changed. DeadbandFilter drops updates that
+are not significant before they reach the stack:
+
+    - Analog inputs with a deadband are reported when they move more than
+      deadband (deadband_type 'absolute') or more than deadband percent of the
+      last reported value (deadband_type 'percent').
+    - Binary inputs with a deadband (of any value) are reported when they change.
+    - Points without a deadband, and the first update of every point, are
+      always reported.
+
+Last reported values, deadbands and suppression counts are kept in arrays
+indexed by DNP3 index, so a batch of updates is filtered in one NumPy pass.
+
+One DeadbandFilter is shared by everything that updates an outstation's input
+points (the simulation feeder, the schedule player and the Processor), each
+on its own thread, so filtering and reloading hold the filter's lock. The
+Processor records a batch as reported only after the outstation applied it, so
+a batch the outstation rejects is reported again when it is resent.
+"""
+import logging
+import threading
+
+import numpy
+
+from dnp3.points import DEADBAND_PERCENT, POINT_TYPE_ANALOG_INPUT, POINT_TYPE_BINARY_INPUT
+
+_log = logging.getLogger(__name__)
+
+
+class PointTypeDeadbands(object):
+    """Deadbands and last reported values of the input points of one point type, indexed by DNP3 index."""
+
+    def __init__(self, point_defs, change_only=False):
+        """
+        :param point_defs: The PointDefinitions of the point type.
+        :param change_only: Treat every configured deadband as 0 (report any change).
+        """
+        size = max([pt.index for pt in point_defs] or [-1]) + 1
+        # NaN deadband: the point is always reported.
+        self.deadbands = numpy.full(size, numpy.nan)
+        self.percent = numpy.zeros(size, dtype=bool)
+        self.last_reported = numpy.full(size, numpy.nan)
+        self.suppressed = numpy.zeros(size, dtype=numpy.int64)
+        for pt in point_defs:
+            if pt.deadband is not None:
+                self.deadbands[pt.index] = 0.0 if change_only else pt.deadband
+                self.percent[pt.index] = not change_only and pt.deadband_type == DEADBAND_PERCENT
+
+    def significant(self, indexes, values, record=True):
+        """
+            Return a boolean mask of the updates that should be reported.
+
+        :param indexes: An integer array of DNP3 indexes. An index must not repeat within one call.
+        :param values: A float array of values.
+        :param record: Record the reported and suppressed updates now. Otherwise call record() once they are applied.
+        """
+        mask = numpy.ones(len(indexes), dtype=bool)
+        in_range = numpy.flatnonzero(indexes < len(self.deadbands))
+        deadbands = self.deadbands[indexes[in_range]]
+        last = self.last_reported[indexes[in_range]]
+        threshold = numpy.where(self.percent[indexes[in_range]], deadbands * numpy.abs(last) / 100.0, deadbands)
+        # Comparisons with NaN are False, so points without a deadband or a reported value are never suppressed.
+        mask[in_range] = ~(numpy.abs(values[in_range] - last) <= threshold)
+        if record:
+            self.record(indexes, values, mask)
+        return mask
+
+    def record(self, indexes, values, mask):
+        """
+            Record the updates of a mask returned by significant() as reported or suppressed.
+
+        :param indexes: The integer array of DNP3 indexes passed to significant().
+        :param values: The float array of values passed to significant().
+        :param mask: The mask significant() returned.
+        """
+        in_range = indexes < len(self.deadbands)
+        self.suppressed[indexes[in_range & ~mask]] += 1
+        reported = in_range & mask
+        self.last_reported[indexes[reported]] = values[reported]
+
+
+class DeadbandFilter(object):
+    """Drop input point updates that are inside their point's deadband."""
+
+    def __init__(self, point_definitions):
+        """
+        :param point_definitions: The outstation's PointDefinitions.
+        """
+        points_by_type = {POINT_TYPE_ANALOG_INPUT: [], POINT_TYPE_BINARY_INPUT: []}
+        for point_def in point_definitions.iter_points():
+            if point_def.point_type in points_by_type:
+                points_by_type[point_def.point_type].append(point_def)
+        self.point_types = {
+            POINT_TYPE_ANALOG_INPUT: PointTypeDeadbands(points_by_type[POINT_TYPE_ANALOG_INPUT]),
+            POINT_TYPE_BINARY_INPUT: PointTypeDeadbands(points_by_type[POINT_TYPE_BINARY_INPUT], change_only=True)
+        }
+        self._lock = threading.Lock()
+
+    def significant(self, point_type, indexes, values, record=True):
+        """
+            Return a boolean mask of the updates of one point type that should be reported.
+
+        :param point_type: A point type (string). Updates of other than input point types are always reported.
+        :param indexes: An integer array of DNP3 indexes.
+        :param values: A float array of values (binaries as 0 or 1).
+        :param record: Record the updates as reported or suppressed now. Pass False to record them with
+            record_updates() only once they have been applied.
+        """
+        indexes = numpy.asarray(indexes, dtype=numpy.int64)
+        values = numpy.asarray(values, dtype=numpy.float64)
+        with self._lock:
+            deadbands = self.point_types.get(point_type, None)
+            if deadbands is None:
+                return numpy.ones(len(indexes), dtype=bool)
+            return deadbands.significant(indexes, values, record)
+
+    def significant_updates(self, updates, record=True):
+        """
+            Return a list of booleans, one per update, that is True for the updates that should be reported.
+
+        :param updates: A list of (point_type, index, value) tuples.
+        :param record: Record the updates as reported or suppressed now. Pass False to record them with
+            record_updates() only once they have been applied.
+        """
+        keep = [True] * len(updates)
+        for point_type, positions in self._positions_by_type(updates).items():
+            mask = self.significant(point_type,
+                                    [updates[p][1] for p in positions],
+                                    [float(updates[p][2]) for p in positions],
+                                    record)
+            for position, significant in zip(positions, mask.tolist()):
+                keep[position] = significant
+        return keep
+
+    def record_updates(self, updates, keep):
+        """
+            Record applied updates as reported or suppressed.
+
+        :param updates: The list of (point_type, index, value) tuples passed to significant_updates(record=False).
+        :param keep: The list of booleans it returned.
+        """
+        with self._lock:
+            for point_type, positions in self._positions_by_type(updates).items():
+                self.point_types[point_type].record(numpy.array([updates[p][1] for p in positions], dtype=numpy.int64),
+                                                    numpy.array([float(updates[p][2]) for p in positions]),
+                                                    numpy.array([keep[p] for p in positions], dtype=bool))
+
+    def _positions_by_type(self, updates):
+        """Return the positions of the input point updates in a list of updates, by point type."""
+        positions_by_type = {}
+        for position, (point_type, index, value) in enumerate(updates):
+            if point_type in self.point_types:
+                positions_by_type.setdefault(point_type, []).append(position)
+        return positions_by_type
+
+    def reload(self, point_definitions, diff):
+        """
+            Rebuild the deadbands from reloaded PointDefinitions.
+
+            Points that the reload did not touch keep their last reported value and suppression count.
+
+        :param point_definitions: The reloaded PointDefinitions.
+        :param diff: The PointDefinitionsDiff of the reload.
+        """
+        point_types = DeadbandFilter(point_definitions).point_types
+        with self._lock:
+            for point_type, deadbands in point_types.items():
+                old = self.point_types[point_type]
+                kept = min(len(old.last_reported), len(deadbands.last_reported))
+                deadbands.last_reported[:kept] = old.last_reported[:kept]
+                deadbands.suppressed[:kept] = old.suppressed[:kept]
+                reset = [index for index in diff.affected_indexes(point_type)
+                         if index < len(deadbands.last_reported)]
+                deadbands.last_reported[reset] = numpy.nan
+                deadbands.suppressed[reset] = 0
+            self.point_types = point_types
+
+    def suppression_counts(self):
+        """Return the number of suppressed updates, by point type."""
+        with self._lock:
+            return dict((point_type, int(deadbands.suppressed.sum()))
+                        for point_type, deadbands in self.point_types.items())
+
+    def suppressed_count(self, point_type, index):
+        """Return the number of suppressed updates of one point."""
+        suppressed = self.point_types[point_type].suppressed
+        return int(suppressed[index]) if index < len(suppressed) else 0
@@ -0,0 +1,172 @@
+"""
+Publish Master Operate commands to a GridAPPS-D simulation.
+
+Output points name the CIM object and attribute that an Operate changes in
+the points config:
+
+    - name: "Switch.SW1.Open"
+      group: 12
+      variation: 1
+      index: 3
+      control_mrid: "_2e5a3c8f-4b61-4d1c-8e0e-3f1b7a9d6c22"
+      control_attribute: "Switch.open"
+
+    - name: "Regulator.REG1.Step"
+      group: 41
+      variation: 1
+      index: 0
+      control_mrid: "_8d1e4f2a-9c3b-4a7e-b5d6-1f0c2e3a4b5c"
+      control_attribute: "TapChanger.step"
+
+The point to (mRID, attribute) mapping is compiled when the publisher is
+created, and again when the point definitions are reloaded. Binary outputs send 1 for LATCH_ON and 0 otherwise. Analog outputs
+send the operated value divided by the point's scaling_multiplier, the inverse
+of the scaling applied to input points.
+
+Operates that arrive within batch_window seconds of the first one are sent as
+one difference message on the simulation input topic, so a master that issues
+many controls in one scan produces one bus message. Later operates of the same
+object attribute within the window replace earlier ones.
+"""
+import json
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+import stomp
+
+SIMULATION_INPUT_TOPIC = '/topic/goss.gridappsd.simulation.input.'
+DEFAULT_BATCH_WINDOW = 0.1
+
+_log = logging.getLogger(__name__)
+
+
+class ForwardDifferencePublisher(object):
+    """Translate processed Operate PointValues into batched forward_differences messages."""
+
+    def __init__(self, point_definitions, simulation_id, goss_server='127.0.0.1', stomp_port='61613',
+                 username='system', password='manager', batch_window=DEFAULT_BATCH_WINDOW):
+        """
+        :param point_definitions: The outstation's PointDefinitions.
+        :param simulation_id: The id of the simulation to control.
+        :param batch_window: Seconds to collect operates before publishing them, 0 to publish each one immediately.
+        """
+        self.controls = {}
+        self.reload(point_definitions)
+        self.simulation_id = simulation_id
+        self.goss_server = goss_server
+        self.stomp_port = stomp_port
+        self.username = username
+        self.password = password
+        self.batch_window = batch_window
+        self.connection = None
+        self.message_count = 0
+        self.difference_count = 0
+        self._pending = OrderedDict()
+        self._last_values = {}
+        self._timer = None
+        self._lock = threading.Lock()
+        _log.info('Mapped {} output points to simulation {} controls'.format(len(self.controls), simulation_id))
+
+    def reload(self, point_definitions):
+        """Compile the control mapping of (reloaded) PointDefinitions."""
+        controls = {}
+        for point_def in point_definitions.iter_points():
+            if point_def.control_mrid is None or point_def.is_array:
+                continue
+            controls[(point_def.point_type, point_def.index)] = (point_def.control_mrid,
+                                                                 point_def.control_attribute,
+                                                                 point_def.scaling_multiplier)
+        self.controls = controls
+
+    def start(self):
+        """Connect to GOSS."""
+        self.connection = stomp.Connection12([(self.goss_server, self.stomp_port)])
+        self.connection.start()
+        self.connection.connect(self.username, self.password, wait=True)
+
+    def stop(self):
+        """Publish any pending differences and disconnect."""
+        self.flush()
+        if self.connection is not None:
+            self.connection.disconnect()
+            self.connection = None
+
+    def on_point_value(self, point_value):
+        """
+            A Processor command listener: queue the difference for an operated output point.
+
+        :param point_value: A processed Operate PointValue.
+        """
+        control = self.controls.get((point_value.point_def.point_type, int(point_value.index)))
+        if control is None:
+            return
+        mrid, attribute, multiplier = control
+        value = point_value.unwrapped_value()
+        if isinstance(value, bool):
+            value = int(value)
+        elif multiplier != 1:
+            value = float(value) / multiplier
+        with self._lock:
+            self._pending[(mrid, attribute)] = value
+            if self._timer is not None:
+                return
+            if self.batch_window > 0:
+                self._timer = threading.Timer(self.batch_window, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+                return
+        self.flush()
+
+    def flush(self):
+        """Publish the pending differences as one message."""
+        with self._lock:
+            pending, self._pending = self._pending, OrderedDict()
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not pending:
+                return
+            message = self.difference_message(pending)
+            self._last_values.update(pending)
+        if self.connection is None:
+            _log.error('Not connected to GOSS, dropped {} differences'.format(len(pending)))
+            return
+        self.connection.send(SIMULATION_INPUT_TOPIC + str(self.simulation_id), json.dumps(message))
+        self.message_count += 1
+        self.difference_count += len(pending)
+        _log.debug('Published {} differences to simulation {}'.format(len(pending), self.simulation_id))
+
+    def difference_message(self, values):
+        """
+            Return the simulation input message for a set of differences.
+
+        :param values: An ordered dictionary of (mRID, attribute) to new value.
+        :return: A dictionary, the message to send as JSON.
+        """
+        forward_differences = []
+        reverse_differences = []
+        for (mrid, attribute), value in values.items():
+            forward_differences.append({'object': mrid, 'attribute': attribute, 'value': value})
+            if (mrid, attribute) in self._last_values:
+                reverse_differences.append({'object': mrid, 'attribute': attribute,
+                                            'value': self._last_values[(mrid, attribute)]})
+        return {
+            'command': 'update',
+            'simulation_id': str(self.simulation_id),
+            'input': {
+                'simulation_id': str(self.simulation_id),
+                'message': {
+                    'timestamp': int(time.time()),
+                    'difference_mrid': str(uuid.uuid4()),
+                    'forward_differences': forward_differences,
+                    'reverse_differences': reverse_differences
+                }
+            }
+        }
+
+    def publish_stats(self):
+        """Return the number of messages and differences published."""
+        return {'messages': self.message_count, 'differences': self.difference_count}
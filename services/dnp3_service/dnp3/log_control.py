@@ -0,0 +1,183 @@
+"""
+Keep logging off the DNP3 service's hot paths.
+
+The stack threads, the command worker and the input point updates log one
+message per point. Under load, formatting and writing those messages costs
+more than the work they describe, so:
+
+    - Per-point messages go through a PointLog. It checks the logger's level
+      before doing anything else, and with a rate it emits at most that many
+      messages per second, then one summary of the messages it suppressed.
+      Arguments are formatted only for the messages that are emitted.
+
+    - AsyncLogHandler hands records to a writer thread, which formats and
+      writes them, so the thread that logs never waits for the output. If the
+      writer falls behind by max_queue_size records, further records are
+      dropped and counted rather than blocking a stack thread.
+
+configure_logging() sets up the root logger with both:
+
+    configure_logging(logging.INFO)                         # The default of the start scripts.
+    configure_logging(logging.DEBUG, point_log_rate=None)   # Every message, e.g. to debug one command.
+"""
+import logging
+import sys
+import threading
+import time
+from collections import deque
+
+DEFAULT_POINT_LOG_RATE = 10
+DEFAULT_MAX_QUEUE_SIZE = 10000
+LOG_FORMAT = '%(asctime)s:%(name)s:%(levelname)s: %(message)s'
+
+_log = logging.getLogger(__name__)
+_point_logs = []
+
+
+def set_point_log_rate(rate):
+    """Set the messages per second of every PointLog, None to emit every message."""
+    for point_log in _point_logs:
+        point_log.rate = rate
+
+
+class PointLog(object):
+    """A rate-limited view of a logger, for messages logged once per point or command."""
+
+    def __init__(self, logger, rate=DEFAULT_POINT_LOG_RATE):
+        """
+        :param logger: The logging.Logger to emit to.
+        :param rate: The messages per second to emit, None for every message. set_point_log_rate() changes it.
+        """
+        self.logger = logger
+        self.rate = rate
+        # Updated without a lock by every thread that logs, so the limit is approximate under contention.
+        self._window_start = 0.0
+        self._window_count = 0
+        self.suppressed_count = 0
+        _point_logs.append(self)
+
+    def debug(self, msg, *args):
+        self.log(logging.DEBUG, msg, *args)
+
+    def info(self, msg, *args):
+        self.log(logging.INFO, msg, *args)
+
+    def error(self, msg, *args):
+        self.log(logging.ERROR, msg, *args)
+
+    def log(self, level, msg, *args):
+        """Log a message with lazy arguments, if the level is enabled and the rate allows it."""
+        if not self.logger.isEnabledFor(level):
+            return
+        rate = self.rate
+        if rate is not None:
+            now = time.time()
+            if now - self._window_start >= 1.0:
+                suppressed = self._window_count - rate
+                if suppressed > 0:
+                    self.suppressed_count += suppressed
+                    self.logger.log(level, 'Suppressed %d similar messages in the last %.1fs',
+                                    suppressed, now - self._window_start)
+                self._window_start = now
+                self._window_count = 0
+            self._window_count += 1
+            if self._window_count > rate:
+                return
+        self.logger.log(level, msg, *args)
+
+
+class AsyncLogHandler(logging.Handler):
+    """Pass log records to other handlers on a writer thread."""
+
+    def __init__(self, handlers, max_queue_size=DEFAULT_MAX_QUEUE_SIZE, interval=0.05):
+        """
+        :param handlers: The handlers that format and write the records, on the writer thread.
+        :param max_queue_size: The number of records that can wait for the writer. If more arrive they are dropped.
+        :param interval: Seconds the writer waits for records when the queue is empty.
+        """
+        super(AsyncLogHandler, self).__init__()
+        self.handlers = handlers
+        self.max_queue_size = max_queue_size
+        self.interval = interval
+        self.dropped_count = 0         # Dropped since the writer last reported it.
+        self.dropped_total = 0
+        self._records = deque()         # Appended by the logging threads, popped on the writer thread.
+        # flush() writes on the caller's thread, so writes are serialized. The drop counts have their own
+        # lock: emit() already holds the handler's lock, which logging.shutdown() holds while it flushes.
+        self._write_lock = threading.Lock()
+        self._dropped_lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='dnp3-log-writer')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def emit(self, record):
+        if len(self._records) >= self.max_queue_size:
+            with self._dropped_lock:
+                self.dropped_count += 1
+                self.dropped_total += 1
+            return
+        self._records.append(record)
+
+    def _run(self):
+        while True:
+            stopping = self._stopping.wait(self.interval)
+            self._write()
+            if stopping:
+                return
+
+    def _write(self):
+        with self._write_lock:
+            records = self._records
+            while records:
+                record = records.popleft()
+                for handler in self.handlers:
+                    if record.levelno >= handler.level:
+                        handler.handle(record)
+            with self._dropped_lock:
+                dropped, self.dropped_count = self.dropped_count, 0
+            if not dropped:
+                return
+            for handler in self.handlers:
+                handler.handle(logging.makeLogRecord({'name': __name__, 'levelno': logging.WARNING,
+                                                      'levelname': 'WARNING',
+                                                      'msg': 'Dropped %d log records, the writer fell behind',
+                                                      'args': (dropped,)}))
+
+    def flush(self):
+        self._write()
+
+    def close(self):
+        """Write the queued records and stop the writer thread."""
+        if self._thread is not None:
+            self._stopping.set()
+            self._thread.join()
+            self._thread = None
+        for handler in self.handlers:
+            handler.close()
+        super(AsyncLogHandler, self).close()
+
+
+def configure_logging(level=logging.INFO, point_log_rate=DEFAULT_POINT_LOG_RATE, async_output=True,
+                      stream=sys.stdout):
+    """
+        Replace the root logger's handlers with one that writes to a stream.
+
+    :param level: The root logger's level.
+    :param point_log_rate: The messages per second of every PointLog, None for every message.
+    :param async_output: Whether to write on an AsyncLogHandler's thread rather than the logging thread.
+    :param stream: The stream to write to.
+    :return: The root logger's new handler.
+    """
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+        handler.close()
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    if async_output:
+        handler = AsyncLogHandler([handler])
+    root.addHandler(handler)
+    root.setLevel(level)
+    set_point_log_rate(point_log_rate)
+    return handler
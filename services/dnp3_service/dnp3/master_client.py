@@ -0,0 +1,507 @@
+"""
+Poll DNP3 outstations and publish their measurements to GOSS.
+
+The inverse of simulation_feeder.py: a DNP3 master for hardware-in-the-loop
+work that polls many real or emulated outstations and turns the values they
+report into CIM measurements. Input points name their measurement in the
+points config exactly as they do for the SimulationOutputFeeder, so one points
+file describes both sides of the loop. Analog values are divided by the
+point's scaling_multiplier, and binary values are sent as 0 or 1.
+
+All devices' channels share one DNP3Manager thread pool. opendnp3 schedules
+each device's integrity (all classes) and event (classes 1-3) polls at the
+device's own rates:
+
+    threads_to_allocate: 4
+    goss_server: 127.0.0.1
+    stomp_port: 61613
+    simulation_id: "1234"       # Publish on the simulation output topic,
+    # topic: /topic/...         # or on this topic.
+    publish_interval: 1.0
+    devices:
+      - name: rtu
+        count: 50               # Consecutive ports and link remote addresses
+        host: 192.168.1.20
+        port: 20000
+        points_file: points_config.yml
+        mrid_prefix: "rtu-{number}_"    # Each device's mRIDs are its own
+        integrity_interval: 300
+        event_interval: 1
+        master:
+          link_local_addr: 1
+          link_remote_addr: 10
+          response_timeout: 5
+
+Each device publishes the measurement_mrids of its points file preceded by
+its mrid_prefix, if any. In an entry with a count the prefix may contain
+{number}, the device's number from 0. Measurements are merged by mRID, so a
+config in which two devices would publish the same mRID is rejected when the
+client starts.
+
+The stack threads only store the values of each response in their device's
+MeasurementTable. Every publish_interval seconds the publisher thread takes
+the values received from all devices since the last publish, keeps the latest
+value of each point, and sends them as one measurement message.
+"""
+import copy
+import json
+import logging
+import os
+import threading
+import time
+
+import numpy
+import stomp
+
+from pydnp3 import opendnp3, openpal, asiopal, asiodnp3
+from dnp3.outstation import MyLogger
+from dnp3.point_cache import load_config
+from dnp3.points import PointDefinitions, POINT_TYPE_ANALOG_INPUT, POINT_TYPE_BINARY_INPUT
+from dnp3.simulation_feeder import SIMULATION_OUTPUT_TOPIC
+
+DEFAULT_PUBLISH_INTERVAL = 1.0
+DEFAULT_INTEGRITY_INTERVAL = 300.0
+DEFAULT_EVENT_INTERVAL = 1.0
+
+_log = logging.getLogger(__name__)
+
+
+def expand_device_entries(entries):
+    """Return one device entry per device, expanding entries that have a count."""
+    expanded = []
+    for entry in entries:
+        count = entry.get('count', None)
+        if count is None:
+            expanded.append(entry)
+            continue
+        for number in range(count):
+            device_entry = copy.deepcopy(entry)
+            del device_entry['count']
+            device_entry['name'] = '{}-{}'.format(entry.get('name', 'device'), number)
+            device_entry['port'] = entry.get('port', 20000) + number
+            if 'mrid_prefix' in entry:
+                device_entry['mrid_prefix'] = entry['mrid_prefix'].format(number=number)
+            master_config = device_entry.setdefault('master', {})
+            master_config['link_remote_addr'] = master_config.get('link_remote_addr', 10) + number
+            expanded.append(device_entry)
+    return expanded
+
+
+class MeasurementTable(object):
+    """The latest values a device reported for the measured input points of one point type."""
+
+    def __init__(self, point_defs, default_attribute, scaled=True, mrid_prefix=''):
+        """
+        :param point_defs: The PointDefinitions that name a measurement_mrid.
+        :param default_attribute: The measurement value set by points without a measurement_attribute.
+        :param scaled: Whether to divide values by each point's scaling_multiplier.
+        :param mrid_prefix: Prepended to each point's measurement_mrid.
+        """
+        self.mrids = [mrid_prefix + pt.measurement_mrid for pt in point_defs]
+        self.attributes = [pt.measurement_attribute or default_attribute for pt in point_defs]
+        self.scaled = scaled
+        # Outstation index -> row, -1 for indexes that aren't measured.
+        self.rows = numpy.full(max([pt.index for pt in point_defs] or [-1]) + 1, -1, dtype=numpy.int64)
+        self.rows[[pt.index for pt in point_defs]] = numpy.arange(len(point_defs))
+        self.multipliers = numpy.array([pt.scaling_multiplier if scaled else 1 for pt in point_defs],
+                                       dtype=numpy.float64)
+        self.values = numpy.zeros(len(point_defs), dtype=numpy.float64)
+        self.received = numpy.zeros(len(point_defs), dtype=bool)
+
+    def __len__(self):
+        return len(self.mrids)
+
+    def store(self, indexes, values):
+        """
+            Store the values of a response. Indexes that aren't measured are ignored.
+
+        :return: The number of measured values stored.
+        """
+        indexes = numpy.asarray(indexes, dtype=numpy.int64)
+        in_range = indexes < len(self.rows)
+        rows = self.rows[indexes[in_range]]
+        measured = rows >= 0
+        rows = rows[measured]
+        self.values[rows] = numpy.asarray(values, dtype=numpy.float64)[in_range][measured]
+        self.received[rows] = True
+        return len(rows)
+
+    def take(self):
+        """Return the (mRID, attribute, value) of each point received since the last take, and clear them."""
+        rows = numpy.flatnonzero(self.received)
+        self.received[rows] = False
+        values = self.values[rows] / self.multipliers[rows]
+        if not self.scaled:
+            values = values.astype(numpy.int64)
+        return [(self.mrids[row], self.attributes[row], value) for row, value in zip(rows.tolist(), values.tolist())]
+
+
+def _visitor_class(visitor_base):
+    """Return an IVisitor subclass that collects the indexes and values of a collection."""
+
+    class Visitor(visitor_base):
+        def __init__(self):
+            super(Visitor, self).__init__()
+            self.indexes = []
+            self.values = []
+
+        def OnValue(self, indexed_instance):
+            self.indexes.append(indexed_instance.index)
+            self.values.append(indexed_instance.value.value)
+
+    return Visitor
+
+
+class DeviceSOEHandler(opendnp3.ISOEHandler):
+    """Store the measured values of a device's responses in its MeasurementTables."""
+
+    def __init__(self, device):
+        super(DeviceSOEHandler, self).__init__()
+        self.device = device
+        # The collection type of a response header -> (point type, visitor class).
+        self.visitors = {
+            opendnp3.ICollectionIndexedAnalog: (POINT_TYPE_ANALOG_INPUT,
+                                                _visitor_class(opendnp3.IVisitorIndexedAnalog)),
+            opendnp3.ICollectionIndexedBinary: (POINT_TYPE_BINARY_INPUT,
+                                                _visitor_class(opendnp3.IVisitorIndexedBinary)),
+        }
+
+    def Process(self, info, values):
+        """Called on a stack thread for each header of a response."""
+        point_type, visitor_class = self.visitors.get(type(values), (None, None))
+        if point_type is None:
+            return
+        visitor = visitor_class()
+        values.Foreach(visitor)
+        self.device.store(point_type, visitor.indexes, visitor.values)
+
+    def Start(self):
+        pass
+
+    def End(self):
+        pass
+
+
+class DeviceMasterApplication(opendnp3.IMasterApplication):
+    """Count a device's completed and failed polls, and the event buffer overflows it reports."""
+
+    def __init__(self):
+        super(DeviceMasterApplication, self).__init__()
+        self.poll_count = 0
+        self.failure_count = 0
+        self.overflow_count = 0
+
+    def AssignClassDuringStartup(self):
+        return False
+
+    def OnClose(self):
+        pass
+
+    def OnOpen(self):
+        pass
+
+    def OnReceiveIIN(self, iin):
+        if iin.IsSet(opendnp3.IINBit.EVENT_BUFFER_OVERFLOW):
+            self.overflow_count += 1
+
+    def OnTaskComplete(self, info):
+        if info.result == opendnp3.TaskCompletion.SUCCESS:
+            self.poll_count += 1
+        else:
+            self.failure_count += 1
+
+    def OnTaskStart(self, type, id):
+        pass
+
+
+class DeviceChannelListener(asiodnp3.IChannelListener):
+    """Log a device channel's state changes."""
+
+    def __init__(self, name):
+        super(DeviceChannelListener, self).__init__()
+        self.name = name
+
+    def OnStateChange(self, state):
+        _log.info('{} channel state: {}'.format(self.name, state))
+
+
+class MasterDevice(object):
+    """A master channel to one outstation, and the measurements received from it."""
+
+    def __init__(self, entry, point_definitions):
+        """
+        :param entry: A device entry, see the module documentation.
+        :param point_definitions: The outstation's PointDefinitions.
+        """
+        self.name = entry.get('name', 'device')
+        self.entry = entry
+        self.mrid_prefix = entry.get('mrid_prefix', '')
+        self.tables = {}
+        self.reload(point_definitions)
+        self.value_count = 0
+        self.first_received = None      # When the oldest value not yet taken was received.
+        self.soe_handler = DeviceSOEHandler(self)
+        self.application = DeviceMasterApplication()
+        self.channel_listener = DeviceChannelListener(self.name)
+        self.channel = None
+        self.master = None
+        self.scans = []
+        self._lock = threading.Lock()
+
+    def reload(self, point_definitions):
+        """Compile the measurement tables of (reloaded) PointDefinitions."""
+        analog_points = []
+        binary_points = []
+        for point_def in point_definitions.iter_points():
+            if point_def.measurement_mrid is None or point_def.is_array:
+                continue
+            if point_def.point_type == POINT_TYPE_ANALOG_INPUT:
+                analog_points.append(point_def)
+            elif point_def.point_type == POINT_TYPE_BINARY_INPUT:
+                binary_points.append(point_def)
+        self.tables = {POINT_TYPE_ANALOG_INPUT: MeasurementTable(analog_points, 'magnitude',
+                                                                 mrid_prefix=self.mrid_prefix),
+                       POINT_TYPE_BINARY_INPUT: MeasurementTable(binary_points, 'value', scaled=False,
+                                                                 mrid_prefix=self.mrid_prefix)}
+
+    def measurement_mrids(self):
+        """Return the set of mRIDs the device publishes."""
+        return set(mrid for table in self.tables.values() for mrid in table.mrids)
+
+    def start(self, manager):
+        """Add the device's channel and master to a DNP3Manager and schedule its polls."""
+        master_config = self.entry.get('master', {})
+        self.channel = manager.AddTCPClient('{}-channel'.format(self.name),
+                                            opendnp3.levels.NORMAL,
+                                            asiopal.ChannelRetry().Default(),
+                                            self.entry.get('host', '127.0.0.1'),
+                                            self.entry.get('local_ip', '0.0.0.0'),
+                                            self.entry.get('port', 20000),
+                                            self.channel_listener)
+        stack_config = asiodnp3.MasterStackConfig()
+        stack_config.master.responseTimeout = openpal.TimeDuration().Milliseconds(
+            int(master_config.get('response_timeout', 5) * 1000))
+        # The device is polled. Its first integrity poll runs when the channel opens.
+        stack_config.master.disableUnsolOnStartup = True
+        stack_config.link.LocalAddr = master_config.get('link_local_addr', 1)
+        stack_config.link.RemoteAddr = master_config.get('link_remote_addr', 10)
+        self.master = self.channel.AddMaster(self.name, self.soe_handler, self.application, stack_config)
+        self.scans = [
+            self.master.AddClassScan(opendnp3.ClassField().AllClasses(),
+                                     self._duration(self.entry.get('integrity_interval', DEFAULT_INTEGRITY_INTERVAL)),
+                                     opendnp3.TaskConfig().Default()),
+            self.master.AddClassScan(opendnp3.ClassField().AllEventClasses(),
+                                     self._duration(self.entry.get('event_interval', DEFAULT_EVENT_INTERVAL)),
+                                     opendnp3.TaskConfig().Default())
+        ]
+        self.master.Enable()
+
+    @staticmethod
+    def _duration(seconds):
+        return openpal.TimeDuration().Milliseconds(int(seconds * 1000))
+
+    def stop(self):
+        if self.master is not None:
+            self.master.Disable()
+            self.master = None
+        if self.channel is not None:
+            self.channel.Shutdown()
+            self.channel = None
+        self.scans = []
+
+    def store(self, point_type, indexes, values):
+        """Store the values of a response header. Called on a stack thread."""
+        table = self.tables.get(point_type, None)
+        if table is None or not len(table):
+            return
+        with self._lock:
+            stored = table.store(indexes, values)
+            if stored and self.first_received is None:
+                self.first_received = time.time()
+            self.value_count += stored
+
+    def take(self):
+        """
+            Return the values received since the last take, and when the oldest of them was received.
+
+        :return: A tuple of ([(mRID, attribute, value), ...], time or None).
+        """
+        with self._lock:
+            first_received, self.first_received = self.first_received, None
+            return [value for table in self.tables.values() for value in table.take()], first_received
+
+    def device_stats(self):
+        """Return the values received, polls, failed polls and event buffer overflows of the device."""
+        return {
+            'values': self.value_count,
+            'polls': self.application.poll_count,
+            'failures': self.application.failure_count,
+            'overflows': self.application.overflow_count
+        }
+
+
+def check_unique_mrids(devices):
+    """Raise a ValueError if two devices would publish the same mRID."""
+    publishers = {}
+    for device in devices:
+        for mrid in device.measurement_mrids():
+            if mrid in publishers:
+                raise ValueError('Devices {} and {} both publish measurement_mrid {}, '
+                                 'give them different mrid_prefixes'.format(publishers[mrid], device.name, mrid))
+            publishers[mrid] = device.name
+
+
+class DNP3MasterClient(object):
+    """Poll the devices of a master config on one DNP3Manager and publish their measurements to GOSS."""
+
+    def __init__(self, master_config, config_dir='.', connection=None):
+        """
+        :param master_config: A dictionary, see the module documentation.
+        :param config_dir: The directory that relative points_file paths are relative to.
+        :param connection: A connected stomp connection to publish on. Default: connect to the config's goss_server.
+        """
+        self.master_config = master_config
+        self.config_dir = config_dir
+        self.topic = master_config.get('topic', None) or \
+            SIMULATION_OUTPUT_TOPIC + str(master_config.get('simulation_id', ''))
+        self.publish_interval = master_config.get('publish_interval', DEFAULT_PUBLISH_INTERVAL)
+        self.connection = connection
+        self._own_connection = connection is None
+        self.manager = None
+        self.log_handler = None
+        self.devices = []
+        self._point_definitions = {}
+        self.message_count = 0
+        self.measurement_count = 0
+        self.last_publish_latency = None
+        self.max_publish_latency = 0.0
+        self._total_publish_latency = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def point_definitions(self, entry):
+        """Return the PointDefinitions of a device entry, loading each points file once."""
+        if 'points' in entry:
+            point_defs = PointDefinitions()
+            point_defs.load_points(entry['points'])
+            return point_defs
+        points_file = os.path.join(self.config_dir, entry['points_file'])
+        if points_file not in self._point_definitions:
+            self._point_definitions[points_file] = load_config(points_file)[1]
+        return self._point_definitions[points_file]
+
+    def start(self):
+        """Connect to GOSS, start polling every device and start the publisher thread."""
+        devices = [MasterDevice(entry, self.point_definitions(entry))
+                   for entry in expand_device_entries(self.master_config.get('devices', []))]
+        check_unique_mrids(devices)
+        if self.connection is None:
+            self.connection = stomp.Connection12([(self.master_config.get('goss_server', '127.0.0.1'),
+                                                   self.master_config.get('stomp_port', '61613'))])
+            self.connection.start()
+            self.connection.connect(self.master_config.get('username', 'system'),
+                                    self.master_config.get('password', 'manager'), wait=True)
+        threads_to_allocate = self.master_config.get('threads_to_allocate', 1)
+        _log.info('Creating a DNP3Manager with {} threads.'.format(threads_to_allocate))
+        self.log_handler = MyLogger()
+        self.manager = asiodnp3.DNP3Manager(threads_to_allocate, self.log_handler)
+        for device in devices:
+            device.start(self.manager)
+            self.devices.append(device)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='dnp3-master-publisher')
+        self._thread.daemon = True
+        self._thread.start()
+        _log.info('Polling {} devices, publishing to {}'.format(len(self.devices), self.topic))
+
+    def shutdown(self):
+        """Stop polling, publish the measurements already received and disconnect."""
+        for device in self.devices:
+            device.stop()
+        if self.manager is not None:
+            self.manager.Shutdown()
+            self.manager = None
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        self.publish()
+        if self._own_connection and self.connection is not None:
+            self.connection.disconnect()
+            self.connection = None
+
+    def _run(self):
+        while not self._stop.wait(self.publish_interval):
+            try:
+                self.publish()
+            except Exception as err:
+                _log.error('Error publishing measurements: {}'.format(err))
+
+    def publish(self):
+        """
+            Publish the values received from all devices since the last publish as one message.
+
+        :return: The number of measurements published.
+        """
+        now = time.time()
+        values = []
+        oldest = None
+        for device in self.devices:
+            device_values, first_received = device.take()
+            values.extend(device_values)
+            if first_received is not None and (oldest is None or first_received < oldest):
+                oldest = first_received
+        if not values:
+            return 0
+        message = self.measurement_message(values, now)
+        self.connection.send(self.topic, json.dumps(message))
+        self.message_count += 1
+        self.measurement_count += len(message['message']['measurements'])
+        self._record_latency(time.time() - oldest)
+        _log.debug('Published {} measurements to {}'.format(len(message['message']['measurements']), self.topic))
+        return len(message['message']['measurements'])
+
+    def measurement_message(self, values, timestamp):
+        """
+            Return the measurement message for a set of values.
+
+        :param values: A list of (mRID, attribute, value). The attributes of one mRID make up one measurement.
+        :param timestamp: The time of the measurements, in seconds since the epoch.
+        :return: A dictionary, the message to send as JSON.
+        """
+        measurements = {}
+        for mrid, attribute, value in values:
+            measurement = measurements.get(mrid, None)
+            if measurement is None:
+                measurement = measurements[mrid] = {'measurement_mrid': mrid}
+            measurement[attribute] = value
+        return {
+            'simulation_id': str(self.master_config.get('simulation_id', '')),
+            'message': {
+                'timestamp': int(timestamp),
+                'measurements': list(measurements.values())
+            }
+        }
+
+    def _record_latency(self, latency):
+        self.last_publish_latency = latency
+        self.max_publish_latency = max(self.max_publish_latency, latency)
+        self._total_publish_latency += latency
+
+    def publish_stats(self):
+        """
+            Return the messages and measurements published, the latency from receiving a value to publishing it,
+            in seconds, and the totals of the devices' stats.
+        """
+        stats = {
+            'messages': self.message_count,
+            'measurements': self.measurement_count,
+            'latency_last': self.last_publish_latency,
+            'latency_mean': self._total_publish_latency / self.message_count if self.message_count else None,
+            'latency_max': self.max_publish_latency,
+            'devices': len(self.devices)
+        }
+        for device in self.devices:
+            for name, count in device.device_stats().items():
+                stats[name] = stats.get(name, 0) + count
+        return stats
@@ -34,14 +34,43 @@
 
 import os
 import logging
+import math
+import threading
+import time
 
 from pydnp3 import opendnp3, openpal, asiopal, asiodnp3
 
+from dnp3.log_control import PointLog
+from dnp3.points import (
+    DNP3Exception, POINT_TYPE_ANALOG_INPUT, POINT_TYPE_ANALOG_OUTPUT, POINT_TYPE_BINARY_INPUT, POINT_TYPE_BINARY_OUTPUT
+)
+
 # from volttron.platform.agent import utils
 
 # utils.setup_logging()
 
 _log = logging.getLogger(__name__)
+_point_log = PointLog(_log)
+_stack_log = PointLog(_log)
+
+# Point types in the order of the opendnp3 DatabaseSizes constructor arguments.
+DATABASE_POINT_TYPES = (POINT_TYPE_BINARY_INPUT, 'Double Bit Binary', POINT_TYPE_ANALOG_INPUT, 'Counter',
+                        'Frozen Counter', POINT_TYPE_BINARY_OUTPUT, POINT_TYPE_ANALOG_OUTPUT, 'Time And Interval')
+# The first seven EventBufferConfig arguments follow DATABASE_POINT_TYPES. Time And Interval points have no
+# events: the eighth argument is the security statistic event buffer, which this outstation doesn't use.
+EVENT_BUFFER_POINT_TYPES = DATABASE_POINT_TYPES[:7]
+MAX_DATABASE_SIZE = 65535               # Database indexes and event buffer sizes are 16-bit in opendnp3.
+MIN_EVENT_BUFFER_SIZE = 10
+DEFAULT_POINT_UPDATE_RATE = 0.1         # Updates per second of points that don't declare an update_rate.
+DEFAULT_MASTER_POLL_INTERVAL = 5.0      # Seconds between the master's event polls.
+DEFAULT_EVENT_BUFFER_MARGIN = 2.0
+
+VALUE_TYPE_POINT_TYPES = {
+    opendnp3.Binary: POINT_TYPE_BINARY_INPUT,
+    opendnp3.Analog: POINT_TYPE_ANALOG_INPUT,
+    opendnp3.BinaryOutputStatus: POINT_TYPE_BINARY_OUTPUT,
+    opendnp3.AnalogOutputStatus: POINT_TYPE_ANALOG_OUTPUT
+}
 
 
 class DNP3Outstation(opendnp3.IOutstationApplication):
@@ -72,43 +101,76 @@ class DNP3Outstation(opendnp3.IOutstationApplication):
                   into outgoing messages.
     """
 
-    outstation = None
-    outstation_config = {}
-    agent = None
-
-    def __init__(self, local_ip, port, outstation_config):
+    def __init__(self, local_ip, port, outstation_config, name='outstation'):
         """
             Initialize the outstation's Application Layer.
 
+            The outstation, its configuration and its agent belong to this instance, so several
+            outstations can run in one process, e.g. on one shared DNP3Manager (see start()).
+
         @param local_ip: Host name (DNS resolved) or IP address of remote endpoint. Default: 0.0.0.0.
         @param port: Port remote endpoint is listening on. Default: 20000.
         @param outstation_config: A dictionary of configuration parameters. All are optional. Parameters include:
-            database_sizes: (integer) Size of the Outstation's point database, by point type. Default: 10000.
-            event_buffers: (integer) Size of the database event buffers. Default: 10.
+            database_sizes: (integer) Size of the Outstation's point database, for every point type.
+                            Default: sized per point type from the agent's point definitions (highest index + 1).
+            event_buffers: (integer) Size of the database event buffers, for every point type.
+                           Default: sized per point type, see event_buffer_sizes().
+            point_update_rate: (float) Updates per second of points without an update_rate. Default: 0.1.
+            master_poll_interval: (float) Seconds between the master's event polls. Default: 5.
+            event_buffer_margin: (float) Multiplier applied to the expected events per poll. Default: 2.
             allow_unsolicited: (boolean) Whether to allow unsolicited requests. Default: True.
             link_local_addr: (integer) Link layer local address. Default: 10.
             link_remote_addr: (integer) Link layer remote address. Default: 1.
             log_levels: List of bit field names (OR'd together) that filter what gets logged by DNP3. Default: [NORMAL].
                         Possible values: ALL, ALL_APP_COMMS, ALL_COMMS, NORMAL, NOTHING
             threads_to_allocate: (integer) Threads to allocate in the manager's thread pool. Default: 1.
+        @param name: Name of the outstation's channel and stack in DNP3 logs. Must be unique within a DNP3Manager.
         """
         super(DNP3Outstation, self).__init__()
         self.local_ip = local_ip
         self.port = port
+        self.name = name
+        self.outstation = None
+        self.agent = None
         self.set_outstation_config(outstation_config)
         # The following variables are initialized after start() is called.
         self.stack_config = None
         self.log_handler = None
         self.manager = None
+        self.owns_manager = False
         self.retry_parameters = None
         self.listener = None
         self.channel = None
         self.command_handler = None
+        self.database_size_by_type = {}
+        self.event_buffer_by_type = {}
+        self._database_size_by_value_type = {}
+        # The feeder, the schedule player and the command worker apply updates on their own threads.
+        self._window_lock = threading.Lock()
+        self._window_start = time.time()
+        self._window_updates = {}
+        self.poll_window_overruns = {}
+
+    def start(self, manager=None):
+        """
+            Configure the DNP3 stack and enable the outstation.
 
-    def start(self):
+        @param manager: A DNP3Manager to add the outstation's channel to. By default the outstation
+                        creates its own manager with threads_to_allocate threads.
+        """
         _log.debug('Configuring the DNP3 stack.')
-        self.stack_config = asiodnp3.OutstationStackConfig(opendnp3.DatabaseSizes.AllTypes(self.outstation_config.get('database_sizes', 10000)))
-        self.stack_config.outstation.eventBufferConfig = opendnp3.EventBufferConfig.AllTypes(self.outstation_config.get('event_buffers', 10))
+        database_sizes = self.database_sizes()
+        event_buffers = self.event_buffer_sizes()
+        self.database_size_by_type = dict(zip(DATABASE_POINT_TYPES, database_sizes))
+        self.event_buffer_by_type = dict(zip(DATABASE_POINT_TYPES, event_buffers))
+        self._database_size_by_value_type = dict((value_type, self.database_size_by_type[point_type])
+                                                 for value_type, point_type in VALUE_TYPE_POINT_TYPES.items())
+        self.report_sizing()
+        self.stack_config = asiodnp3.OutstationStackConfig(opendnp3.DatabaseSizes(*database_sizes))
+        security_statistic_events = 0
+        self.stack_config.outstation.eventBufferConfig = opendnp3.EventBufferConfig(
+            *([self.event_buffer_by_type[point_type] for point_type in EVENT_BUFFER_POINT_TYPES] +
+              [security_statistic_events]))
         self.stack_config.outstation.params.allowUnsolicited = self.outstation_config.get('allow_unsolicited', True)
         self.stack_config.link.LocalAddr = self.outstation_config.get('link_local_addr', 10)
         self.stack_config.link.RemoteAddr = self.outstation_config.get('link_remote_addr', 1)
@@ -117,8 +179,9 @@ class DNP3Outstation(opendnp3.IOutstationApplication):
         # Configure the outstation database of points based on the contents of the data dictionary.
         _log.debug('Configuring the DNP3 Outstation database.')
         db_config = self.stack_config.dbConfig
-        for point in self.get_agent().point_definitions.all_points():
-            _log.debug("Adding Point: {}".format(point))
+        for point in self.get_agent().point_definitions.iter_points():
+            # Logged with arguments, so the points are formatted only if the message is emitted.
+            _log.debug('Adding Point: %s', point)
             if point.point_type == 'Analog Input':
                 cfg = db_config.analog[int(point.index)]
             elif point.point_type == 'Binary Input':
@@ -131,18 +194,22 @@ class DNP3Outstation(opendnp3.IOutstationApplication):
                 cfg.svariation = point.svariation
                 cfg.evariation = point.evariation
 
-        _log.debug('Creating a DNP3Manager.')
-        threads_to_allocate = self.outstation_config.get('threads_to_allocate', 1)
-        # self.log_handler = asiodnp3.ConsoleLogger().Create()              # (or use this during regression testing)
-        # self.log_handler = MyLogger().Create()
-        self.log_handler = MyLogger()
-        self.manager = asiodnp3.DNP3Manager(threads_to_allocate, self.log_handler)
+        if manager is not None:
+            self.manager = manager
+        else:
+            _log.debug('Creating a DNP3Manager.')
+            threads_to_allocate = self.outstation_config.get('threads_to_allocate', 1)
+            # self.log_handler = asiodnp3.ConsoleLogger().Create()              # (or use this during regression testing)
+            # self.log_handler = MyLogger().Create()
+            self.log_handler = MyLogger()
+            self.manager = asiodnp3.DNP3Manager(threads_to_allocate, self.log_handler)
+            self.owns_manager = True
 
         _log.debug('Creating the DNP3 channel, a TCP server.')
         self.retry_parameters = asiopal.ChannelRetry().Default()
         # self.listener = asiodnp3.PrintingChannelListener().Create()       # (or use this during regression testing)
-        self.listener = AppChannelListener()
-        self.channel = self.manager.AddTCPServer("server",
+        self.listener = AppChannelListener(self)
+        self.channel = self.manager.AddTCPServer("{}-server".format(self.name),
                                                  self.dnp3_log_level(),
                                                  self.retry_parameters,
                                                  self.local_ip,
@@ -151,67 +218,165 @@ class DNP3Outstation(opendnp3.IOutstationApplication):
 
         _log.debug('Adding the DNP3 Outstation to the channel.')
         # self.command_handler =  opendnp3.SuccessCommandHandler().Create() # (or use this during regression testing)
-        self.command_handler = OutstationCommandHandler()
-        self.outstation = self.channel.AddOutstation("outstation", self.command_handler, self, self.stack_config)
+        self.command_handler = OutstationCommandHandler(self)
+        self.set_outstation(self.channel.AddOutstation(self.name, self.command_handler, self, self.stack_config))
 
-        # Set the singleton instance that communicates with the Master.
-        self.set_outstation(self.outstation)
+        # Restore the values of the previous run, so the master's first poll sees them.
+        self.get_agent().warm_start()
 
         _log.info('Enabling the DNP3 Outstation. Traffic can now start to flow.')
         self.outstation.Enable()
 
+    def database_sizes(self):
+        """Return the database size of each point type, in DATABASE_POINT_TYPES order."""
+        configured = self.outstation_config.get('database_sizes', None)
+        if configured is not None:
+            return [configured] * len(DATABASE_POINT_TYPES)
+        point_definitions = self.get_agent().point_definitions
+        return [min(point_definitions.database_size(point_type), MAX_DATABASE_SIZE)
+                for point_type in DATABASE_POINT_TYPES]
+
+    def event_buffer_sizes(self):
+        """
+            Return the event buffer size of each point type, in DATABASE_POINT_TYPES order.
+
+            A buffer holds the events expected between two master polls, times a margin: the update rates
+            of the point type's event class points, times master_poll_interval, times event_buffer_margin.
+        """
+        configured = self.outstation_config.get('event_buffers', None)
+        if configured is not None:
+            return [configured] * len(DATABASE_POINT_TYPES)
+        point_definitions = self.get_agent().point_definitions
+        update_rate = self.outstation_config.get('point_update_rate', DEFAULT_POINT_UPDATE_RATE)
+        events_per_poll = (self.outstation_config.get('master_poll_interval', DEFAULT_MASTER_POLL_INTERVAL) *
+                           self.outstation_config.get('event_buffer_margin', DEFAULT_EVENT_BUFFER_MARGIN))
+        sizes = []
+        for point_type in DATABASE_POINT_TYPES:
+            expected_events = point_definitions.event_rate(point_type, update_rate) * events_per_poll
+            if expected_events > 0:
+                sizes.append(min(max(int(math.ceil(expected_events)), MIN_EVENT_BUFFER_SIZE), MAX_DATABASE_SIZE))
+            else:
+                sizes.append(0)
+        return sizes
+
+    def report_sizing(self):
+        """Log the database and event buffer sizes, and warn about points that don't fit in the database."""
+        point_definitions = self.get_agent().point_definitions
+        for point_type in DATABASE_POINT_TYPES:
+            needed = point_definitions.database_size(point_type)
+            size = self.database_size_by_type[point_type]
+            if needed or size:
+                _log.info('{} {}: database size {} for {} indexes, event buffer {}'.format(
+                    self.name, point_type, size, needed, self.event_buffer_by_type[point_type]))
+            if needed > size:
+                _log.warning('{} {} points at indexes {} and above do not fit in the database'.format(
+                    self.name, point_type, size))
+
+    def poll_window_overrun_counts(self):
+        """
+            Return, per point type, the number of master_poll_interval windows in which more updates were
+            applied than the event buffer holds. Events are lost if the master polls them no more often.
+
+            These are not event buffer overflows, which only the stack detects. A master sees those as the
+            EVENT_BUFFER_OVERFLOW IIN bit.
+        """
+        with self._window_lock:
+            return dict(self.poll_window_overruns)
+
+    def _count_event_updates(self, updates_by_value_type):
+        """Add applied updates to the current poll interval window, checking the window that ended for overruns."""
+        with self._window_lock:
+            now = time.time()
+            if now - self._window_start >= self.outstation_config.get('master_poll_interval',
+                                                                      DEFAULT_MASTER_POLL_INTERVAL):
+                for point_type, count in self._window_updates.items():
+                    if count > self.event_buffer_by_type.get(point_type, 0):
+                        self.poll_window_overruns[point_type] = self.poll_window_overruns.get(point_type, 0) + 1
+                        _log.warning('{} applied {} {} updates in one poll interval, event buffer size is {}'.format(
+                            self.name, count, point_type, self.event_buffer_by_type.get(point_type, 0)))
+                self._window_start = now
+                self._window_updates = {}
+            for value_type, count in updates_by_value_type.items():
+                point_type = VALUE_TYPE_POINT_TYPES.get(value_type)
+                if point_type is not None:
+                    self._window_updates[point_type] = self._window_updates.get(point_type, 0) + count
+
+    def check_points_fit(self, point_definitions):
+        """Raise a DNP3Exception if reloaded PointDefinitions need a larger database than the running outstation has."""
+        for point_type, size in self.database_size_by_type.items():
+            needed = point_definitions.database_size(point_type)
+            if needed > size:
+                raise DNP3Exception('{} {} points need a database size of {}, the running database has {}. '
+                                    'Restart the outstation to load them.'.format(self.name, point_type, needed, size))
+
+    def points_reloaded(self, diff):
+        """
+            Update the database for reloaded point definitions.
+
+            Removed input points are reported to the Master as offline. Unchanged points keep their values.
+            The database's event classes and variations are fixed when the stack starts, so changes to them
+            take effect when the outstation restarts.
+
+        :param diff: The PointDefinitionsDiff of the reload.
+        """
+        offline = []
+        for point_def in diff.removed:
+            if point_def.point_type == POINT_TYPE_ANALOG_INPUT:
+                offline.append((opendnp3.Analog(0.0, opendnp3.Flags(0)), point_def.index))
+            elif point_def.point_type == POINT_TYPE_BINARY_INPUT:
+                offline.append((opendnp3.Binary(False, opendnp3.Flags(0)), point_def.index))
+        if offline:
+            self.apply_updates(offline)
+        for old_def, new_def in diff.changed:
+            if (old_def.event_class, old_def.svariation, old_def.evariation) != \
+                    (new_def.event_class, new_def.svariation, new_def.evariation):
+                _log.warning('{}: the event class and variations of {} take effect when the outstation restarts'.format(
+                    self.name, new_def))
+        _log.info('{} reloaded point definitions: {}'.format(self.name, diff))
+
     def reload_parameters(self, local_ip, port, outstation_config):
         _log.debug('In reload_parameters')
         self.local_ip = local_ip
         self.port = port
         self.outstation_config = outstation_config
 
-    @classmethod
-    def get_agent(cls):
-        """Return the singleton DNP3Agent or MesaAgent instance."""
-        agt = cls.agent
+    def get_agent(self):
+        """Return the DNP3Agent, MesaAgent or Processor instance of this outstation."""
+        agt = self.agent
         if agt is None:
             raise ValueError('Outstation has no configured agent')
         return agt
 
-    @classmethod
-    def set_agent(cls, agent):
-        """Set the singleton DNP3Agent or MesaAgent instance."""
-        cls.agent = agent
+    def set_agent(self, agent):
+        """Set the DNP3Agent, MesaAgent or Processor instance of this outstation."""
+        self.agent = agent
 
-    @classmethod
-    def get_outstation(cls):
-        """Get the singleton instance of IOutstation."""
-        outst = cls.outstation
+    def get_outstation(self):
+        """Get this outstation's IOutstation."""
+        outst = self.outstation
         if outst is None:
             raise AttributeError('IOutstation is not yet enabled')
         return outst
 
-    @classmethod
-    def set_outstation(cls, outstn):
+    def set_outstation(self, outstn):
         """
-            Set the singleton instance of IOutstation, as returned from the channel's AddOutstation call.
+            Set this outstation's IOutstation, as returned from the channel's AddOutstation call.
 
-            Making IOutstation available as a singleton allows other classes
-            to send commands to it -- see apply_update().
+            Other classes send updates to it through apply_update() and apply_updates().
         """
-        cls.outstation = outstn
+        self.outstation = outstn
 
-    @classmethod
-    def get_outstation_config(cls):
+    def get_outstation_config(self):
         """Get the outstation_config, a dictionary of configuration parameters."""
-        return cls.outstation_config
+        return self.outstation_config
 
-    @classmethod
-    def set_outstation_config(cls, outstn_cfg):
+    def set_outstation_config(self, outstn_cfg):
         """
             Set the outstation_config.
 
-            It's managed as a class variable so that it can be examined by the class method apply_update().
-
         :param outstn_cfg: A dictionary of configuration parameters.
         """
-        cls.outstation_config = outstn_cfg
+        self.outstation_config = outstn_cfg
 
     def dnp3_log_level(self):
         """
@@ -260,7 +425,7 @@ class DNP3Outstation(opendnp3.IOutstationApplication):
         # Other interesting IIN values might be PARAM_ERROR, ALREADY_EXECUTING, FUNC_NOT_SUPPORTED.
         if iin_field.LSB != 0 or iin_field.MSB != 0:
             status_string = 'IINField LSB={}, MSB={}'.format(iin_field.LSB, iin_field.MSB)
-            DNP3Outstation.get_agent().publish_outstation_status(status_string)
+            self.get_agent().publish_outstation_status(status_string)
         return application_iin
 
     # Overridden method
@@ -284,8 +449,7 @@ class DNP3Outstation(opendnp3.IOutstationApplication):
         _log.debug('In DNP3 WarmRestartSupport')
         return opendnp3.RestartMode.UNSUPPORTED
 
-    @classmethod
-    def apply_update(cls, value, index):
+    def apply_update(self, value, index):
         """
             Record an opendnp3 data value (Analog, Binary, etc.) in the outstation's database.
 
@@ -294,19 +458,45 @@ class DNP3Outstation(opendnp3.IOutstationApplication):
         :param value: An instance of Analog, Binary, or another opendnp3 data value.
         :param index: (integer) Index of the data definition in the opendnp3 database.
         """
-        _log.debug('Recording DNP3 {} measurement, index={}, value={}'.format(type(value).__name__, index, value.value))
-        max_index = cls.get_outstation_config().get('database_sizes', 10000)
-        if index > max_index:
-            raise ValueError('Attempt to set a value for index {} which exceeds database size {}'.format(index,
-                                                                                                         max_index))
+        _point_log.debug('Recording DNP3 %s measurement, index=%s, value=%s', type(value).__name__, index, value.value)
+        self.apply_updates([(value, index)])
+
+    def apply_updates(self, updates):
+        """
+            Record a batch of opendnp3 data values in the outstation's database as a single transaction.
+
+            All values go into one UpdateBuilder and are applied with one Apply call, so the
+            DNP3 stack handles a whole scan as one transaction instead of one per point.
+            If any index is outside its point type's database, nothing is applied.
+
+        :param updates: An iterable of (value, index) pairs. value is an instance of Analog,
+            Binary, or another opendnp3 data value; index is its integer database index.
+        :return: The number of values applied.
+        """
+        default_size = self.get_outstation_config().get('database_sizes', 10000)
+        size_by_value_type = self._database_size_by_value_type
+        counts = {}
         builder = asiodnp3.UpdateBuilder()
-        builder.Update(value, index)
+        count = 0
+        for value, index in updates:
+            value_type = type(value)
+            database_size = size_by_value_type.get(value_type, default_size)
+            if index >= database_size:
+                raise ValueError('Attempt to set a value for index {} which exceeds database size {}'.format(
+                    index, database_size))
+            builder.Update(value, index)
+            counts[value_type] = counts.get(value_type, 0) + 1
+            count += 1
+        if count == 0:
+            return 0
+        self._count_event_updates(counts)
         update = builder.Build()
         try:
-            cls.get_outstation().Apply(update)
+            self.get_outstation().Apply(update)
         except AttributeError as err:
             if not os.environ.get('UNITTEST', False):
                 raise err
+        return count
 
     def shutdown(self):
         """
@@ -320,6 +510,9 @@ class DNP3Outstation(opendnp3.IOutstationApplication):
         _log.debug('Garbage collecting DNP3 stack config...')
         self.stack_config = None
         _log.debug('Garbage collecting DNP3 channel...')
+        if not self.owns_manager and self.channel is not None:
+            # A shared manager keeps running, so shut down this outstation's channel explicitly.
+            self.channel.Shutdown()
         self.channel = None
         _log.debug('Garbage collecting DNP3Manager...')
         self.manager = None
@@ -331,6 +524,13 @@ class OutstationCommandHandler(opendnp3.ICommandHandler):
         which relay commands and data from the Master to the Outstation.
     """
 
+    def __init__(self, dnp3_outstation):
+        """
+        :param dnp3_outstation: The DNP3Outstation whose agent processes the commands.
+        """
+        super(OutstationCommandHandler, self).__init__()
+        self.dnp3_outstation = dnp3_outstation
+
     def Start(self):
         # This debug line is too chatty...
         # _log.debug('In DNP3 OutstationCommandHandler.Start')
@@ -350,7 +550,7 @@ class OutstationCommandHandler(opendnp3.ICommandHandler):
         :param index: int
         :return: CommandStatus
         """
-        return DNP3Outstation.get_agent().process_point_value('Select', command, index, None)
+        return self.dnp3_outstation.get_agent().process_point_value('Select', command, index, None)
 
     def Operate(self, command, index, op_type):
         """
@@ -362,7 +562,7 @@ class OutstationCommandHandler(opendnp3.ICommandHandler):
         :param op_type: OperateType
         :return: CommandStatus
         """
-        return DNP3Outstation.get_agent().process_point_value('Operate', command, index, op_type)
+        return self.dnp3_outstation.get_agent().process_point_value('Operate', command, index, op_type)
 
 
 class AppChannelListener(asiodnp3.IChannelListener):
@@ -370,8 +570,9 @@ class AppChannelListener(asiodnp3.IChannelListener):
         IChannelListener has been overridden to implement application-specific channel behavior.
     """
 
-    def __init__(self):
+    def __init__(self, dnp3_outstation):
         super(AppChannelListener, self).__init__()
+        self.dnp3_outstation = dnp3_outstation
 
     def OnStateChange(self, state):
         """
@@ -379,7 +580,7 @@ class AppChannelListener(asiodnp3.IChannelListener):
 
         :param state: A ChannelState.
         """
-        DNP3Outstation.get_agent().publish_outstation_status(str(state))
+        self.dnp3_outstation.get_agent().publish_outstation_status(str(state))
 
 
 # class MyLogger(asiodnp3.ConsoleLogger):
@@ -392,11 +593,12 @@ class MyLogger(openpal.ILogHandler):
         super(MyLogger, self).__init__()
 
     def Log(self, entry):
-        """Write a DNP3 log entry to the logger (debug level)."""
+        """Write a DNP3 log entry to the logger (debug level, rate-limited)."""
+        # The stack calls this for every entry its log levels allow. Skip them before touching the entry.
+        if not _log.isEnabledFor(logging.DEBUG):
+            return
         location = entry.location.rsplit('/')[-1] if entry.location else ''
-        filters = entry.filters.GetBitfield()
-        message = entry.message
-        _log.debug('DNP3Log {0}\t(filters={1}) {2}'.format(location, filters, message))
+        _stack_log.debug('DNP3Log %s\t(filters=%s) %s', location, entry.filters.GetBitfield(), entry.message)
         # This is here as an example of how to send a specific log entry to the message bus as outstation status.
         # if 'Accepted connection' in message or 'Listening on' in message:
         #     DNP3Outstation.get_agent().publish_outstation_status(str(message))
@@ -0,0 +1,125 @@
+"""
+Compiled cache of DNP3 service configuration files.
+
+Loading a large point map from text parses the whole YAML or JSON file and
+validates every point, which takes seconds for MESA and IEEE 1815.2 maps.
+load_config() does that once per version of a file: it writes the validated
+point definitions, and the rest of the configuration, to a compiled file next
+to the source. The compiled file is named after the SHA-1 of the source, so a
+changed source is parsed and compiled again, and the stale compiled file is
+removed.
+
+A compiled file holds marshalled tuples of simple data types. Loading it
+rebuilds the PointDefinitions without parsing or validating anything.
+marshal data is specific to the Python version, so the file records it, along
+with the point attributes it was compiled with. A mismatch of either is
+treated like a changed source.
+
+Compile ahead of time, e.g. when installing a points file:
+
+    python -m dnp3.point_cache points_config.yml
+"""
+import hashlib
+import json
+import logging
+import marshal
+import os
+import sys
+
+import yaml
+
+from dnp3.points import PointDefinitions, POINT_ATTRIBUTES
+
+MAGIC = b'DNP3PTS1'
+COMPILED_SUFFIX = '.dnp3c'
+
+_log = logging.getLogger(__name__)
+
+
+def compiled_path(source_path, digest, cache_dir=None):
+    """Return the compiled file path of a source file with a SHA-1 digest."""
+    directory, file_name = os.path.split(os.path.abspath(source_path))
+    return os.path.join(cache_dir or directory, '.{}.{}{}'.format(file_name, digest[:16], COMPILED_SUFFIX))
+
+
+def parse_config(source_path, data):
+    """Parse a JSON (with comments) or YAML configuration file's contents."""
+    if source_path.endswith('.json'):
+        return json.loads(PointDefinitions().strip_comments(data.decode('utf-8')))
+    # LibYAML parses an order of magnitude faster than the pure Python loader, when it is installed.
+    return yaml.load(data, Loader=getattr(yaml, 'CSafeLoader', yaml.SafeLoader))
+
+
+def _read_compiled(path, digest):
+    """Return the (config, point records) of a compiled file, or None if it is missing, stale or unreadable."""
+    try:
+        with open(path, 'rb') as compiled_file:
+            data = compiled_file.read()
+    except (IOError, OSError):
+        return None
+    header = MAGIC + digest.encode('ascii')
+    if not data.startswith(header):
+        return None
+    try:
+        python_version, point_attributes, config, records = marshal.loads(data[len(header):])
+    except (EOFError, ValueError, TypeError):
+        return None
+    if tuple(python_version) != tuple(sys.version_info[:2]) or tuple(point_attributes) != POINT_ATTRIBUTES:
+        return None
+    return config, records
+
+
+def _write_compiled(source_path, path, digest, config, records):
+    """Write a compiled file atomically and remove the compiled files of older versions of its source."""
+    payload = marshal.dumps((tuple(sys.version_info[:2]), POINT_ATTRIBUTES, config, records))
+    temp_path = '{}.{}.tmp'.format(path, os.getpid())
+    with open(temp_path, 'wb') as compiled_file:
+        compiled_file.write(MAGIC + digest.encode('ascii'))
+        compiled_file.write(payload)
+    os.rename(temp_path, path)
+    directory, file_name = os.path.split(path)
+    prefix = '.{}.'.format(os.path.basename(source_path))
+    for other_name in os.listdir(directory):
+        if other_name.startswith(prefix) and other_name.endswith(COMPILED_SUFFIX) and other_name != file_name:
+            os.remove(os.path.join(directory, other_name))
+
+
+def load_config(source_path, cache_dir=None):
+    """
+        Load a configuration file with a points list, from its compiled file if it is current.
+
+    :param source_path: A YAML file with a 'points' list and other settings, or a JSON file that is a points list.
+    :param cache_dir: The directory of the compiled file. Default: the source file's directory.
+    :return: A tuple of (dictionary of the other settings, PointDefinitions).
+    """
+    with open(source_path, 'rb') as source_file:
+        data = source_file.read()
+    digest = hashlib.sha1(data).hexdigest()
+    path = compiled_path(source_path, digest, cache_dir)
+    point_definitions = PointDefinitions()
+    compiled = _read_compiled(path, digest)
+    if compiled is not None:
+        config, records = compiled
+        point_definitions.load_compiled_points(records)
+        return config, point_definitions
+
+    document = parse_config(source_path, data)
+    if isinstance(document, list):
+        config, points = {}, document
+    else:
+        points = document.get('points') or []
+        config = dict((key, value) for key, value in document.items() if key != 'points')
+    point_definitions.load_points(points)
+    try:
+        _write_compiled(source_path, path, digest, config, point_definitions.compiled_points())
+    except (IOError, OSError, ValueError) as err:
+        # The configuration loaded, it just isn't compiled (e.g. a read-only directory or non-marshallable values).
+        _log.warning('Could not write compiled configuration {}: {}'.format(path, err))
+    return config, point_definitions
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    for source in sys.argv[1:]:
+        settings, point_defs = load_config(source)
+        _log.info('Compiled {} points of {}'.format(point_defs.point_count, source))
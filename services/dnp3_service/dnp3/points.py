@@ -32,14 +32,18 @@
 # United States Government or any agency thereof.
 # }}}
 
+import bisect
 from datetime import datetime
 import json
 import logging
+import numpy
 import os
 import pytz
 import re
+import time
 
 from pydnp3 import opendnp3
+from dnp3.log_control import PointLog
 
 DEFAULT_POINT_TOPIC = 'dnp3/point'
 DEFAULT_OUTSTATION_STATUS_TOPIC = 'mesa/outstation_status'
@@ -51,12 +55,27 @@ DIRECT_OPERATE = 'direct_operate'       # This is actually DIRECT OPERATE / RESP
 SELECT = 'select'                       # This is actually SELECT / RESPONSE
 OPERATE = 'operate'                     # This is actually OPERATE / RESPONSE
 
+# PointDefinition.deadband_type values:
+DEADBAND_ABSOLUTE = 'absolute'          # Report an analog when it moves more than deadband from the last reported value
+DEADBAND_PERCENT = 'percent'            # Report an analog when it moves more than deadband percent of the last reported value
+
 # Some PointDefinition.point_type values:
 POINT_TYPE_ANALOG_INPUT = 'Analog Input'
 POINT_TYPE_ANALOG_OUTPUT = 'Analog Output'
 POINT_TYPE_BINARY_INPUT = 'Binary Input'
 POINT_TYPE_BINARY_OUTPUT = 'Binary Output'
 
+# PointValue timestamps are nanoseconds of a monotonic clock. Python 2 has none, so it falls back to the wall clock there.
+try:
+    monotonic_ns = time.monotonic_ns
+except AttributeError:
+    def monotonic_ns():
+        return int(time.time() * 1e9)
+
+# The wall clock time of monotonic_ns() == _EPOCH_MONOTONIC_NS, for converting timestamps to datetimes.
+_EPOCH_WALL_CLOCK = time.time()
+_EPOCH_MONOTONIC_NS = monotonic_ns()
+
 # Default event group and variation for each of these types, in case they weren't spec'd for a point in the data file.
 EVENT_DEFAULTS_BY_POINT_TYPE = {
     POINT_TYPE_ANALOG_INPUT: {"group": 32, "variation": 3},
@@ -202,6 +221,10 @@ POINT_TYPES_BY_GROUP = {
 }
 
 _log = logging.getLogger(__name__)
+_point_log = PointLog(_log)
+
+# JavaScript-style (//... and /*...*/) and hash (#...) comments, outside of quoted strings.
+_COMMENT_RE = re.compile(r'((["\'])(?:\\?.)*?\2)|(/\*.*?\*/)|((?:#|//).*?(?=\n|$))', re.MULTILINE | re.DOTALL)
 
 
 class DNP3Exception(Exception):
@@ -209,13 +232,87 @@ class DNP3Exception(Exception):
     pass
 
 
+class PointIndex(object):
+    """
+        The lookup dictionaries of a PointDefinitions repository, built together so that they never disagree.
+
+        Array interior points are not stored. Each array is indexed once by its head point, and
+        lookups that land inside an array return an ArrayPointDefinition view created on demand.
+    """
+
+    def __init__(self):
+        self.by_point_type = {}             # point_type -> index -> PointDefinition
+        self.by_variation = {}              # group -> variation -> index -> PointDefinition
+        self.by_name = {}                   # name -> [PointDefinition, ...]
+        self.primary_by_name = {}           # name -> ArrayHeadPointDefinition if there is one, else the first point
+        self.by_name_and_index = {}         # (name, index) -> PointDefinition
+        self.array_starts = {}              # point_type -> sorted head indexes of its arrays
+        self.array_heads = {}               # point_type -> ArrayHeadPointDefinitions, in array_starts order
+        self.point_count = 0
+        self.max_index = {}                 # point_type -> highest index
+        self.declared_event_rate = {}       # point_type -> sum of the update_rate of points in an event class
+        self.undeclared_event_points = {}   # point_type -> number of points in an event class without an update_rate
+        self.shared_values = {}             # One copy of each description, units, type, control attribute and schedule
+
+    def add(self, point_def):
+        """Add a PointDefinition to every index. Raise a DNP3Exception if its point type and index are taken."""
+        point_type = point_def.point_type
+        point_type_dict = self.by_point_type.setdefault(point_type, {})
+        last_index = point_def.array_last_index if point_def.is_array_head_point else point_def.index
+        for index in range(point_def.index, last_index + 1):
+            conflict = point_type_dict.get(index, None) or self.array_cell(point_type, index)
+            if conflict is not None:
+                error_message = 'Discarding DNP3 duplicate {0} (conflicting {1})'
+                raise DNP3Exception(error_message.format(point_def, conflict))
+        for attribute in ('description', 'units', 'type', 'control_attribute', 'schedule'):
+            value = getattr(point_def, attribute)
+            setattr(point_def, attribute, self.shared_values.setdefault(value, value))
+        point_type_dict[point_def.index] = point_def
+        self.by_variation.setdefault(point_def.group, {}).setdefault(point_def.variation, {})[point_def.index] = point_def
+        self.by_name.setdefault(point_def.name, []).append(point_def)
+        primary = self.primary_by_name.get(point_def.name)
+        if primary is None or (point_def.is_array_head_point and not primary.is_array_head_point):
+            self.primary_by_name[point_def.name] = point_def
+        self.by_name_and_index.setdefault((point_def.name, point_def.index), point_def)
+        if point_def.is_array_head_point:
+            starts = self.array_starts.setdefault(point_type, [])
+            position = bisect.bisect(starts, point_def.index)
+            starts.insert(position, point_def.index)
+            self.array_heads.setdefault(point_type, []).insert(position, point_def)
+        cell_count = last_index - point_def.index + 1
+        self.point_count += cell_count
+        self.max_index[point_type] = max(self.max_index.get(point_type, -1), last_index)
+        if point_def.event_class in EVENT_CLASSES:
+            if point_def.update_rate is None:
+                self.undeclared_event_points[point_type] = self.undeclared_event_points.get(point_type, 0) + cell_count
+            else:
+                self.declared_event_rate[point_type] = (self.declared_event_rate.get(point_type, 0.0) +
+                                                        point_def.update_rate * cell_count)
+
+    def array_head(self, point_type, index):
+        """Return the ArrayHeadPointDefinition of the array that contains a point type and index, or None."""
+        starts = self.array_starts.get(point_type, None)
+        if not starts:
+            return None
+        position = bisect.bisect(starts, index) - 1
+        if position < 0:
+            return None
+        head = self.array_heads[point_type][position]
+        return head if index <= head.array_last_index else None
+
+    def array_cell(self, point_type, index):
+        """Return the array PointDefinition (head or interior view) at a point type and index, or None."""
+        head = self.array_head(point_type, index)
+        if head is None:
+            return None
+        return head.array_point_definition_for_index(index)
+
+
 class PointDefinitions(object):
     """In-memory repository of PointDefinitions."""
 
     def __init__(self, point_definitions_path=None):
-        self._points = {}
-        self._point_variation_dict = {}
-        self._point_name_dict = {}
+        self._index = PointIndex()
         if point_definitions_path:
             file_path = os.path.expandvars(os.path.expanduser(point_definitions_path))
             self.load_points_from_json_file(file_path)
@@ -248,47 +345,87 @@ class PointDefinitions(object):
         def _repl(match):
             return match.group(1) or ''
 
-        _comment_re = re.compile(r'((["\'])(?:\\?.)*?\2)|(/\*.*?\*/)|((?:#|//).*?(?=\n|$))', re.MULTILINE | re.DOTALL)
-        return _comment_re.sub(_repl, raw_string)
+        return _COMMENT_RE.sub(_repl, raw_string)
 
     def load_points(self, point_definitions_json):
-        """Load and cache a dictionary of PointDefinitions, indexed by point_type and point index."""
+        """
+            Load and cache a dictionary of PointDefinitions, indexed by point_type and point index.
+
+            All lookup indexes are built in a single pass over the definitions. They replace the
+            previous indexes only once every definition has loaded, so a reload never leaves a
+            mix of old and new points, and a failed reload leaves the old points in place.
+        """
+        point_index = PointIndex()
         try:
-            self._points = {}           # If they're already loaded, force a reload.
             for element in point_definitions_json:
                 # Load a PointDefinition (or subclass) from JSON, and add it to the dictionary of points.
                 # If the point defines an array, load additional definitions for each interior point in the array.
                 try:
                     if element.get('type', None) != 'array':
-                        point_def = PointDefinition(element)
-                        self.index_point(point_def)
+                        point_index.add(PointDefinition(element))
                     else:
-                        point_def = ArrayHeadPointDefinition(element)
-                        self.index_point(point_def)
-                        # Load a separate ArrayPointDefinition for each interior point in the array.
-                        for pt in point_def.create_array_point_definitions(element):
-                            self.index_point(pt)
+                        # Interior array points are created on demand from the ArrayHeadPointDefinition.
+                        point_index.add(ArrayHeadPointDefinition(element))
                 except ValueError as err:
                     raise DNP3Exception('Validation error for point with json: {}: {}'.format(element, err))
         except Exception as err:
             raise ValueError('Problem parsing PointDefinitions. Error={}'.format(err))
-        _log.debug('Loaded {} PointDefinitions'.format(len(self.all_points())))
+        self._index = point_index
+        _log.debug('Loaded {} PointDefinitions'.format(point_index.point_count))
+
+    def compiled_points(self):
+        """
+            Return the loaded definitions as a list of (is_array, attribute values) records of simple data types.
+
+            load_compiled_points() rebuilds the same PointDefinitions from the records without validating them again.
+        """
+        return [(point_def.is_array_head_point, point_def.compiled_attributes())
+                for point_defs in self._index.by_name.values()
+                for point_def in point_defs]
+
+    def load_compiled_points(self, records):
+        """Load the PointDefinitions of records returned by compiled_points(), replacing the loaded points."""
+        point_index = PointIndex()
+        for is_array, attributes in records:
+            if is_array:
+                point_index.add(ArrayHeadPointDefinition.from_compiled(attributes))
+            else:
+                point_index.add(PointDefinition.from_compiled(attributes))
+        self._index = point_index
+        _log.debug('Loaded {} compiled PointDefinitions'.format(point_index.point_count))
+
+    def diff(self, other):
+        """Return a PointDefinitionsDiff of the points added, removed and changed from these PointDefinitions to other."""
+        added, removed, changed = [], [], []
+        new_points = other._points_dictionary()
+        for point_type, old_by_index in self._points_dictionary().items():
+            new_by_index = new_points.get(point_type, {})
+            for index, old_def in old_by_index.items():
+                new_def = new_by_index.get(index, None)
+                if new_def is None:
+                    removed.append(old_def)
+                elif (new_def.__class__ is not old_def.__class__ or
+                      new_def.compiled_attributes() != old_def.compiled_attributes()):
+                    changed.append((old_def, new_def))
+        for point_type, new_by_index in new_points.items():
+            old_by_index = self._points_dictionary().get(point_type, {})
+            added.extend(new_def for index, new_def in new_by_index.items() if index not in old_by_index)
+        return PointDefinitionsDiff(added, removed, changed)
+
+    def replace_points(self, other):
+        """Replace the loaded points with those of other, in one step. Holders of these PointDefinitions see the new points."""
+        self._index = other._index
 
     def index_point(self, point_def):
         """Add a PointDefinition to the dictionary of points."""
-        point_type_dict = self._points.setdefault(point_def.point_type, {})
-        if point_def.index in point_type_dict:
-            error_message = 'Discarding DNP3 duplicate {0} (conflicting {1})'
-            raise DNP3Exception(error_message.format(point_def, point_type_dict[point_def.index]))
-        else:
-            point_type_dict[point_def.index] = point_def
+        self._index.add(point_def)
 
     def _points_dictionary(self):
         """Return a (cached) dictionary of PointDefinitions, indexed by point_type and point index."""
-        return self._points
+        return self._index.by_point_type
 
     def for_group_and_index(self, group, index):
-        return self._points_dictionary().get(PointDefinition.point_type_for_group(group), {}).get(index, None)
+        return self.for_point_type_and_index(PointDefinition.point_type_for_group(group), index)
 
     def point_value_for_command(self, command_type, command, index, op_type):
         """
@@ -300,21 +437,37 @@ class PointDefinitions(object):
         :param op_type: An OperateType, or None if command_type == 'Select'.
         :return: An instance of PointValue
         """
-        function_code = command.functionCode if type(command) == opendnp3.ControlRelayOutputBlock else None
-        point_type = POINT_TYPE_BINARY_OUTPUT if function_code else POINT_TYPE_ANALOG_OUTPUT
+        point_type, function_code, value = self.command_values(command)
         point_def = self.for_point_type_and_index(point_type, index)
         if not point_def:
             raise DNP3Exception('No DNP3 PointDefinition found for point type {0} and index {1}'.format(point_type,
                                                                                                         index))
         point_value = PointValue(command_type,
                                  function_code,
-                                 command.value if not function_code else None,
+                                 value,
                                  point_def,
                                  index,
                                  op_type)
-        _log.debug('Received DNP3 {}'.format(point_value))
+        _point_log.debug('Received DNP3 %s', point_value)
         return point_value
 
+    @staticmethod
+    def command_values(command):
+        """
+            Copy the data out of a command received from the master.
+
+        :param command: A ControlRelayOutputBlock or else a wrapped data value (AnalogOutputInt16, etc.).
+        :return: A (point type, function code, value) tuple. The function code is None for analog outputs,
+                 and the value is None for binary outputs.
+        """
+        if type(command) == opendnp3.ControlRelayOutputBlock:
+            function_code = command.functionCode
+        else:
+            function_code = None
+        if function_code:
+            return POINT_TYPE_BINARY_OUTPUT, function_code, None
+        return POINT_TYPE_ANALOG_OUTPUT, None, command.value
+
     def for_point_type_and_index(self, point_type, index):
         """
             Return a PointDefinition for a given data type and index.
@@ -323,34 +476,35 @@ class PointDefinitions(object):
         @param index: Unique integer index of the PointDefinition to be looked up.
         @return: A PointDefinition.
         """
-        return self._points_dictionary().get(point_type, {}).get(index, None)
+        point_def = self._points_dictionary().get(point_type, {}).get(index, None)
+        if point_def is None:
+            point_def = self._index.array_cell(point_type, index)
+        return point_def
+
+    def array_head_for_point_type_and_index(self, point_type, index):
+        """Return the ArrayHeadPointDefinition of the array that contains a point type and index, or None."""
+        return self._index.array_head(point_type, index)
 
     def _points_by_variation(self):
         """Return a (cached) dictionary of PointDefinitions, indexed by group, variation and index."""
-        if not self._point_variation_dict:
-            for point_type, inner_dict in self._points_dictionary().items():
-                for index, point_def in inner_dict.items():
-                    if self._point_variation_dict.get(point_def.group, None):
-                        self._point_variation_dict[point_def.group] = {}
-                    if self._point_variation_dict[point_def.group].get(point_def.variation, None):
-                        self._point_variation_dict[point_def.group][point_def.variation] = {}
-                    self._point_variation_dict[point_def.group][point_def.variation][index] = point_def
-        return self._point_variation_dict
+        return self._index.by_variation
 
     def point_for_variation_and_index(self, group, variation, index):
         """Return a PointDefinition for a given group, variation and index."""
-        return self._points_by_variation().get(group, {}).get(variation, {}).get(index, None)
+        point_def = self._points_by_variation().get(group, {}).get(variation, {}).get(index, None)
+        if point_def is None:
+            point_def = self._index.array_cell(PointDefinition.point_type_for_group(group), index)
+            if point_def is not None and (point_def.group != group or point_def.variation != variation):
+                point_def = None
+        return point_def
 
     def points_by_name(self):
-        """Return a (cached) dictionary of PointDefinition lists, indexed by name."""
-        if not self._point_name_dict:
-            for point_type, inner_dict in self._points_dictionary().items():
-                for index, point_def in inner_dict.items():
-                    point_name = point_def.name
-                    if point_name not in self._point_name_dict:
-                        self._point_name_dict[point_name] = []
-                    self._point_name_dict[point_name].append(point_def)
-        return self._point_name_dict
+        """
+            Return a (cached) dictionary of PointDefinition lists, indexed by name.
+
+            Array interior points are not listed, use point_named(name, index) to look them up.
+        """
+        return self._index.by_name
 
     def point_named(self, name, index=None):
         """
@@ -360,22 +514,15 @@ class PointDefinitions(object):
         :param index: (integer) An optional index value. If supplied, search for an array point at this DNP3 index.
         :return A PointDefinition, or None if no match.
         """
-        point_def_list = self.points_by_name().get(name, None)
-        if point_def_list is None:
-            return None                     # No points with that name
-
         if index is not None:
-            # Return the PointDefinition with a matching index.
-            for pt in point_def_list:
-                if pt.index == index:
-                    return pt
-            return None
-
+            point_def = self._index.by_name_and_index.get((name, index), None)
+            if point_def is None:
+                head = self._index.primary_by_name.get(name, None)
+                if head is not None and head.is_array_head_point and head.index <= index <= head.array_last_index:
+                    point_def = head.array_point_definition_for_index(index)
+            return point_def
         # In multi-element lists, give preference to the ArrayHeadPointDefinition.
-        for pt in point_def_list:
-            if pt.is_array_head_point:
-                return pt
-        return point_def_list[0]
+        return self._index.primary_by_name.get(name, None)
 
     def get_point_named(self, name, index=None):
         """
@@ -396,18 +543,82 @@ class PointDefinitions(object):
 
     def all_points(self):
         """Return a flat list of all PointDefinitions."""
-        point_list = []
+        return list(self.iter_points())
+
+    def iter_points(self):
+        """Generate every PointDefinition, including a view of each array interior point."""
         for inner_dict in self._points_dictionary().values():
-            point_list.extend(inner_dict.values())
-        return point_list
+            for point_def in inner_dict.values():
+                yield point_def
+                if point_def.is_array_head_point:
+                    for array_point_def in point_def.create_array_point_definitions():
+                        yield array_point_def
+
+    @property
+    def point_count(self):
+        """Return the number of points, counting every array interior point."""
+        return self._index.point_count
+
+    def database_size(self, point_type):
+        """Return the outstation database size that a point type needs: its highest index + 1, 0 if it has no points."""
+        return self._index.max_index.get(point_type, -1) + 1
+
+    def event_rate(self, point_type, default_update_rate):
+        """
+            Return the expected events per second of a point type's points that are in an event class.
+
+        :param point_type: A point type (string).
+        :param default_update_rate: Updates per second of the points that don't declare an update_rate.
+        """
+        return (self._index.declared_event_rate.get(point_type, 0.0) +
+                self._index.undeclared_event_points.get(point_type, 0) * default_update_rate)
 
     def all_point_names(self):
         return self.points_by_name().keys()
 
 
+class PointDefinitionsDiff(object):
+    """The point definitions added, removed and changed by a reload, matched by point type and index."""
+
+    def __init__(self, added, removed, changed):
+        """
+        :param added: New PointDefinitions.
+        :param removed: Old PointDefinitions.
+        :param changed: (old PointDefinition, new PointDefinition) tuples.
+        """
+        self.added = added
+        self.removed = removed
+        self.changed = changed
+
+    def __len__(self):
+        return len(self.added) + len(self.removed) + len(self.changed)
+
+    def __str__(self):
+        return '{} added, {} removed, {} changed points'.format(len(self.added), len(self.removed), len(self.changed))
+
+    def affected_indexes(self, point_type):
+        """Return the set of indexes of a point type whose definition was added, removed or changed."""
+        point_defs = self.added + self.removed + [pt for pair in self.changed for pt in pair]
+        indexes = set()
+        for point_def in point_defs:
+            if point_def.point_type == point_type:
+                last_index = point_def.array_last_index if point_def.is_array_head_point else point_def.index
+                indexes.update(range(point_def.index, last_index + 1))
+        return indexes
+
+
+# Attributes read from a point's JSON definition. Definitions keep them in __slots__ rather than a __dict__.
+POINT_ATTRIBUTES = ('name', 'type', 'group', 'variation', 'index', 'description', 'scaling_multiplier', 'units',
+                    'event_class', 'event_group', 'event_variation', 'selector_block_start', 'selector_block_end',
+                    'save_on_write', 'measurement_mrid', 'measurement_attribute', 'control_mrid', 'control_attribute',
+                    'deadband', 'deadband_type', 'update_rate', 'schedule')
+
+
 class BasePointDefinition(object):
     """Abstract superclass for PointDefinition data holders."""
 
+    __slots__ = ()
+
     def __init__(self, element_def):
         """Initialize an instance of the PointDefinition from a dictionary of point attributes."""
         self.name = str(element_def.get('name', ''))
@@ -424,6 +635,31 @@ class BasePointDefinition(object):
         self.selector_block_start = element_def.get('selector_block_start', None)
         self.selector_block_end = element_def.get('selector_block_end', None)
         self.save_on_write = element_def.get('save_on_write', None)
+        # The simulation measurement that feeds an input point, and which of its values (magnitude, angle or value).
+        self.measurement_mrid = element_def.get('measurement_mrid', None)
+        self.measurement_attribute = element_def.get('measurement_attribute', None)
+        # The CIM object and attribute (e.g. Switch.open) that an Operate of an output point changes in the simulation.
+        self.control_mrid = element_def.get('control_mrid', None)
+        self.control_attribute = element_def.get('control_attribute', None)
+        # Report-by-exception. Binaries with any deadband are reported only when they change.
+        self.deadband = element_def.get('deadband', None)
+        self.deadband_type = element_def.get('deadband_type', DEADBAND_ABSOLUTE if self.deadband is not None else None)
+        # Expected updates per second, used to size the outstation's event buffers.
+        self.update_rate = element_def.get('update_rate', None)
+        # A GridLAB-D player file that the SchedulePlayer plays back into an input point.
+        self.schedule = element_def.get('schedule', None)
+
+    def compiled_attributes(self):
+        """Return the values of the definition's attributes, in compiled_slots order."""
+        return tuple(getattr(self, attribute) for attribute in self.compiled_slots)
+
+    @classmethod
+    def from_compiled(cls, attributes):
+        """Return a definition with the attribute values of compiled_attributes(). They are not validated again."""
+        point_def = cls.__new__(cls)
+        for attribute, value in zip(cls.compiled_slots, attributes):
+            setattr(point_def, attribute, value)
+        return point_def
 
     @property
     def is_array_point(self):
@@ -460,6 +696,17 @@ class BasePointDefinition(object):
             else:
                 raise ValueError('Missing event variation for {}'.format(self.name))
 
+        if self.deadband is not None:
+            if self.deadband < 0:
+                raise ValueError('Negative deadband for {}'.format(self.name))
+            if self.deadband_type not in [DEADBAND_ABSOLUTE, DEADBAND_PERCENT]:
+                raise ValueError('Invalid deadband_type for {}: {}'.format(self.name, self.deadband_type))
+        if self.update_rate is not None and self.update_rate < 0:
+            raise ValueError('Negative update_rate for {}'.format(self.name))
+
+        if self.control_mrid is not None and self.control_attribute is None:
+            raise ValueError('Missing control_attribute for {}'.format(self.name))
+
         if self.is_selector_block:
             if self.selector_block_start is None:
                 raise ValueError('Missing selector_block_end for block named {}'.format(self.name))
@@ -499,6 +746,21 @@ class BasePointDefinition(object):
             point_json["selector_block_end"] = self.selector_block_end
         if self.save_on_write is not None:
             point_json["save_on_write"] = self.save_on_write
+        if self.measurement_mrid is not None:
+            point_json["measurement_mrid"] = self.measurement_mrid
+        if self.measurement_attribute is not None:
+            point_json["measurement_attribute"] = self.measurement_attribute
+        if self.control_mrid is not None:
+            point_json["control_mrid"] = self.control_mrid
+        if self.control_attribute is not None:
+            point_json["control_attribute"] = self.control_attribute
+        if self.deadband is not None:
+            point_json["deadband"] = self.deadband
+            point_json["deadband_type"] = self.deadband_type
+        if self.update_rate is not None:
+            point_json["update_rate"] = self.update_rate
+        if self.schedule is not None:
+            point_json["schedule"] = self.schedule
         return point_json
 
     def __str__(self):
@@ -569,6 +831,9 @@ class BasePointDefinition(object):
 class PointDefinition(BasePointDefinition):
     """Data holder for an OpenDNP3 data element."""
 
+    __slots__ = POINT_ATTRIBUTES
+    compiled_slots = POINT_ATTRIBUTES
+
     def __init__(self, element_def):
         """Initialize an instance of the PointDefinition from a dictionary of point attributes."""
         super(PointDefinition, self).__init__(element_def)
@@ -584,18 +849,40 @@ class PointDefinition(BasePointDefinition):
 class ArrayHeadPointDefinition(BasePointDefinition):
     """Data holder for an OpenDNP3 data element that is the head point in an array."""
 
+    # column_offsets and array_indexes are derived from the other attributes, so they aren't compiled.
+    __slots__ = POINT_ATTRIBUTES + ('array_points', 'array_times_repeated', 'column_offsets', 'array_indexes')
+    compiled_slots = POINT_ATTRIBUTES + ('array_points', 'array_times_repeated')
+
     def __init__(self, json_element):
         """
-            Initialize an ArrayPointDefinition instance.
-            An ArrayPointDefinition defines an interior point (not the head point) in an array.
+            Initialize an ArrayHeadPointDefinition instance.
+            The interior points of the array are ArrayPointDefinition views, created on demand.
 
         :param json_element: A JSON dictionary of point attributes.
         """
         super(ArrayHeadPointDefinition, self).__init__(json_element)
         self.array_points = json_element.get('array_points', None)
         self.array_times_repeated = json_element.get('array_times_repeated', None)
-        self.array_point_definitions = []         # Holds all ArrayPointDefinitions belonging to this array.
         self.validate_point()
+        self.map_array_points()
+
+    @classmethod
+    def from_compiled(cls, attributes):
+        point_def = super(ArrayHeadPointDefinition, cls).from_compiled(attributes)
+        point_def.map_array_points()
+        return point_def
+
+    def map_array_points(self):
+        """
+            Precompute the array's maps:
+                column_offsets: array element name -> column number.
+                array_indexes: a (row, column) numpy array of the DNP3 index of each point in the array.
+        """
+        column_count = len(self.array_points)
+        self.column_offsets = dict((pt['name'], column) for column, pt in enumerate(self.array_points))
+        self.array_indexes = numpy.arange(self.index,
+                                          self.index + self.array_times_repeated * column_count).reshape(
+            self.array_times_repeated, column_count)
 
     def validate_point(self):
         """An ArrayHeadPointDefinition has been created. Perform a variety of validations on it."""
@@ -606,6 +893,9 @@ class ArrayHeadPointDefinition(BasePointDefinition):
             raise ValueError('Missing array_points for array named {}'.format(self.name))
         if self.array_times_repeated is None:
             raise ValueError('Missing array_times_repeated for array named {}'.format(self.name))
+        for pt in self.array_points:
+            if pt.get('name', None) is None:
+                raise ValueError('Missing array element name for array named {}'.format(self.name))
 
     @property
     def is_array_point(self):
@@ -633,54 +923,94 @@ class ArrayHeadPointDefinition(BasePointDefinition):
         else:
             return None
 
-    def create_array_point_definitions(self, element):
-        """Create a separate ArrayPointDefinition for each interior point in the array."""
-        for row_number in range(self.array_times_repeated):
-            for column_number, pt in enumerate(self.array_points):
+    def array_point_definition_for_index(self, index):
+        """Return the PointDefinition at an index inside the array: this head point or an interior view."""
+        if index == self.index:
+            return self
+        row, column = divmod(index - self.index, len(self.array_points))
+        return ArrayPointDefinition(self, row, column)
+
+    @property
+    def array_point_definitions(self):
+        """Return an ArrayPointDefinition view for each interior point in the array."""
+        return self.create_array_point_definitions()
+
+    def create_array_point_definitions(self, element=None):
+        """Return an ArrayPointDefinition view for each interior point in the array."""
+        return [ArrayPointDefinition(self, row_number, column_number)
+                for row_number in range(self.array_times_repeated)
+                for column_number in range(len(self.array_points))
                 # The ArrayHeadPointDefinition is already defined -- don't create a redundant definition.
-                if row_number > 0 or column_number > 0:
-                    array_pt_def = ArrayPointDefinition(element, self, row_number, column_number, pt['name'])
-                    self.array_point_definitions.append(array_pt_def)
-        return self.array_point_definitions
+                if row_number > 0 or column_number > 0]
 
 
-class ArrayPointDefinition(BasePointDefinition):
-    """Data holder for an OpenDNP3 data element that is interior to an array."""
+def _array_head_attribute(attribute):
+    """Return a read-only property that delegates an attribute to the array's head point."""
+    return property(lambda self: getattr(self.base_point_def, attribute))
+
 
-    def __init__(self, json_element, base_point_def, row, column, array_element_name):
+class ArrayPointDefinition(BasePointDefinition):
+    """
+        View of an OpenDNP3 data element that is interior to an array.
+
+        All of its definition except the index is shared with the array's ArrayHeadPointDefinition,
+        so a view only stores the head point, row and column.
+    """
+
+    __slots__ = ('base_point_def', 'row', 'column')
+
+    name = _array_head_attribute('name')
+    type = _array_head_attribute('type')
+    group = _array_head_attribute('group')
+    variation = _array_head_attribute('variation')
+    description = _array_head_attribute('description')
+    scaling_multiplier = _array_head_attribute('scaling_multiplier')
+    units = _array_head_attribute('units')
+    event_class = _array_head_attribute('event_class')
+    event_group = _array_head_attribute('event_group')
+    event_variation = _array_head_attribute('event_variation')
+    selector_block_start = _array_head_attribute('selector_block_start')
+    selector_block_end = _array_head_attribute('selector_block_end')
+    save_on_write = _array_head_attribute('save_on_write')
+    measurement_mrid = _array_head_attribute('measurement_mrid')
+    measurement_attribute = _array_head_attribute('measurement_attribute')
+    control_mrid = _array_head_attribute('control_mrid')
+    control_attribute = _array_head_attribute('control_attribute')
+    deadband = _array_head_attribute('deadband')
+    deadband_type = _array_head_attribute('deadband_type')
+    update_rate = _array_head_attribute('update_rate')
+    schedule = _array_head_attribute('schedule')
+
+    def __init__(self, base_point_def, row, column):
         """
-            Initialize an ArrayPointDefinition instance.
+            Initialize an ArrayPointDefinition view.
             An ArrayPointDefinition defines an interior point (not the head point) in an array.
 
-        :param json_element: A JSON dictionary of point attributes.
         :param base_point_def: The PointDefinition of the head point in the array.
         :param row: The point's row number in the array.
         :param column: The point's column number in the array.
-        :param array_element_name: The point's column name in the array.
         """
-        super(ArrayPointDefinition, self).__init__(json_element)
         self.base_point_def = base_point_def
         self.row = row
         self.column = column
-        self.index = self.base_point_def.index + row * len(self.base_point_def.array_points) + column
-        self.array_element_name = array_element_name
-        self.validate_point()
 
-    def validate_point(self):
-        """An ArrayPointDefinition has been created. Perform a variety of validations on it."""
-        super(ArrayPointDefinition, self).validate_point()
-        if self.type != 'array':
-            raise ValueError('Invalid type {} for array named {}'.format(self.type, self.name))
-        if self.base_point_def is None:
-            raise ValueError('Missing base point definition for array point named {}'.format(self.name))
-        if self.row is None:
-            raise ValueError('Missing row number for array point named {}'.format(self.name))
-        if self.column is None:
-            raise ValueError('Missing column number for array point named {}'.format(self.name))
-        if self.index is None:
-            raise ValueError('Missing index value for array point named {}'.format(self.name))
-        if self.array_element_name is None:
-            raise ValueError('Missing array element name for array point named {}'.format(self.name))
+    def __eq__(self, other):
+        return (isinstance(other, ArrayPointDefinition) and other.base_point_def is self.base_point_def
+                and other.row == self.row and other.column == self.column)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((id(self.base_point_def), self.row, self.column))
+
+    @property
+    def index(self):
+        return self.base_point_def.index + self.row * len(self.base_point_def.array_points) + self.column
+
+    @property
+    def array_element_name(self):
+        return self.base_point_def.array_points[self.column]['name']
 
     @property
     def is_array_point(self):
@@ -693,23 +1023,25 @@ class ArrayPointDefinition(BasePointDefinition):
     def as_json(self):
         """Return a json description of the ArrayPointDefinition."""
         point_json = super(ArrayPointDefinition, self).as_json()
-        if self.row is not None:
-            point_json["row"] = self.row
-        if self.row is not None:
-            point_json["column"] = self.column
-        if self.row is not None:
-            point_json["array_element_name"] = self.array_element_name
+        point_json["row"] = self.row
+        point_json["column"] = self.column
+        point_json["array_element_name"] = self.array_element_name
         return point_json
 
 
 class PointValue(object):
-    """Data holder for a point value (DNP3 measurement or command) received by an outstation."""
+    """
+        Data holder for a point value (DNP3 measurement or command) received by an outstation.
+
+        An Operate creates one of these per command, so it has slots instead of a dictionary, and records
+        when it was received as monotonic_ns(). when_received converts that to a datetime when it's asked for.
+    """
+
+    __slots__ = ('received_ns', 'command_type', 'function_code', 'value', 'point_def', 'index', 'op_type')
 
-    def __init__(self, command_type, function_code, value, point_def, index, op_type):
-        """Initialize an instance of the PointValue."""
-        # Don't rely on VOLTTRON utils in this code, which may run outside of VOLTTRON
-        # self.when_received = utils.get_aware_utc_now()
-        self.when_received = pytz.UTC.localize(datetime.utcnow())
+    def __init__(self, command_type, function_code, value, point_def, index, op_type, received_ns=None):
+        """Initialize an instance of the PointValue. received_ns is its monotonic_ns() receipt time, default now."""
+        self.received_ns = monotonic_ns() if received_ns is None else received_ns
         self.command_type = command_type
         self.function_code = function_code
         self.value = value
@@ -719,12 +1051,17 @@ class PointValue(object):
 
     def __str__(self):
         """Return a string description of the PointValue."""
-        str_desc = 'Point value {0} ({1}, {2}.{3}, {4})'
-        return str_desc.format(self.value or self.function_code,
-                               self.name,
-                               self.point_def.group_and_variation,
-                               self.index,
-                               self.command_type)
+        return 'Point value {0} ({1}, {2}.{3}, {4})'.format(self.value or self.function_code,
+                                                            self.name,
+                                                            self.point_def.group_and_variation,
+                                                            self.index,
+                                                            self.command_type)
+
+    @property
+    def when_received(self):
+        """Return the (timezone-aware, UTC) datetime when the PointValue was received."""
+        seconds = _EPOCH_WALL_CLOCK + (self.received_ns - _EPOCH_MONOTONIC_NS) / 1e9
+        return pytz.UTC.localize(datetime.utcfromtimestamp(seconds))
 
     @property
     def name(self):
@@ -745,34 +1082,25 @@ class PointArray(object):
 
     def __init__(self, point_def):
         """
-            The "points" variable is a dictionary of dictionaries:
-                0: {
-                    0: PointValue,
-                    1: PointValue
-                },
-                1: {
-                    0: PointValue,
-                    1: PointValue
-                }
-                (etc.)
-            It's stored as dictionaries indexed by index numbers, not as lists,
-            because there's no guarantee that array elements will arrive in order.
+            The array's points are held in two arrays shaped like the array (rows by columns):
+                values: The value of each point (a numpy object array).
+                valid: Whether each point's value has been received.
+            Array elements can arrive in any order, and some may not arrive at all.
 
         :param point_def: The PointDefinition of the array's head point.
         """
-        _log.debug('New Array {} starting at {} with bounds ({}, {})'.format(point_def.name,
-                                                                             point_def.index,
-                                                                             point_def.index,
-                                                                             point_def.array_last_index))
+        _log.debug('New Array %s starting at %s with bounds (%s, %s)', point_def.name, point_def.index,
+                   point_def.index, point_def.array_last_index)
         self.point_def = point_def
-        self.points = {}
+        self.values = numpy.empty(point_def.array_indexes.shape, dtype=object)
+        self.valid = numpy.zeros(point_def.array_indexes.shape, dtype=bool)
 
     def __str__(self):
-        return 'Array, points = {}'.format(self.points)
+        return 'Array, points = {}'.format(self.as_json())
 
     def as_json(self):
         """
-            Return a JSON representation of the PointArray:
+            Return a JSON representation of the PointArray's received rows:
 
                 [
                     {name1: val1a, name2: val2a, ...},
@@ -781,21 +1109,46 @@ class PointArray(object):
                 ]
         """
         names = [d['name'] for d in self.point_def.array_points]
-        json_array = []
-        for pt_dict_key in sorted(self.points):
-            pt_dict = self.points[pt_dict_key]
-            json_array.append({name: (pt_dict[i].value if i in pt_dict else None) for i, name in enumerate(names)})
-        return json_array
+        rows = self.valid.any(axis=1)
+        values = numpy.where(self.valid[rows], self.values[rows], None)
+        return [dict(zip(names, row)) for row in values.tolist()]
+
+    def update_from_json(self, json_array):
+        """
+            Set the values in a JSON representation of an array (see as_json()), in one pass.
+
+        :param json_array: A list of rows, each a dictionary of array element name to value.
+        """
+        if len(json_array) > self.valid.shape[0]:
+            raise DNP3Exception('Received {} rows for array {} of {} rows'.format(len(json_array),
+                                                                              self.point_def.name,
+                                                                              self.valid.shape[0]))
+        column_offsets = self.point_def.column_offsets
+        rows, columns, values = [], [], []
+        for row, point_dict in enumerate(json_array):
+            for name, value in point_dict.items():
+                column = column_offsets.get(name, None)
+                if column is None:
+                    raise DNP3Exception('No element named {} in array {}'.format(name, self.point_def.name))
+                rows.append(row)
+                columns.append(column)
+                values.append(value)
+        # Fill an object array first, so numpy doesn't convert a mix of (e.g.) booleans and floats to one type.
+        cells = numpy.empty(len(values), dtype=object)
+        cells[:] = values
+        self.values[rows, columns] = cells
+        self.valid[rows, columns] = True
+
+    def updates(self):
+        """Return the (index, value) of each received point, in index order."""
+        return zip(self.point_def.array_indexes[self.valid].tolist(), self.values[self.valid].tolist())
 
     def contains_index(self, index):
         """Answer whether this Array contains the point index."""
         return self.point_def.index <= index <= self.point_def.array_last_index
 
     def add_point_value(self, point_value):
-        """Add point_value to the Array's "points" dictionary."""
-        point_def = point_value.point_def
-        row = 0 if point_def.is_array_head_point else point_def.row
-        col = 0 if point_def.is_array_head_point else point_def.column
-        if row not in self.points:
-            self.points[row] = {}
-        self.points[row][col] = point_value
+        """Set the value of the array point that point_value is for."""
+        row, column = divmod(int(point_value.index) - self.point_def.index, self.valid.shape[1])
+        self.values[row, column] = point_value.value
+        self.valid[row, column] = True
@@ -0,0 +1,288 @@
+"""
+Play GridLAB-D player files back into DNP3 input points.
+
+Input points name the player file that drives them in the points config:
+
+    - name: "House.Load"
+      group: 30
+      variation: 1
+      index: 20
+      schedule: "zipload_schedule.player"
+      scaling_multiplier: 1000
+
+A player file has one "timestamp,value" line per change. The first timestamp
+is absolute (e.g. "2009-07-21 00:00:00 UTC") and later ones are either
+absolute or relative to the previous line ("+1m", "+30s", "+2h", "+1d").
+Each file is compiled once into NumPy arrays of seconds since its first line
+and values.
+
+Every interval seconds of wall clock time, the SchedulePlayer advances the
+schedules by interval * speed seconds, looping at their end. It interpolates
+each schedule's value at that time (linearly, or holding the previous value
+like GridLAB-D with interpolation 'step'), scales it by the points' scaling
+multipliers in one NumPy operation, drops the values that didn't change or
+are inside their deadband, and applies the rest to the outstation in one
+batched update.
+"""
+import calendar
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+import numpy
+
+from pydnp3 import opendnp3
+from dnp3.deadband import DeadbandFilter
+from dnp3.points import DNP3Exception, POINT_TYPE_ANALOG_INPUT, POINT_TYPE_BINARY_INPUT
+
+INTERPOLATION_LINEAR = 'linear'
+INTERPOLATION_STEP = 'step'
+DEFAULT_PLAYBACK_INTERVAL = 1.0
+RELATIVE_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+_log = logging.getLogger(__name__)
+
+
+def parse_timestamp(timestamp):
+    """Return the seconds since the epoch of a player file timestamp. A trailing time zone name is ignored (UTC)."""
+    fields = timestamp.split()
+    return calendar.timegm(datetime.strptime(' '.join(fields[:2]), '%Y-%m-%d %H:%M:%S').timetuple())
+
+
+class Schedule(object):
+    """The times and values of a player file."""
+
+    def __init__(self, times, values, interpolation=INTERPOLATION_LINEAR):
+        """
+        :param times: A float array of seconds since the first value, increasing.
+        :param values: A float array of values.
+        :param interpolation: INTERPOLATION_LINEAR or INTERPOLATION_STEP.
+        """
+        if not len(times):
+            raise DNP3Exception('A schedule needs at least one value')
+        self.times = times
+        self.values = values
+        self.interpolation = interpolation
+        # A looped schedule repeats after its last value has been held for the median step.
+        self.period = times[-1] + (numpy.median(numpy.diff(times)) if len(times) > 1 else 1.0)
+
+    @classmethod
+    def from_player_file(cls, path, interpolation=INTERPOLATION_LINEAR):
+        """Compile a GridLAB-D player file."""
+        times = []
+        values = []
+        start = None
+        with open(path) as player_file:
+            for line_number, line in enumerate(player_file, 1):
+                # GridLAB-D allows comments and a trailing semicolon.
+                line = line.split('#', 1)[0].strip().rstrip(';')
+                if not line:
+                    continue
+                try:
+                    timestamp, value = line.rsplit(',', 1)
+                    timestamp = timestamp.strip()
+                    if timestamp.startswith('+'):
+                        seconds = times[-1] + float(timestamp[1:-1]) * RELATIVE_UNITS[timestamp[-1]]
+                    else:
+                        absolute = parse_timestamp(timestamp)
+                        start = absolute if start is None else start
+                        seconds = absolute - start
+                    times.append(float(seconds))
+                    values.append(float(value))
+                except (ValueError, KeyError, IndexError) as err:
+                    raise DNP3Exception('Invalid player file line {}:{}: {}'.format(path, line_number, err))
+        return cls(numpy.array(times), numpy.array(values), interpolation)
+
+    def values_at(self, seconds, loop=True):
+        """Return the schedule's value at an array of seconds since its start."""
+        if loop:
+            seconds = numpy.mod(seconds, self.period)
+        if self.interpolation == INTERPOLATION_STEP:
+            positions = numpy.searchsorted(self.times, seconds, side='right') - 1
+            return self.values[numpy.clip(positions, 0, len(self.values) - 1)]
+        return numpy.interp(seconds, self.times, self.values)
+
+
+class ScheduleMapping(object):
+    """The scheduled input points of one point type, grouped by the schedule that drives them."""
+
+    def __init__(self, point_defs, schedules, scaled=True, binary=False):
+        """
+        :param point_defs: The PointDefinitions that name a schedule.
+        :param schedules: A dictionary of schedule name to Schedule.
+        :param scaled: Whether to apply each point's scaling_multiplier.
+        :param binary: Whether the points are binary, so a value only changes when it turns on (nonzero) or off (0).
+        """
+        self.binary = binary
+        names = sorted(set(pt.schedule for pt in point_defs))
+        numbers = dict((name, number) for number, name in enumerate(names))
+        self.schedules = [schedules[name] for name in names]
+        point_defs = sorted(point_defs, key=lambda pt: numbers[pt.schedule])
+        schedule_numbers = numpy.array([numbers[pt.schedule] for pt in point_defs], dtype=numpy.int64)
+        self.indexes = numpy.array([pt.index for pt in point_defs], dtype=numpy.int64)
+        self.multipliers = numpy.array([pt.scaling_multiplier if scaled else 1 for pt in point_defs],
+                                       dtype=numpy.float64)
+        # Points are sorted by schedule, so each schedule's value is repeated over a run of points.
+        self.run_lengths = numpy.bincount(schedule_numbers, minlength=len(names))
+        self.last_values = numpy.full(len(point_defs), numpy.nan)
+
+    def __len__(self):
+        return len(self.indexes)
+
+    def changed_values(self, seconds, loop=True):
+        """
+            Return the outstation indexes and scaled values of the points whose value changed.
+
+        :param seconds: The playback time, in seconds since the start of the schedules.
+        :return: A tuple of (index array, value array).
+        """
+        schedule_values = numpy.array([schedule.values_at(seconds, loop) for schedule in self.schedules],
+                                      dtype=numpy.float64)
+        values = numpy.repeat(schedule_values, self.run_lengths) * self.multipliers
+        if self.binary:
+            values = (values != 0).astype(numpy.float64)
+        changed = numpy.flatnonzero(values != self.last_values)
+        self.last_values[changed] = values[changed]
+        return self.indexes[changed], values[changed]
+
+
+class SchedulePlayer(object):
+    """Play the schedules of an outstation's input points into its database."""
+
+    def __init__(self, outstation, point_definitions, schedule_dir='.', speed=1.0,
+                 interval=DEFAULT_PLAYBACK_INTERVAL, interpolation=INTERPOLATION_LINEAR, loop=True,
+                 start_offset=0.0, deadband_filter=None, schedules=None):
+        """
+        :param outstation: The DNP3Outstation to update.
+        :param point_definitions: The outstation's PointDefinitions.
+        :param schedule_dir: The directory that relative schedule paths are relative to.
+        :param speed: Schedule seconds played per second of wall clock time, e.g. 60 plays a minute per second.
+        :param interval: Seconds of wall clock time between updates.
+        :param interpolation: INTERPOLATION_LINEAR or INTERPOLATION_STEP.
+        :param loop: Whether to repeat the schedules when they end. If not, they hold their last value.
+        :param start_offset: The schedule time, in seconds since the start of the schedules, to start playing at.
+        :param deadband_filter: The outstation's DeadbandFilter. By default one is created from point_definitions.
+        :param schedules: A dictionary of compiled Schedules by schedule path, shared with other SchedulePlayers.
+        """
+        self.outstation = outstation
+        self.schedule_dir = schedule_dir
+        self.speed = speed
+        self.interval = interval
+        self.interpolation = interpolation
+        self.loop = loop
+        self.start_offset = start_offset
+        self.deadband_filter = deadband_filter or DeadbandFilter(point_definitions)
+        self.schedules = {} if schedules is None else schedules
+        self.analog_mapping = None
+        self.binary_mapping = None
+        self.reload(point_definitions)
+        self.tick_count = 0
+        self.update_count = 0
+        self.last_duration = None
+        self.max_duration = 0.0
+        self._total_duration = 0.0
+        self._started = None
+        self._stop = threading.Event()
+        self._thread = None
+        _log.debug('Scheduled {} analog and {} binary input points'.format(len(self.analog_mapping),
+                                                                           len(self.binary_mapping)))
+
+    def __len__(self):
+        return len(self.analog_mapping) + len(self.binary_mapping)
+
+    def reload(self, point_definitions):
+        """Compile the schedules and mappings of (reloaded) PointDefinitions. Each player file is compiled once."""
+        analog_points = []
+        binary_points = []
+        for point_def in point_definitions.iter_points():
+            if point_def.schedule is None:
+                continue
+            if point_def.point_type == POINT_TYPE_ANALOG_INPUT:
+                analog_points.append(point_def)
+            elif point_def.point_type == POINT_TYPE_BINARY_INPUT:
+                binary_points.append(point_def)
+            else:
+                continue
+            if point_def.schedule not in self.schedules:
+                self.schedules[point_def.schedule] = Schedule.from_player_file(
+                    os.path.join(self.schedule_dir, point_def.schedule), self.interpolation)
+        self.analog_mapping = ScheduleMapping(analog_points, self.schedules)
+        self.binary_mapping = ScheduleMapping(binary_points, self.schedules, scaled=False, binary=True)
+
+    def start(self):
+        """Start playing on a thread, from start_offset."""
+        if self._thread is None:
+            self._stop.clear()
+            self._started = time.time()
+            self._thread = threading.Thread(target=self._run, name='dnp3-schedule-player')
+            self._thread.daemon = True
+            self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        next_tick = time.time()
+        while not self._stop.is_set():
+            try:
+                self.tick()
+            except Exception as err:
+                _log.error('Error playing schedules into the outstation: {}'.format(err))
+            next_tick += self.interval
+            # If a tick overran, skip the ticks it missed rather than playing them back to back.
+            delay = next_tick - time.time()
+            if delay < 0:
+                next_tick -= delay
+                delay = 0
+            self._stop.wait(delay)
+
+    def schedule_time(self, now=None):
+        """Return the schedule time, in seconds since the start of the schedules, of a wall clock time."""
+        now = time.time() if now is None else now
+        return self.start_offset + (now - (self._started or now)) * self.speed
+
+    def tick(self, seconds=None):
+        """
+            Apply the schedules' values at a schedule time to the outstation.
+
+        :param seconds: The schedule time. Default: schedule_time().
+        :return: The number of point values applied.
+        """
+        started = time.time()
+        seconds = self.schedule_time(started) if seconds is None else seconds
+        updates = []
+        indexes, values = self._significant_values(POINT_TYPE_ANALOG_INPUT, self.analog_mapping, seconds)
+        updates.extend((opendnp3.Analog(value), index) for index, value in zip(indexes, values))
+        indexes, values = self._significant_values(POINT_TYPE_BINARY_INPUT, self.binary_mapping, seconds)
+        updates.extend((opendnp3.Binary(value != 0), index) for index, value in zip(indexes, values))
+        applied = self.outstation.apply_updates(updates)
+        self._record_duration(time.time() - started, applied)
+        return applied
+
+    def _significant_values(self, point_type, mapping, seconds):
+        """Return lists of the indexes and values of a mapping's changed points that are outside their deadband."""
+        indexes, values = mapping.changed_values(seconds, self.loop)
+        significant = self.deadband_filter.significant(point_type, indexes, values)
+        return indexes[significant].tolist(), values[significant].tolist()
+
+    def _record_duration(self, duration, applied):
+        self.tick_count += 1
+        self.update_count += applied
+        self.last_duration = duration
+        self.max_duration = max(self.max_duration, duration)
+        self._total_duration += duration
+
+    def playback_stats(self):
+        """Return the ticks and point updates applied, and the duration of a tick, in seconds."""
+        return {
+            'ticks': self.tick_count,
+            'updates': self.update_count,
+            'last': self.last_duration,
+            'mean': self._total_duration / self.tick_count if self.tick_count else None,
+            'max': self.max_duration
+        }
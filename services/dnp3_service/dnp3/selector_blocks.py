@@ -0,0 +1,180 @@
+"""
+Saved versions of MESA selector blocks.
+
+A selector block is a range of points whose values the master can save under
+an edit selector (e.g. a curve or schedule number) and later make current
+again by writing that edit selector to the block's point.
+
+SelectorBlockStore keeps the current values of each block's points in a
+dictionary of their own. Saving a block stores a reference to that dictionary
+as the saved version of the edit selector, and activating an edit selector
+makes its saved dictionary the current one, so neither copies the block's
+points. A saved dictionary is never changed: the first write to a block after
+a save or an activation copies its current values (copy-on-write).
+
+Each block keeps its max_saved most recently saved or activated edit
+selectors. Older ones are evicted.
+"""
+import bisect
+import logging
+from collections import OrderedDict
+
+DEFAULT_MAX_SAVED = 32
+
+_log = logging.getLogger(__name__)
+
+
+class SelectorBlock(object):
+    """The current and saved point values of one selector block."""
+
+    __slots__ = ('point_def', 'values', 'shared', 'saved')
+
+    def __init__(self, point_def):
+        """
+        :param point_def: The PointDefinition of the block's point, which holds its edit selector.
+        """
+        self.point_def = point_def
+        self.values = {}            # index -> PointValue of the block's current points
+        self.shared = False         # Whether values is also a saved version, which must not change
+        self.saved = OrderedDict()  # edit selector -> values dictionary, least recently used first
+
+    def contains_index(self, index):
+        """Answer whether an index is one of the block's points. The block's own point (its edit selector) isn't."""
+        return self.point_def.selector_block_start <= index < self.point_def.selector_block_end and \
+            index != self.point_def.index
+
+    def set(self, index, point_value):
+        """Set the current value of one of the block's points, or discard it if point_value is None."""
+        if self.shared:
+            self.values = dict(self.values)
+            self.shared = False
+        if point_value is None:
+            self.values.pop(index, None)
+        else:
+            self.values[index] = point_value
+
+    def save(self, edit_selector, max_saved):
+        """Save the current values as the version of edit_selector."""
+        self._use(edit_selector, self.values, max_saved)
+
+    def activate(self, edit_selector, max_saved):
+        """Make the saved version of edit_selector current. If there is none, the block has no current values."""
+        values = self.saved.get(edit_selector, None)
+        if values is None:
+            self.values = {}
+            self.shared = False
+        else:
+            self._use(edit_selector, values, max_saved)
+            self.values = values
+
+    def _use(self, edit_selector, values, max_saved):
+        self.saved.pop(edit_selector, None)
+        self.saved[edit_selector] = values
+        self.shared = True
+        while len(self.saved) > max_saved:
+            evicted, _ = self.saved.popitem(last=False)
+            _log.debug('Evicted edit selector {} of selector block {}'.format(evicted, self.point_def.name))
+
+
+class SelectorBlockStore(object):
+    """The SelectorBlocks of an outstation's PointDefinitions."""
+
+    def __init__(self, point_definitions, max_saved=DEFAULT_MAX_SAVED):
+        """
+        :param point_definitions: The outstation's PointDefinitions.
+        :param max_saved: The number of saved edit selectors to keep per block.
+        """
+        self.max_saved = max_saved
+        self.blocks = {}            # block name -> SelectorBlock
+        self._starts = {}           # point_type -> sorted selector_block_start of its blocks
+        self._by_start = {}         # point_type -> SelectorBlocks, in _starts order
+        self.reload(point_definitions)
+
+    def reload(self, point_definitions):
+        """Index the selector blocks of (reloaded) PointDefinitions. Blocks whose range didn't change keep their values."""
+        blocks = {}
+        for point_def in point_definitions.iter_points():
+            if point_def.is_selector_block:
+                block = self.blocks.get(point_def.name, None)
+                if block is None or self._block_range(block.point_def) != self._block_range(point_def):
+                    block = SelectorBlock(point_def)
+                block.point_def = point_def
+                blocks[point_def.name] = block
+        starts = {}
+        by_start = {}
+        for block in sorted(blocks.values(), key=lambda b: b.point_def.selector_block_start):
+            starts.setdefault(block.point_def.point_type, []).append(block.point_def.selector_block_start)
+            by_start.setdefault(block.point_def.point_type, []).append(block)
+        self.blocks, self._starts, self._by_start = blocks, starts, by_start
+
+    @staticmethod
+    def _block_range(point_def):
+        return point_def.point_type, point_def.index, point_def.selector_block_start, point_def.selector_block_end
+
+    def block_for_index(self, point_type, index):
+        """Return the SelectorBlock with a point at a point type and index, or None."""
+        starts = self._starts.get(point_type, None)
+        if not starts:
+            return None
+        position = bisect.bisect_right(starts, index) - 1
+        if position < 0:
+            return None
+        block = self._by_start[point_type][position]
+        return block if block.contains_index(index) else None
+
+    def set_point_value(self, point_type, index, point_value):
+        """
+            Set (or, if point_value is None, discard) a current point value if the point is in a selector block.
+
+        :return: True if the point is in a selector block.
+        """
+        block = self.block_for_index(point_type, index)
+        if block is None:
+            return False
+        block.set(index, point_value)
+        return True
+
+    def get_point_value(self, point_type, index):
+        """Return the current PointValue of a point in a selector block, or None."""
+        block = self.block_for_index(point_type, index)
+        return None if block is None else block.values.get(index, None)
+
+    def save(self, block_name, edit_selector):
+        """Save the current values of a selector block as the version of an edit selector."""
+        block = self.blocks[block_name]
+        block.save(edit_selector, self.max_saved)
+        _log.debug('Saved {} points for {} at edit selector {}'.format(len(block.values), block_name, edit_selector))
+
+    def activate(self, block_name, edit_selector):
+        """Make the saved version of an edit selector the current values of a selector block."""
+        self.blocks[block_name].activate(edit_selector, self.max_saved)
+
+    def snapshot(self):
+        """
+            Return the (block name, [(edit selector, point values), ...], current point values) of every block.
+
+            The returned dictionaries are never changed: the next write to a block copies its current values.
+        """
+        blocks = []
+        for block_name, block in self.blocks.items():
+            block.shared = True
+            blocks.append((block_name, list(block.saved.items()), block.values))
+        return blocks
+
+    def restore_saved(self, block_name, edit_selector, point_values):
+        """Restore a saved version of a block, e.g. from a CurrentValueStore. Unknown blocks are ignored."""
+        block = self.blocks.get(block_name, None)
+        if block is not None:
+            block._use(edit_selector, point_values, self.max_saved)
+            block.shared = False        # point_values is not the block's current values.
+
+    def restore_current(self, block_name, point_values):
+        """Restore the current values of a block, e.g. from a CurrentValueStore. Unknown blocks are ignored."""
+        block = self.blocks.get(block_name, None)
+        if block is not None:
+            block.values = point_values
+            block.shared = False
+
+    def saved_edit_selectors(self, block_name):
+        """Return the edit selectors saved for a selector block, least recently used first."""
+        return list(self.blocks[block_name].saved)
@@ -0,0 +1,181 @@
+"""
+Feed GridAPPS-D simulation output into the DNP3 outstation database.
+
+Input points name the simulation measurement that feeds them in the points
+config:
+
+    - name: "Feeder.Voltage.A"
+      group: 30
+      variation: 1
+      index: 10
+      measurement_mrid: "_0f7d7c6b-1c1f-4a5e-9b8f-6c2e7e0a8a11"
+      measurement_attribute: "magnitude"     # magnitude (default for analogs), angle or value
+      scaling_multiplier: 0.001
+
+The mapping from measurement mRIDs to outstation indexes is compiled once into
+arrays. For every simulation output message the mapped values are gathered,
+scaled by each point's scaling_multiplier in one NumPy operation, compared with
+the values last sent, passed through the points' deadbands, and only the
+significant values are applied to the outstation in one batched update.
+"""
+import json
+import logging
+import time
+
+import numpy
+import stomp
+
+from pydnp3 import opendnp3
+from dnp3.deadband import DeadbandFilter
+from dnp3.points import POINT_TYPE_ANALOG_INPUT, POINT_TYPE_BINARY_INPUT
+
+SIMULATION_OUTPUT_TOPIC = '/topic/goss.gridappsd.simulation.output.'
+
+_log = logging.getLogger(__name__)
+
+
+class MeasurementMapping(object):
+    """Measurement mRID to outstation index mapping for the input points of one point type."""
+
+    def __init__(self, point_defs, default_attribute, scaled=True):
+        """
+        :param point_defs: The PointDefinitions that name a measurement_mrid.
+        :param default_attribute: The measurement value used by points without a measurement_attribute.
+        :param scaled: Whether to apply each point's scaling_multiplier.
+        """
+        self.mrids = [pt.measurement_mrid for pt in point_defs]
+        self.attributes = [pt.measurement_attribute or default_attribute for pt in point_defs]
+        self.indexes = numpy.array([pt.index for pt in point_defs], dtype=numpy.int64)
+        self.multipliers = numpy.array([pt.scaling_multiplier if scaled else 1 for pt in point_defs],
+                                       dtype=numpy.float64)
+        self.last_values = numpy.full(len(point_defs), numpy.nan)
+
+    def __len__(self):
+        return len(self.mrids)
+
+    def changed_values(self, measurements_by_mrid):
+        """
+            Return the outstation indexes and scaled values of the mapped measurements that changed.
+
+        :param measurements_by_mrid: A dictionary of measurement mRID to measurement dictionary.
+        :return: A tuple of (index array, value array).
+        """
+        raw_values = numpy.fromiter((measurements_by_mrid.get(mrid, {}).get(attribute, numpy.nan)
+                                     for mrid, attribute in zip(self.mrids, self.attributes)),
+                                    dtype=numpy.float64, count=len(self.mrids))
+        values = raw_values * self.multipliers
+        # NaN never compares equal, so points still missing from the simulation output are skipped explicitly.
+        changed = numpy.flatnonzero(~numpy.isnan(values) & (values != self.last_values))
+        self.last_values[changed] = values[changed]
+        return self.indexes[changed], values[changed]
+
+
+class SimulationOutputFeeder(object):
+    """Subscribe to a simulation's output topic and apply its measurements to the outstation."""
+
+    def __init__(self, outstation, point_definitions, simulation_id, goss_server='127.0.0.1', stomp_port='61613',
+                 username='system', password='manager', deadband_filter=None):
+        """
+        :param outstation: The DNP3Outstation to update.
+        :param point_definitions: The outstation's PointDefinitions.
+        :param simulation_id: The id of the simulation to follow.
+        :param deadband_filter: The outstation's DeadbandFilter. By default one is created from point_definitions.
+        """
+        self.analog_mapping = None
+        self.binary_mapping = None
+        self.reload(point_definitions)
+        self.outstation = outstation
+        self.deadband_filter = deadband_filter or DeadbandFilter(point_definitions)
+        self.simulation_id = simulation_id
+        self.goss_server = goss_server
+        self.stomp_port = stomp_port
+        self.username = username
+        self.password = password
+        self.connection = None
+        self.step_count = 0
+        self.last_latency = None
+        self.max_latency = 0.0
+        self._total_latency = 0.0
+        _log.info('Mapped {} analog and {} binary input points to simulation {} measurements'.format(
+            len(self.analog_mapping), len(self.binary_mapping), simulation_id))
+
+    def reload(self, point_definitions):
+        """Compile the measurement mappings of (reloaded) PointDefinitions."""
+        analog_points = []
+        binary_points = []
+        for point_def in point_definitions.iter_points():
+            if point_def.measurement_mrid is None or point_def.is_array:
+                continue
+            if point_def.point_type == POINT_TYPE_ANALOG_INPUT:
+                analog_points.append(point_def)
+            elif point_def.point_type == POINT_TYPE_BINARY_INPUT:
+                binary_points.append(point_def)
+        # Every mapped value counts as changed on the next step, the deadband filter drops the ones that are not.
+        self.analog_mapping = MeasurementMapping(analog_points, 'magnitude')
+        self.binary_mapping = MeasurementMapping(binary_points, 'value', scaled=False)
+
+    def start(self):
+        """Connect to GOSS and subscribe to the simulation output topic."""
+        self.connection = stomp.Connection12([(self.goss_server, self.stomp_port)])
+        self.connection.set_listener('SimulationOutputFeeder', self)
+        self.connection.start()
+        self.connection.connect(self.username, self.password, wait=True)
+        self.connection.subscribe(SIMULATION_OUTPUT_TOPIC + str(self.simulation_id), 1)
+
+    def stop(self):
+        if self.connection is not None:
+            self.connection.disconnect()
+            self.connection = None
+
+    def on_message(self, headers, msg):
+        try:
+            self.process_output(msg)
+        except Exception as err:
+            _log.error('Error applying simulation output to the outstation: {}'.format(err))
+
+    def on_error(self, headers, msg):
+        _log.error('GOSS error: {}'.format(msg))
+
+    def on_disconnected(self):
+        _log.info('Disconnected from GOSS')
+
+    def process_output(self, msg):
+        """
+            Apply one simulation output message to the outstation.
+
+        :param msg: The simulation output message, a JSON string.
+        :return: The number of point values applied.
+        """
+        received = time.time()
+        measurements = json.loads(msg)['message']['measurements']
+        measurements_by_mrid = dict((m.get('measurement_mrid'), m) for m in measurements)
+        updates = []
+        indexes, values = self._significant_values(POINT_TYPE_ANALOG_INPUT, self.analog_mapping, measurements_by_mrid)
+        updates.extend((opendnp3.Analog(value), index) for index, value in zip(indexes, values))
+        indexes, values = self._significant_values(POINT_TYPE_BINARY_INPUT, self.binary_mapping, measurements_by_mrid)
+        updates.extend((opendnp3.Binary(value != 0), index) for index, value in zip(indexes, values))
+        applied = self.outstation.apply_updates(updates)
+        self._record_latency(time.time() - received)
+        _log.debug('Applied {} changed point values in {:.6f}s'.format(applied, self.last_latency))
+        return applied
+
+    def _significant_values(self, point_type, mapping, measurements_by_mrid):
+        """Return lists of the indexes and values of a mapping's changed measurements that are outside their deadband."""
+        indexes, values = mapping.changed_values(measurements_by_mrid)
+        significant = self.deadband_filter.significant(point_type, indexes, values)
+        return indexes[significant].tolist(), values[significant].tolist()
+
+    def _record_latency(self, latency):
+        self.step_count += 1
+        self.last_latency = latency
+        self.max_latency = max(self.max_latency, latency)
+        self._total_latency += latency
+
+    def latency_stats(self):
+        """Return the per-step latency, from message receipt to outstation update, in seconds."""
+        return {
+            'steps': self.step_count,
+            'last': self.last_latency,
+            'mean': self._total_latency / self.step_count if self.step_count else None,
+            'max': self.max_latency
+        }
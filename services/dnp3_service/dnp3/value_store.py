@@ -0,0 +1,275 @@
+"""
+Persist a Processor's current values across restarts.
+
+A CurrentValueStore is an append-only file of the changes the Processor makes
+to its current point values and selector blocks (see selector_blocks.py):
+
+    ('value', point_type, index, value)         A point's current value.
+    ('discard', point_type, index)              A point no longer has one.
+    ('save', block, edit_selector, values)      A block's values were saved.
+    ('activate', block, edit_selector)          An edit selector was activated.
+    ('block', block, values)                    A block's current values.
+
+values is a tuple of (point_type, index, value). Records are written in
+batches: each batch is one marshalled tuple of records with a length prefix,
+so a batch cut short by a crash is detected and dropped when the file is
+loaded.
+
+The Processor records changes on the command worker thread, which only
+appends them to a deque. Every write_interval seconds a writer thread turns
+the changes into records and appends them to the file in one write, so a
+crash loses at most the last write_interval of changes. After compact_after records the Processor hands over a snapshot of
+its state, and the writer replaces the file with one record per current value
+and saved block.
+
+At startup the Processor replays the file before the outstation is enabled,
+so a master's first poll sees the values of the last run.
+"""
+import logging
+import marshal
+import os
+import struct
+import sys
+import threading
+import time
+from collections import deque
+
+MAGIC = b'DNP3VAL1'
+DEFAULT_COMPACT_AFTER = 100000
+DEFAULT_MAX_QUEUE_SIZE = 100000
+DEFAULT_WRITE_INTERVAL = 0.05
+_LENGTH = struct.Struct('<I')
+
+_log = logging.getLogger(__name__)
+
+
+def point_value_record(point_value):
+    """Return the (point_type, index, value) of a PointValue."""
+    return point_value.point_def.point_type, int(point_value.index), point_value.unwrapped_value()
+
+
+class CurrentValueStore(object):
+    """An append-only file of current value changes, and the thread that writes it."""
+
+    def __init__(self, path, compact_after=DEFAULT_COMPACT_AFTER, max_queue_size=DEFAULT_MAX_QUEUE_SIZE,
+                 write_interval=DEFAULT_WRITE_INTERVAL, fsync=False):
+        """
+        :param path: The store's file. It is created if it doesn't exist.
+        :param compact_after: The number of records to append before the file is compacted.
+        :param max_queue_size: The number of changes that can wait for the writer. If more arrive they are dropped,
+                               and the file is compacted at the next opportunity.
+        :param write_interval: Seconds between the writer's appends.
+        :param fsync: Whether to sync the file to disk after each write, so a power failure loses nothing.
+        """
+        self.path = path
+        self.compact_after = compact_after
+        self.max_queue_size = max_queue_size
+        self.write_interval = write_interval
+        self.fsync = fsync
+        self._changes = deque()         # Appended on the recording thread, popped on the writer thread.
+        self._stopping = threading.Event()
+        self._thread = None
+        self._file = None
+        self._valid_length = None
+        self._pending_records = 0       # Changes recorded since the last compaction, counted on the recording thread.
+        self._dropped = False
+        self.records_written = 0
+        self.bytes_written = 0
+        self.compactions = 0
+        self.dropped_count = 0
+        self.max_queue_depth = 0
+        self.write_time = 0.0
+
+    def load(self):
+        """
+            Return the records of the store's file, in the order they were written. Call this before start().
+
+            A truncated or corrupt record, and everything after it, is dropped. So is a file written by
+            another Python version, whose marshal format may differ.
+        """
+        try:
+            with open(self.path, 'rb') as store_file:
+                data = store_file.read()
+        except (IOError, OSError):
+            self._valid_length = None
+            return []
+        records = []
+        offset = self._read_header(data)
+        if offset is None:
+            _log.warning('Ignoring current value store {}, it was written by another version'.format(self.path))
+            self._valid_length = None
+            return []
+        while offset + _LENGTH.size <= len(data):
+            length, = _LENGTH.unpack_from(data, offset)
+            end = offset + _LENGTH.size + length
+            if end > len(data):
+                break
+            try:
+                records.extend(marshal.loads(data[offset + _LENGTH.size:end]))
+            except (EOFError, ValueError, TypeError):
+                break
+            offset = end
+        if offset < len(data):
+            _log.warning('Dropped {} bytes of incomplete records from {}'.format(len(data) - offset, self.path))
+        self._valid_length = offset
+        return records
+
+    @staticmethod
+    def _header():
+        return MAGIC + marshal.dumps(tuple(sys.version_info[:2]))
+
+    def _read_header(self, data):
+        """Return the offset of the first record, or None if the file doesn't start with this version's header."""
+        header = self._header()
+        return len(header) if data.startswith(header) else None
+
+    def start(self):
+        """Open the file for appending and start the writer thread."""
+        if self._thread is not None:
+            return
+        if self._valid_length is None:
+            self._file = open(self.path, 'wb')
+            self._file.write(self._header())
+        else:
+            # Appending after an incomplete record would hide everything appended.
+            self._file = open(self.path, 'r+b')
+            self._file.truncate(self._valid_length)
+            self._file.seek(self._valid_length)
+        self._thread = threading.Thread(target=self._run, name='dnp3-value-store')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        """Write the queued changes, then stop the writer thread and close the file."""
+        if self._thread is not None:
+            self._stopping.set()
+            self._thread.join(timeout)
+            self._thread = None
+            self._file.close()
+            self._file = None
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def record_value(self, point_value):
+        """Record a point's current PointValue."""
+        self._put(('value', point_value))
+
+    def record_discard(self, point_type, index):
+        """Record that a point no longer has a current value."""
+        self._put(('discard', point_type, index))
+
+    def record_save(self, block_name, edit_selector, point_values):
+        """Record a saved selector block. point_values is an index -> PointValue dictionary that is never changed."""
+        self._put(('save', block_name, edit_selector, point_values))
+
+    def record_activate(self, block_name, edit_selector):
+        """Record the activation of a selector block's edit selector."""
+        self._put(('activate', block_name, edit_selector))
+
+    def _put(self, change):
+        depth = len(self._changes)
+        if depth >= self.max_queue_size:
+            self.dropped_count += 1
+            self._dropped = True
+            return
+        self._changes.append(change)
+        self._pending_records += 1
+        if depth >= self.max_queue_depth:
+            self.max_queue_depth = depth + 1
+
+    @property
+    def needs_compaction(self):
+        """Answer whether the Processor should call compact(), because of the records appended or dropped."""
+        return self._pending_records >= self.compact_after or self._dropped
+
+    def compact(self, point_values, blocks):
+        """
+            Replace the file with a snapshot of the current values, after the changes already queued are written.
+
+        :param point_values: A list of the PointValues that are not in selector blocks. They are never changed.
+        :param blocks: A list of (block name, [(edit selector, point values), ...], current point values) of each
+                       selector block, from SelectorBlockStore.snapshot().
+        """
+        # A snapshot is queued even if the deque is full, or it would be lost.
+        self._changes.append(('compact', point_values, blocks))
+        self._pending_records = 0
+        self._dropped = False
+
+    def _run(self):
+        while True:
+            stopping = self._stopping.wait(self.write_interval)
+            start = time.time()
+            records = []
+            try:
+                while self._changes:
+                    change = self._changes.popleft()
+                    if change[0] == 'compact':
+                        self._write(records)
+                        records = []
+                        self._compact(change[1], change[2])
+                    else:
+                        records.append(self._record(change))
+                self._write(records)
+            except Exception as err:
+                _log.error('Error writing current value store {}: {}'.format(self.path, err))
+            self.write_time += time.time() - start
+            if stopping:
+                return
+
+    @staticmethod
+    def _record(change):
+        kind = change[0]
+        if kind == 'value':
+            return ('value',) + point_value_record(change[1])
+        if kind == 'save':
+            return 'save', change[1], change[2], tuple(point_value_record(pv) for pv in change[3].values())
+        return change
+
+    def _encode(self, records):
+        """Return a batch of records, marshalled with its length prefix."""
+        data = marshal.dumps(tuple(records))
+        self.records_written += len(records)
+        return _LENGTH.pack(len(data)) + data
+
+    def _write(self, records):
+        if not records:
+            return
+        data = self._encode(records)
+        self._file.write(data)
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+        self.bytes_written += len(data)
+
+    def _compact(self, point_values, blocks):
+        """Write a snapshot to a new file and replace the store's file with it."""
+        records = []
+        for block_name, saved, current_values in blocks:
+            for edit_selector, values in saved:
+                records.append(self._record(('save', block_name, edit_selector, values)))
+            records.append(('block', block_name, tuple(point_value_record(pv) for pv in current_values.values())))
+        records.extend(('value',) + point_value_record(point_value) for point_value in point_values)
+        temp_path = '{}.{}.tmp'.format(self.path, os.getpid())
+        with open(temp_path, 'wb') as temp_file:
+            temp_file.write(self._header() + self._encode(records))
+            temp_file.flush()
+            os.fsync(temp_file.fileno())
+        self._file.close()
+        os.rename(temp_path, self.path)
+        self._file = open(self.path, 'ab')
+        self.compactions += 1
+        _log.debug('Compacted current value store {} to {} values'.format(self.path, len(point_values)))
+
+    def stats(self):
+        """Return the records and bytes written, compactions, dropped changes, queue depth and time spent writing."""
+        return {
+            'records': self.records_written,
+            'bytes': self.bytes_written,
+            'compactions': self.compactions,
+            'dropped': self.dropped_count,
+            'queue_depth': len(self._changes),
+            'max_queue_depth': self.max_queue_depth,
+            'write_seconds': self.write_time
+        }
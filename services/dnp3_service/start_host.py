@@ -0,0 +1,251 @@
+"""
+Run many DNP3 outstations in one process on one shared DNP3Manager.
+
+Each outstation has its own port, link addresses, point definitions and
+Processor. Outstations that load the same points file share one read-only
+PointDefinitions, and all of them share one CommandWorker that processes
+Master commands off the DNP3 stack threads. An entry with a count is expanded
+into that many outstations, with consecutive ports and link local addresses,
+to emulate a field of RTUs. An entry with a simulation_id is fed from that
+simulation's output and publishes its Operates to the simulation input,
+batched over batch_window seconds. An entry with a value_store persists the
+current values of its operated points in that file ({name} is replaced by the
+outstation name), and restores them when it restarts. Input points with a
+schedule (a player file, relative to the host config) are played back at
+playback_speed, every playback_interval seconds:
+
+    threads_to_allocate: 4
+    outstations:
+      - name: rtu
+        count: 500
+        port: 20000
+        points_file: points_config.yml
+        outstation:
+          link_local_addr: 10
+          link_remote_addr: 1
+      - name: substation
+        port: 21000
+        points_file: substation_points.yml
+        simulation_id: "1234"
+        batch_window: 0.1
+        value_store: state/{name}.values
+        playback_speed: 60
+
+Usage:
+    python start_host.py -c host_config.yml [--benchmark 60]
+
+Send the process SIGHUP to reload the points files that changed without
+restarting their outstations.
+
+With --benchmark the host runs for the given number of seconds and reports
+the CPU it used, as outstations per fully used core.
+"""
+import argparse
+import copy
+import logging
+import os
+import resource
+import signal
+import threading
+import time
+from time import sleep
+
+from yaml import safe_load
+
+from pydnp3 import asiodnp3
+from dnp3.command_worker import CommandWorker
+from dnp3.difference_publisher import ForwardDifferencePublisher, DEFAULT_BATCH_WINDOW
+from dnp3.log_control import configure_logging
+from dnp3.outstation import MyLogger
+from dnp3.point_cache import load_config
+from dnp3.schedule_player import SchedulePlayer, DEFAULT_PLAYBACK_INTERVAL
+from dnp3.points import PointDefinitions
+from dnp3.simulation_feeder import SimulationOutputFeeder
+from dnp3.value_store import CurrentValueStore
+from start_service import Processor, start_outstation
+
+_log = logging.getLogger(__name__)
+
+
+def expand_outstation_entries(entries):
+    """Return one outstation entry per outstation, expanding entries that have a count."""
+    expanded = []
+    for entry in entries:
+        count = entry.get('count', None)
+        if count is None:
+            expanded.append(entry)
+            continue
+        for number in range(count):
+            outstation_entry = copy.deepcopy(entry)
+            del outstation_entry['count']
+            outstation_entry['name'] = '{}-{}'.format(entry.get('name', 'outstation'), number)
+            outstation_entry['port'] = entry.get('port', 20000) + number
+            outstation_config = outstation_entry.setdefault('outstation', {})
+            outstation_config['link_local_addr'] = outstation_config.get('link_local_addr', 10) + number
+            expanded.append(outstation_entry)
+    return expanded
+
+
+class OutstationHost(object):
+    """Start and stop the outstations of a host config on one DNP3Manager."""
+
+    def __init__(self, host_config, config_dir='.'):
+        """
+        :param host_config: A dictionary, see the module documentation.
+        :param config_dir: The directory that relative points_file paths are relative to.
+        """
+        self.host_config = host_config
+        self.config_dir = config_dir
+        self.manager = None
+        self.log_handler = None
+        self.command_worker = CommandWorker()
+        self.outstations = []
+        self.processors = []
+        self.feeders = []
+        self.publishers = []
+        self.players = []
+        self._schedules = {}
+        self.value_stores = []
+        self._point_definitions = {}
+
+    def point_definitions(self, entry):
+        """Return the PointDefinitions of an outstation entry, loading each points file once."""
+        if 'points' in entry:
+            point_defs = PointDefinitions()
+            point_defs.load_points(entry['points'])
+            return point_defs
+        points_file = os.path.join(self.config_dir, entry['points_file'])
+        if points_file not in self._point_definitions:
+            self._point_definitions[points_file] = load_config(points_file)[1]
+        return self._point_definitions[points_file]
+
+    def start(self):
+        threads_to_allocate = self.host_config.get('threads_to_allocate', 1)
+        _log.info('Creating a DNP3Manager with {} threads.'.format(threads_to_allocate))
+        self.log_handler = MyLogger()
+        self.manager = asiodnp3.DNP3Manager(threads_to_allocate, self.log_handler)
+        for entry in expand_outstation_entries(self.host_config.get('outstations', [])):
+            value_store = None
+            if entry.get('value_store'):
+                value_store = CurrentValueStore(os.path.join(self.config_dir,
+                                                             entry['value_store'].format(name=entry.get('name', 'outstation'))))
+                self.value_stores.append(value_store)
+            processor = Processor(self.point_definitions(entry), command_worker=self.command_worker,
+                                  value_store=value_store)
+            outstation = start_outstation(entry.get('outstation', {}), processor,
+                                          local_ip=entry.get('local_ip', '0.0.0.0'),
+                                          port=entry.get('port', 20000),
+                                          name=entry.get('name', 'outstation'),
+                                          manager=self.manager)
+            self.processors.append(processor)
+            self.outstations.append(outstation)
+            if entry.get('simulation_id'):
+                feeder = SimulationOutputFeeder(outstation, processor.point_definitions, entry['simulation_id'],
+                                                self.host_config.get('goss_server', '127.0.0.1'),
+                                                self.host_config.get('stomp_port', '61613'),
+                                                deadband_filter=processor.deadband_filter)
+                feeder.start()
+                self.feeders.append(feeder)
+                processor.reload_listeners.append(feeder.reload)
+                publisher = ForwardDifferencePublisher(processor.point_definitions, entry['simulation_id'],
+                                                       self.host_config.get('goss_server', '127.0.0.1'),
+                                                       self.host_config.get('stomp_port', '61613'),
+                                                       batch_window=entry.get('batch_window', DEFAULT_BATCH_WINDOW))
+                publisher.start()
+                processor.command_listeners.append(publisher.on_point_value)
+                processor.reload_listeners.append(publisher.reload)
+                self.publishers.append(publisher)
+            player = SchedulePlayer(outstation, processor.point_definitions, self.config_dir,
+                                    speed=entry.get('playback_speed', 1.0),
+                                    interval=entry.get('playback_interval', DEFAULT_PLAYBACK_INTERVAL),
+                                    deadband_filter=processor.deadband_filter, schedules=self._schedules)
+            if len(player):
+                player.start()
+                processor.reload_listeners.append(player.reload)
+                self.players.append(player)
+        _log.info('Started {} outstations.'.format(len(self.outstations)))
+
+    def reload(self):
+        """
+            Reload the points files that changed, without restarting their outstations.
+
+            Each file is loaded and compared with its live PointDefinitions once, then the processors of every
+            outstation that shares it are updated. Inline points lists are not reloaded.
+        """
+        for points_file, live_definitions in self._point_definitions.items():
+            try:
+                new_definitions = load_config(points_file)[1]
+                diff = live_definitions.diff(new_definitions)
+                if not len(diff):
+                    continue
+                processors = [processor for processor in self.processors
+                              if processor.point_definitions is live_definitions]
+                for processor in processors:
+                    processor.outstation.check_points_fit(new_definitions)
+                live_definitions.replace_points(new_definitions)
+                for processor in processors:
+                    processor.points_reloaded(diff)
+            except Exception as err:
+                _log.error('Reloading point definitions from {} failed: {}'.format(points_file, err))
+
+    def shutdown(self):
+        for feeder in self.feeders:
+            feeder.stop()
+        for player in self.players:
+            player.stop()
+        # Queued commands apply their output status to the outstations, so they finish before those shut down.
+        self.command_worker.stop()
+        _log.info('Command processing: {}'.format(self.command_worker.stats()))
+        for outstation in self.outstations:
+            if outstation.poll_window_overrun_counts():
+                _log.info('{} poll windows with more updates than the event buffer holds: {}'.format(
+                    outstation.name, outstation.poll_window_overrun_counts()))
+            outstation.shutdown()
+        self.manager.Shutdown()
+        self.manager = None
+        for value_store in self.value_stores:
+            value_store.stop()
+        for publisher in self.publishers:
+            publisher.stop()
+
+
+def run_benchmark(host, seconds):
+    """Run the started host for a number of seconds and report its CPU use per outstation."""
+    start_wall = time.time()
+    start_cpu = sum(os.times()[:2])
+    sleep(seconds)
+    wall = time.time() - start_wall
+    cpu = sum(os.times()[:2]) - start_cpu
+    cores_used = cpu / wall
+    outstation_count = len(host.outstations)
+    _log.info('{} outstations used {:.3f} cores ({:.1f} outstations per core), max RSS {} kB'.format(
+        outstation_count, cores_used,
+        outstation_count / cores_used if cores_used > 0 else float('inf'),
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss))
+
+
+if __name__ == '__main__':
+    # Per-point debug logging of hundreds of outstations is too chatty.
+    configure_logging(logging.INFO)
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-c', '--config_file', required=True,
+                        type=argparse.FileType('r'),
+                        help="Yaml host configuration file.")
+    parser.add_argument('--benchmark', type=float,
+                        help="Run for this many seconds and report the CPU used per outstation.")
+    args = parser.parse_args()
+
+    host = OutstationHost(safe_load(args.config_file), os.path.dirname(os.path.abspath(args.config_file.name)))
+    start_time = time.time()
+    host.start()
+    _log.info('Startup took {:.2f}s'.format(time.time() - start_time))
+    # SIGHUP reloads the points files that changed, in the background. Master sessions stay up.
+    signal.signal(signal.SIGHUP, lambda signum, frame: threading.Thread(target=host.reload, name='points-reload').start())
+    try:
+        if args.benchmark:
+            run_benchmark(host, args.benchmark)
+        else:
+            while True:
+                sleep(1)
+    finally:
+        host.shutdown()
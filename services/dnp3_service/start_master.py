@@ -0,0 +1,43 @@
+"""
+Poll DNP3 outstations and publish their measurements to GOSS.
+
+See dnp3/master_client.py for the master config.
+
+Usage:
+    python start_master.py -c master_config.yml
+"""
+import argparse
+import logging
+import os
+import time
+from time import sleep
+
+from yaml import safe_load
+
+from dnp3.log_control import configure_logging
+from dnp3.master_client import DNP3MasterClient
+
+_log = logging.getLogger(__name__)
+
+
+if __name__ == '__main__':
+    configure_logging(logging.INFO)
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-c', '--config_file', required=True,
+                        type=argparse.FileType('r'),
+                        help="Yaml master configuration file.")
+    parser.add_argument('--stats_interval', type=float, default=60,
+                        help="Seconds between logged publish statistics.")
+    args = parser.parse_args()
+
+    client = DNP3MasterClient(safe_load(args.config_file), os.path.dirname(os.path.abspath(args.config_file.name)))
+    start_time = time.time()
+    client.start()
+    _log.info('Startup took {:.2f}s'.format(time.time() - start_time))
+    try:
+        while True:
+            sleep(args.stats_interval)
+            _log.info('Publish statistics: {}'.format(client.publish_stats()))
+    finally:
+        client.shutdown()
+        _log.info('Publish statistics: {}'.format(client.publish_stats()))
@@ -1,29 +1,50 @@
 import argparse
 import logging
 import numbers
+import os
+import signal
 import sys
+import threading
 from time import sleep
 
-from yaml import safe_load
-
 from pydnp3 import opendnp3
 from dnp3.points import (
-    PointArray, PointDefinitions, PointDefinition, DNP3Exception, POINT_TYPE_ANALOG_INPUT, POINT_TYPE_BINARY_INPUT
+    PointArray, PointDefinitions, PointDefinition, PointValue, DNP3Exception,
+    POINT_TYPE_ANALOG_INPUT, POINT_TYPE_BINARY_INPUT, POINT_TYPE_ANALOG_OUTPUT, POINT_TYPE_BINARY_OUTPUT, monotonic_ns
 )
+from dnp3.command_worker import CommandWorker
+from dnp3.deadband import DeadbandFilter
+from dnp3.difference_publisher import ForwardDifferencePublisher, DEFAULT_BATCH_WINDOW
+from dnp3.log_control import PointLog, configure_logging, DEFAULT_POINT_LOG_RATE
 from dnp3.outstation import DNP3Outstation
-
-logging.basicConfig(stream=sys.stdout, level=logging.DEBUG,
-                    format='%(asctime)s:%(name)s:%(levelname)s: %(message)s')
+from dnp3.point_cache import load_config
+from dnp3.schedule_player import SchedulePlayer, DEFAULT_PLAYBACK_INTERVAL
+from dnp3.selector_blocks import SelectorBlockStore
+from dnp3.simulation_feeder import SimulationOutputFeeder
+from dnp3.value_store import CurrentValueStore
 
 _log = logging.getLogger(__name__)
+_point_log = PointLog(_log)
 
 
 class Processor(object):
 
-    def __init__(self, point_definitions):
+    def __init__(self, point_definitions, command_worker=None, value_store=None):
+        """
+        :param point_definitions: The PointDefinitions of the outstation.
+        :param command_worker: A CommandWorker that processes Operate commands, possibly shared with other
+                               Processors. A Processor creates its own if none is given.
+        :param value_store: A CurrentValueStore that persists the current values, restored by warm_start().
+        """
         self.point_definitions = point_definitions
+        self.outstation = None          # The DNP3Outstation that this Processor is the agent of, set when it starts.
+        self.deadband_filter = DeadbandFilter(point_definitions)
+        self.command_worker = command_worker or CommandWorker()
+        self.command_listeners = []     # Called with each processed Operate PointValue, on the command worker thread.
+        self.reload_listeners = []      # Called with the PointDefinitions after they are reloaded.
+        self.value_store = value_store
         self._current_point_values = {}
-        self._selector_block_points = {}
+        self.selector_blocks = SelectorBlockStore(point_definitions)
         self._current_array = None
 
     def publish_outstation_status(self, status):
@@ -31,7 +52,10 @@ class Processor(object):
 
     def process_point_value(self, command_type, command, index, op_type):
         """
-            A point value was received from the Master. Process its payload.
+            A point value was received from the Master. Validate its payload and queue it for processing.
+
+            This runs on the DNP3 stack thread, so it only checks that a PointDefinition exists for the index.
+            The command worker processes an Operate later, and logs any error in doing so.
 
         @param command_type: Either 'Select' or 'Operate'.
         @param command: A ControlRelayOutputBlock or else a wrapped data value (AnalogOutputInt16, etc.).
@@ -40,27 +64,187 @@ class Processor(object):
         @return: A CommandStatus value.
         """
         try:
-            _log.debug("cmdtype={},command={},index={},optype={}".format(command_type, command, index, op_type))
-            _log.debug("command_status={},command_value={}".format(command.status, command.value))
-            point_value = self.point_definitions.point_value_for_command(command_type, command, index, op_type)
-            if point_value is None:
-                return opendnp3.CommandStatus.DOWNSTREAM_FAIL
-        except Exception as ex:
-            _log.error('No DNP3 PointDefinition for command with index {}'.format(index))
+            point_type, function_code, value = PointDefinitions.command_values(command)
+            point_def = self.point_definitions.for_point_type_and_index(point_type, index)
+        except Exception:
+            point_def = None
+        if point_def is None:
+            _point_log.error('No DNP3 PointDefinition for command with index %s', index)
             return opendnp3.CommandStatus.DOWNSTREAM_FAIL
 
+        if command_type == 'Select':
+            # Nothing more to validate, wait for the subsequent Operate command.
+            return opendnp3.CommandStatus.SUCCESS
+        if not self.command_worker.submit(self._process_command, command_type, function_code, value,
+                                          point_def, index, op_type, monotonic_ns()):
+            _point_log.error('DNP3 command queue is full, rejected command with index %s', index)
+            return opendnp3.CommandStatus.TOO_MANY_OPS
+        return opendnp3.CommandStatus.SUCCESS
+
+    def _process_command(self, command_type, function_code, value, point_def, index, op_type, received_ns):
+        """Process a validated command on the command worker thread and pass it to the command listeners."""
+        point_value = PointValue(command_type, function_code, value, point_def, index, op_type, received_ns)
         try:
             self._process_point_value(point_value)
-        except Exception as ex:
-            _log.error('Error processing DNP3 command: {}'.format(ex))
+        except Exception:
             self.discard_cached_point_value(point_value)
-            return opendnp3.CommandStatus.DOWNSTREAM_FAIL
+            raise
+        finally:
+            if self._value_store_running and self.value_store.needs_compaction:
+                self._compact_value_store()
+        changed = [point_value]
+        if point_def.is_selector_block:
+            changed.extend(self.selector_blocks.blocks[point_def.name].values.values())
+        self._apply_output_statuses(changed)
+        for listener in self.command_listeners:
+            listener(point_value)
+
+    def warm_start(self):
+        """
+            Restore the current values and selector blocks saved by the value store, then start the store.
 
-        return opendnp3.CommandStatus.SUCCESS
+            The DNP3Outstation calls this before it is enabled, so the restored values of output points are in
+            its database when the master first polls.
+        """
+        if self.value_store is None:
+            return
+        records = self.value_store.load()
+        for record in records:
+            self._restore(record)
+        self.value_store.start()
+        if records:
+            # Start the file over from the restored state.
+            self._compact_value_store()
+            point_values = self._point_values_outside_blocks()
+            for block in self.selector_blocks.blocks.values():
+                point_values.extend(block.values.values())
+            self._apply_output_statuses(point_values)
+            _log.info('Restored {} current values from {}'.format(len(point_values), self.value_store.path))
+
+    def _restore(self, record):
+        """Replay a CurrentValueStore record. Records of points that are no longer defined are ignored."""
+        kind = record[0]
+        if kind == 'value':
+            point_value = self._restored_point_value(*record[1:])
+            if point_value is not None:
+                self.add_to_current_values(point_value)
+        elif kind == 'discard':
+            self._discard_current_value(record[1], record[2])
+        elif kind == 'save':
+            self.selector_blocks.restore_saved(record[1], record[2], self._restored_point_values(record[3]))
+        elif kind == 'activate':
+            if record[1] in self.selector_blocks.blocks:
+                self.selector_blocks.activate(record[1], record[2])
+        elif kind == 'block':
+            self.selector_blocks.restore_current(record[1], self._restored_point_values(record[2]))
+
+    def _restored_point_value(self, point_type, index, value):
+        point_def = self.for_point_type_and_index(point_type, index)
+        if point_def is None:
+            return None
+        if point_type == POINT_TYPE_BINARY_OUTPUT:
+            function_code = opendnp3.ControlCode.LATCH_ON if value else opendnp3.ControlCode.LATCH_OFF
+            return PointValue('Operate', function_code, None, point_def, index, None)
+        return PointValue('Operate', None, value, point_def, index, None)
+
+    def _restored_point_values(self, records):
+        point_values = (self._restored_point_value(*record) for record in records)
+        return dict((int(point_value.index), point_value) for point_value in point_values if point_value is not None)
+
+    @property
+    def _value_store_running(self):
+        # Values restored by warm_start() are applied before the store starts, so they aren't recorded again.
+        return self.value_store is not None and self.value_store.running
+
+    def _point_values_outside_blocks(self):
+        return [point_value for values in self._current_point_values.values() for point_value in values.values()]
+
+    def _compact_value_store(self):
+        self.value_store.compact(self._point_values_outside_blocks(), self.selector_blocks.snapshot())
+
+    def _apply_output_statuses(self, point_values):
+        """Set the output status of operated output points in the outstation database."""
+        if self.outstation is None:
+            return
+        updates = []
+        for point_value in point_values:
+            point_type = point_value.point_def.point_type
+            if point_type == POINT_TYPE_ANALOG_OUTPUT:
+                updates.append((opendnp3.AnalogOutputStatus(float(point_value.unwrapped_value())),
+                                int(point_value.index)))
+            elif point_type == POINT_TYPE_BINARY_OUTPUT:
+                updates.append((opendnp3.BinaryOutputStatus(point_value.unwrapped_value()), int(point_value.index)))
+        self.outstation.apply_updates(updates)
+
+    def reload_point_definitions(self, point_definitions):
+        """
+            Swap in new PointDefinitions without restarting the outstation.
+
+            The live PointDefinitions are updated in place, so everything that holds them sees the new points.
+
+        :param point_definitions: Newly loaded PointDefinitions.
+        :return: The PointDefinitionsDiff of the reload.
+        """
+        diff = self.point_definitions.diff(point_definitions)
+        if len(diff):
+            if self.outstation is not None:
+                self.outstation.check_points_fit(point_definitions)
+            self.point_definitions.replace_points(point_definitions)
+            self.points_reloaded(diff)
+        return diff
+
+    def points_reloaded(self, diff):
+        """The live PointDefinitions were reloaded. Update the state that was derived from them."""
+        self.deadband_filter.reload(self.point_definitions, diff)
+        # Cached values and selector blocks belong to the command worker thread.
+        self.command_worker.submit(self._discard_removed_point_values, diff.removed)
+        self.command_worker.submit(self.selector_blocks.reload, self.point_definitions)
+        if self.outstation is not None:
+            self.outstation.points_reloaded(diff)
+        for listener in self.reload_listeners:
+            listener(self.point_definitions)
+
+    def reload_points_file(self, config_path):
+        """Load a points file in the background, then reload the PointDefinitions from it. Return the thread."""
+        def reload():
+            try:
+                self.reload_point_definitions(load_config(config_path)[1])
+            except Exception as err:
+                _log.error('Reloading point definitions from {} failed: {}'.format(config_path, err))
+
+        thread = threading.Thread(target=reload, name='points-reload')
+        thread.daemon = True
+        thread.start()
+        return thread
+
+    def _discard_removed_point_values(self, removed_point_defs):
+        for point_def in removed_point_defs:
+            self._discard_current_value(point_def.point_type, int(point_def.index))
 
     def add_to_current_values(self, value):
-        """Update a dictionary that holds the most-recently-received value of each point."""
-        self._current_point_values.setdefault(value.point_def.point_type, {})[int(value.index)] = value
+        """Update the most-recently-received value of a point, in its selector block if it's in one."""
+        point_type, index = value.point_def.point_type, int(value.index)
+        if not self.selector_blocks.set_point_value(point_type, index, value):
+            self._current_point_values.setdefault(point_type, {})[index] = value
+        if self._value_store_running:
+            self.value_store.record_value(value)
+
+    def _discard_current_value(self, point_type, index):
+        if not self.selector_blocks.set_point_value(point_type, index, None):
+            self._current_point_values.get(point_type, {}).pop(index, None)
+        if self._value_store_running:
+            self.value_store.record_discard(point_type, index)
+
+    def get_current_point_value(self, point_type, index):
+        """Return the most-recently-received PointValue of a point type and index, or None."""
+        point_value = self.selector_blocks.get_point_value(point_type, index)
+        if point_value is None:
+            point_value = self._current_point_values.get(point_type, {}).get(index, None)
+        return point_value
+
+    def get_current_point_value_for_def(self, point_def):
+        """Return the most-recently-received PointValue of a PointDefinition, or None."""
+        return self.get_current_point_value(point_def.point_type, int(point_def.index))
 
     def get_point_named(self, point_name):
         return self.point_definitions.get_point_named(point_name)
@@ -71,53 +255,38 @@ class Processor(object):
     def discard_cached_point_value(self, point_value):
         """Delete a cached point value (typically occurs only if an error is being handled)."""
         try:
-            self._current_point_values.get(point_value.point_def.point_type, {}).pop(int(point_value.index), None)
+            self._discard_current_value(point_value.point_def.point_type, int(point_value.index))
         except Exception as err:
             _log.error('Error discarding cached value {}'.format(point_value))
 
     def start_selector_block(self, point_value):
         """
-            Fetch PointValues from self._selector_block_points for the point_value's Block and Edit Selector.
-            Transfer the fetched PointValues to self._current_point_values.
-            If an index in the block has no PointValue, null out that index in self._current_point_values, too.
+            Make the values saved for the point_value's Block and Edit Selector the block's current values.
+            If none were saved, the block has no current values.
 
         :param point_value: A PointValue that is the start of a selector block.
         """
-        _log.debug('Starting to receive a selector block: {}'.format(point_value.name))
-        point_def = point_value.point_def
-        block_points = self._get_selector_block_points(point_value.name, point_value.unwrapped_value())
-        pt_dict = {pt.index: pt for pt in block_points}
-        for ind in range(point_def.selector_block_start, point_def.selector_block_end):
-            if ind == point_def.index:
-                pass                # Don't overwrite the selector block's main point (i.e., its edit selector)
-            elif ind in pt_dict:
-                self.add_to_current_values(pt_dict[ind])
-            else:
-                cached_points = self._current_point_values.setdefault(point_def.point_type, {})
-                if ind in cached_points:
-                    del cached_points[ind]
-
-    def _get_selector_block_points(self, point_name, edit_selector):
-        """Return cached selector block points for point_name and edit_selector."""
-        return self._selector_block_points.get(point_name, {}).get(edit_selector, [])
+        _log.debug('Starting to receive a selector block: %s', point_value.name)
+        self.selector_blocks.activate(point_value.name, point_value.unwrapped_value())
+        if self._value_store_running:
+            self.value_store.record_activate(point_value.name, point_value.unwrapped_value())
 
     def save_selector_block(self, point_value):
         """
-            Save a copy of the selector block that is referenced by point_value's save_on_write property.
+            Save the selector block that is referenced by point_value's save_on_write property,
+            under the block's current Edit Selector.
         """
         block_name = point_value.point_def.save_on_write
-        selector_block_point = self.get_point_named(block_name)
-        edit_selector = self.get_current_point_value_for_def(selector_block_point).unwrapped_value()
-        pt_vals_for_range = [self.get_current_point_value(selector_block_point.point_type, ind)
-                             for ind in range(selector_block_point.selector_block_start,
-                                              selector_block_point.selector_block_end)]
-        if block_name not in self._selector_block_points:
-            self._selector_block_points[block_name] = {}
-        block_points = [val for val in pt_vals_for_range if val is not None]
-        _log.debug('Saving {} points for {} at edit selector {}'.format(len(block_points),
-                                                                        block_name,
-                                                                        edit_selector))
-        self._selector_block_points[block_name][edit_selector] = block_points
+        if block_name not in self.selector_blocks.blocks:
+            raise DNP3Exception('No selector block named {}'.format(block_name))
+        edit_selector = self.get_current_point_value_for_def(self.get_point_named(block_name))
+        if edit_selector is None:
+            raise DNP3Exception('Cannot save selector block {}, it has no edit selector'.format(block_name))
+        self.selector_blocks.save(block_name, edit_selector.unwrapped_value())
+        if self._value_store_running:
+            # A saved block's values are never changed, so the store can serialize them later on its own thread.
+            self.value_store.record_save(block_name, edit_selector.unwrapped_value(),
+                                         self.selector_blocks.blocks[block_name].values)
 
     def update_array_for_point(self, point_value):
         """A received point belongs to a PointArray. Update it."""
@@ -133,50 +302,98 @@ class Processor(object):
         """
             Update an input point. This may send its PointValue to the Master.
 
+        :param point_def: A PointDefinition.
+        :param value: A value to send (unwrapped simple data type, or else a list/array).
+        """
+        self._apply_input_updates(list(self._point_updates(point_def, value)))
+
+    def update_input_points(self, values_by_name):
+        """
+            Update a whole scan of input points in one outstation transaction. This may send their PointValues to the Master.
+
+            Every value is validated before any is applied, so an invalid value leaves the outstation unchanged.
+
+        :param values_by_name: A dictionary of point name to value (unwrapped simple data type, or else a list/array).
+        :return: The number of point values applied.
+        """
+        updates = []
+        for point_name, value in values_by_name.items():
+            updates.extend(self._point_updates(self.get_point_named(point_name), value))
+        return self._apply_input_updates(updates)
+
+    def _point_updates(self, point_def, value):
+        """
+            Generate the (PointDefinition, index, value) updates for an input point.
+
         :param point_def: A PointDefinition.
         :param value: A value to send (unwrapped simple data type, or else a list/array).
         """
         if type(value) == list:
-            # It's an array. Break it down into its constituent points, and apply each one separately.
-            col_count = len(point_def.array_points)
-            cols_by_name = {pt['name']: col for col, pt in enumerate(point_def.array_points)}
-            for row_number, point_dict in enumerate(value):
-                for pt_name, pt_val in point_dict.iteritems():
-                    pt_index = point_def.index + col_count * row_number + cols_by_name[pt_name]
-                    array_point_def = self.point_definitions.get_point_named(point_def.name, index=pt_index)
-                    self._apply_point_update(array_point_def, pt_index, pt_val)
+            # It's an array. Break it down into its constituent points, using the head point's index maps.
+            point_array = PointArray(point_def)
+            point_array.update_from_json(value)
+            for pt_index, pt_val in point_array.updates():
+                # Array points share their head point's definition (group, scaling, deadband).
+                yield point_def, pt_index, pt_val
         else:
-            self._apply_point_update(point_def, point_def.index, value)
+            yield point_def, point_def.index, value
+
+    def _apply_input_updates(self, updates):
+        """
+            Validate input point updates, drop the ones inside their deadband and apply the rest in one transaction.
+
+        :param updates: A list of (PointDefinition, index, value) tuples.
+        :return: The number of point values applied.
+        """
+        wrapped_values = [self._wrap_point_value(point_def, value) for point_def, index, value in updates]
+        typed_updates = [(point_def.point_type, index, value) for point_def, index, value in updates]
+        # Nothing is recorded as reported unless the outstation accepts the whole batch.
+        keep = self.deadband_filter.significant_updates(typed_updates, record=False)
+        applied = self.outstation.apply_updates([(wrapped_value, update[1])
+                                                for wrapped_value, update, significant in zip(wrapped_values, updates, keep)
+                                                if significant])
+        self.deadband_filter.record_updates(typed_updates, keep)
+        return applied
 
     @staticmethod
-    def _apply_point_update(point_def, point_index, value):
+    def _wrap_point_value(point_def, value):
         """
-            Set an input point in the outstation database. This may send its PointValue to the Master.
+            Validate an input point value and wrap it in its opendnp3 data type.
 
         :param point_def: A PointDefinition.
-        :param point_index: A numeric index for the point.
         :param value: A value to send (unwrapped, simple data type).
+        :return: An opendnp3 Analog or Binary.
         """
         point_type = PointDefinition.point_type_for_group(point_def.group)
         if point_type == POINT_TYPE_ANALOG_INPUT:
-            wrapped_val = opendnp3.Analog(float(value))
             if isinstance(value, bool) or not isinstance(value, numbers.Number):
                 # Invalid data type
                 raise DNP3Exception('Received {} value for {}.'.format(type(value), point_def))
+            return opendnp3.Analog(float(value))
         elif point_type == POINT_TYPE_BINARY_INPUT:
-            wrapped_val = opendnp3.Binary(value)
             if not isinstance(value, bool):
                 # Invalid data type
                 raise DNP3Exception('Received {} value for {}.'.format(type(value), point_def))
+            return opendnp3.Binary(value)
         else:
             # The agent supports only DNP3's Analog and Binary point types at this time.
             raise DNP3Exception('Unsupported point type {}'.format(point_type))
-        if wrapped_val is not None:
-            DNP3Outstation.apply_update(wrapped_val, point_index)
-        _log.debug('Sent DNP3 point {}, value={}'.format(point_def, wrapped_val.value))
+
+    def _apply_point_update(self, point_def, point_index, value):
+        """
+            Set an input point in the outstation database. This may send its PointValue to the Master.
+
+        :param point_def: A PointDefinition.
+        :param point_index: A numeric index for the point.
+        :param value: A value to send (unwrapped, simple data type).
+        """
+        wrapped_val = self._wrap_point_value(point_def, value)
+        self.outstation.apply_update(wrapped_val, point_index)
+        _point_log.debug('Sent DNP3 point %s, value=%s', point_def, wrapped_val.value)
 
     def _process_point_value(self, point_value):
-        _log.info('Received DNP3 {}'.format(point_value))
+        # Logged with arguments, so a PointValue is formatted only if the message is emitted.
+        _point_log.info('Received DNP3 %s', point_value)
         if point_value.command_type == 'Select':
             # Perform any needed validation now, then wait for the subsequent Operate command.
             return None
@@ -189,11 +406,13 @@ class Processor(object):
             return point_value
 
 
-def start_outstation(outstation_config, processor):
+def start_outstation(outstation_config, processor, local_ip='0.0.0.0', port=20000, name='outstation', manager=None):
 
-    dnp3_outstation = DNP3Outstation('0.0.0.0', 20000, outstation_config)
+    dnp3_outstation = DNP3Outstation(local_ip, port, outstation_config, name=name)
     dnp3_outstation.set_agent(processor)
-    dnp3_outstation.start()
+    processor.outstation = dnp3_outstation
+    processor.command_worker.start()
+    dnp3_outstation.start(manager)
     _log.debug('DNP3 initialization complete. In command loop.')
     # Ad-hoc tests can be performed at this point if desired.
     return dnp3_outstation
@@ -236,27 +455,82 @@ if __name__ == '__main__':
     parser = argparse.ArgumentParser()
 
     parser.add_argument('-c', '--config_file', required=True,
-                        type=argparse.FileType('r'),
-                        help="Yaml points and outstation configuration file.")
+                        help="Yaml points and outstation configuration file. It is compiled on first use.")
+    parser.add_argument('-s', '--simulation_id',
+                        help="Feed the outstation from the output of this simulation, and send it Operate commands.")
+    parser.add_argument('--goss_server', default='127.0.0.1', help="GOSS server address.")
+    parser.add_argument('--stomp_port', default='61613', help="GOSS stomp port.")
+    parser.add_argument('--batch_window', type=float, default=DEFAULT_BATCH_WINDOW,
+                        help="Seconds to batch Operate commands into one simulation difference message.")
+    parser.add_argument('--value_store',
+                        help="File that persists the current values of operated points across restarts.")
+    parser.add_argument('--playback_speed', type=float, default=1.0,
+                        help="Schedule seconds played per second, for input points with a schedule (player file).")
+    parser.add_argument('--playback_interval', type=float, default=DEFAULT_PLAYBACK_INTERVAL,
+                        help="Seconds between updates of the input points with a schedule.")
+    parser.add_argument('--log_level', default='INFO', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'],
+                        help="Log level.")
+    parser.add_argument('--point_log_rate', type=float, default=DEFAULT_POINT_LOG_RATE,
+                        help="Messages per second logged per point message (e.g. received commands), 0 for all.")
+    parser.add_argument('--sync_logging', action='store_true',
+                        help="Write log messages on the thread that logs them, instead of a writer thread.")
     args = parser.parse_args()
+    configure_logging(getattr(logging, args.log_level), args.point_log_rate or None, not args.sync_logging)
 
-    full_dict = safe_load(args.config_file)
-    points = full_dict.get('points')
-    if not points:
+    full_dict, point_def = load_config(args.config_file)
+    if not point_def.point_count:
         sys.stderr.write("invalid points specified in yaml configuration file.")
         sys.exit(10)
 
     oustation = full_dict.get('outstation', {})
-    point_def = PointDefinitions()
-    point_def.load_points(points)
-    processor = Processor(point_def)
+    value_store = CurrentValueStore(args.value_store) if args.value_store else None
+    processor = Processor(point_def, value_store=value_store)
     #point_def.load_points(points)
 
     outstation = start_outstation(oustation, processor)
+    feeder = None
+    publisher = None
+    if args.simulation_id:
+        feeder = SimulationOutputFeeder(outstation, point_def, args.simulation_id, args.goss_server, args.stomp_port,
+                                        deadband_filter=processor.deadband_filter)
+        feeder.start()
+        publisher = ForwardDifferencePublisher(point_def, args.simulation_id, args.goss_server, args.stomp_port,
+                                               batch_window=args.batch_window)
+        publisher.start()
+        processor.command_listeners.append(publisher.on_point_value)
+        processor.reload_listeners.extend([feeder.reload, publisher.reload])
+    # Schedule paths are relative to the config file.
+    player = SchedulePlayer(outstation, point_def, os.path.dirname(os.path.abspath(args.config_file)),
+                            speed=args.playback_speed, interval=args.playback_interval,
+                            deadband_filter=processor.deadband_filter)
+    if len(player):
+        player.start()
+        processor.reload_listeners.append(player.reload)
+
+    # SIGHUP reloads the points of the config file. Master sessions stay up, the outstation settings are not reloaded.
+    signal.signal(signal.SIGHUP, lambda signum, frame: processor.reload_points_file(args.config_file))
 
     try:
         while True:
             sleep(0.01)
     finally:
+        if feeder is not None:
+            feeder.stop()
+            _log.info('Simulation output latency: {}'.format(feeder.latency_stats()))
+        if len(player):
+            player.stop()
+            _log.info('Schedule playback: {}'.format(player.playback_stats()))
+        # Queued commands apply their output status to the outstation, so they finish before it shuts down.
+        processor.command_worker.stop()
+        _log.info('Command processing: {}'.format(processor.command_worker.stats()))
+        _log.info('Updates suppressed by deadbands: {}'.format(processor.deadband_filter.suppression_counts()))
+        _log.info('Poll windows with more updates than the event buffer holds: {}'.format(
+            outstation.poll_window_overrun_counts()))
         outstation.shutdown()
+        if value_store is not None:
+            value_store.stop()
+            _log.info('Current value store: {}'.format(value_store.stats()))
+        if publisher is not None:
+            publisher.stop()
+            _log.info('Simulation differences published: {}'.format(publisher.publish_stats()))
 
@@ -0,0 +1,57 @@
+"""
+Micro-benchmarks of the DNP3 service's point definitions and Processor.
+
+Run them from services/dnp3_service (pytest-benchmark is required):
+
+    python -m pytest tests
+
+Without the native pydnp3 package, opendnp3_stub.py stands in for it.
+
+The baselines in tests/benchmarks were saved with --benchmark-save=baseline.
+To flag benchmarks whose fastest round is more than 50% slower than the
+baseline of the same machine type:
+
+    python -m pytest tests --benchmark-compare=0001 --benchmark-compare-fail=min:50%
+
+The fastest round is the least sensitive to other load on the machine. On a
+shared machine, rerun a flagged benchmark before treating it as a regression.
+
+Save a new baseline after an intended change, or on a new machine, with
+--benchmark-save=baseline.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest  # noqa: E402
+
+import opendnp3_stub  # noqa: E402
+
+opendnp3_stub.install()
+
+from point_maps import POINT_COUNTS, point_map  # noqa: E402
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_configure(config):
+    # Baselines live with the tests, not in the directory pytest was started from.
+    if hasattr(config.option, 'benchmark_storage') and config.option.benchmark_storage == 'file://./.benchmarks':
+        config.option.benchmark_storage = 'file://' + os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                                   'benchmarks')
+
+
+@pytest.fixture(params=POINT_COUNTS, ids=lambda count: '{}k'.format(count // 1000))
+def point_count(request):
+    return request.param
+
+
+@pytest.fixture(params=['plain', 'selector_blocks', 'arrays'])
+def map_kind(request):
+    return request.param
+
+
+@pytest.fixture
+def points_json(map_kind, point_count):
+    return point_map(map_kind, point_count)
@@ -0,0 +1,188 @@
+"""
+A pure Python stand-in for pydnp3, so the benchmarks run without the native DNP3 stack.
+
+It implements the value and command types the Processor and PointDefinitions
+create and inspect (Analog, Binary, AnalogOutputInt32, ControlRelayOutputBlock,
+...), with the attributes opendnp3 gives them. Any other name, such as a stack
+interface class or an enumeration value, resolves to a placeholder class that
+accepts any arguments and attribute access. Placeholders are created once per
+name, so type() comparisons and dictionary keys work as with the real module.
+Nothing talks to a network.
+"""
+import sys
+import types
+
+
+class _Placeholder(object):
+    """Accept any construction, call and attribute access."""
+
+    def __init__(self, *args, **kwargs):
+        self.args = args
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        return _Placeholder()
+
+    def __call__(self, *args, **kwargs):
+        return _Placeholder()
+
+    def __getitem__(self, key):
+        return _Placeholder()
+
+
+class _PlaceholderType(type):
+    """Placeholder classes have placeholder class attributes, e.g. opendnp3.PointClass.Class1."""
+
+    def __getattr__(cls, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        value = _PlaceholderType(name, (_Placeholder,), {})
+        setattr(cls, name, value)
+        return value
+
+    def __or__(cls, other):
+        return 0
+
+    __ror__ = __or__
+
+
+class _StubModule(types.ModuleType):
+    """A module whose unknown attributes are placeholder classes, created once per name."""
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        value = _PlaceholderType(name, (_Placeholder,), {})
+        setattr(self, name, value)
+        return value
+
+
+class _Value(object):
+    """An opendnp3 measurement or analog output command: a value, flags and a time."""
+
+    def __init__(self, value=0, flags=None, time=None):
+        self.value = value
+        self.flags = flags
+        self.time = time
+
+
+class Analog(_Value):
+    pass
+
+
+class Binary(_Value):
+    pass
+
+
+class AnalogOutputStatus(_Value):
+    pass
+
+
+class BinaryOutputStatus(_Value):
+    pass
+
+
+class AnalogOutputInt16(_Value):
+    pass
+
+
+class AnalogOutputInt32(_Value):
+    pass
+
+
+class AnalogOutputFloat32(_Value):
+    pass
+
+
+class AnalogOutputDouble64(_Value):
+    pass
+
+
+class ControlCode(object):
+    NUL = 0
+    PULSE_ON = 1
+    PULSE_OFF = 2
+    LATCH_ON = 3
+    LATCH_OFF = 4
+    CLOSE_PULSE_ON = 65
+    TRIP_PULSE_ON = 129
+    UNDEFINED = 255
+
+
+class ControlRelayOutputBlock(object):
+    def __init__(self, functionCode=ControlCode.LATCH_ON, count=1, onTimeMS=100, offTimeMS=100):
+        self.functionCode = functionCode
+        self.count = count
+        self.onTimeMS = onTimeMS
+        self.offTimeMS = offTimeMS
+
+
+class CommandStatus(object):
+    SUCCESS = 0
+    TIMEOUT = 1
+    NO_SELECT = 2
+    FORMAT_ERROR = 3
+    NOT_SUPPORTED = 4
+    ALREADY_ACTIVE = 5
+    HARDWARE_ERROR = 6
+    LOCAL = 7
+    TOO_MANY_OPS = 8
+    NOT_AUTHORIZED = 9
+    AUTOMATION_INHIBIT = 10
+    PROCESSING_LIMITED = 11
+    OUT_OF_RANGE = 12
+    DOWNSTREAM_LOCAL = 13
+    ALREADY_COMPLETE = 14
+    BLOCKED = 15
+    CANCELLED = 16
+    BLOCKED_OTHER_MASTER = 17
+    DOWNSTREAM_FAIL = 18
+    NON_PARTICIPATING = 126
+    UNDEFINED = 127
+
+
+class OperateType(object):
+    SelectBeforeOperate = 0
+    DirectOperate = 1
+    DirectOperateNoAck = 2
+
+
+class UpdateBuilder(object):
+    """Collect updates like asiodnp3.UpdateBuilder. Build() returns them as a list."""
+
+    def __init__(self):
+        self.updates = []
+
+    def Update(self, value, index, *args):
+        self.updates.append((value, index))
+
+    def Build(self):
+        return self.updates
+
+
+def _module(name, members):
+    module = _StubModule(name)
+    module.__dict__.update(members)
+    return module
+
+
+def install():
+    """Install the stub as the pydnp3 package, unless the real one can be imported. Return True if installed."""
+    try:
+        import pydnp3     # noqa: F401
+        return False
+    except ImportError:
+        pass
+    opendnp3 = _module('pydnp3.opendnp3', dict(
+        (name, value) for name, value in globals().items()
+        if isinstance(value, type) and not name.startswith('_') and name != 'UpdateBuilder'))
+    openpal = _module('pydnp3.openpal', {})
+    asiopal = _module('pydnp3.asiopal', {})
+    asiodnp3 = _module('pydnp3.asiodnp3', {'UpdateBuilder': UpdateBuilder})
+    package = _module('pydnp3', {'opendnp3': opendnp3, 'openpal': openpal, 'asiopal': asiopal,
+                                 'asiodnp3': asiodnp3})
+    package.__path__ = []
+    for module in (package, opendnp3, openpal, asiopal, asiodnp3):
+        sys.modules[module.__name__] = module
+    return True
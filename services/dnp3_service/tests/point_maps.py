@@ -0,0 +1,55 @@
+"""
+Synthetic point maps of the benchmark sizes.
+
+    plain            -- equal numbers of analog inputs, binary inputs, analog outputs and binary outputs.
+    selector_blocks  -- selector blocks of BLOCK_SIZE analog outputs, each with a binary output that saves it.
+    arrays           -- analog input arrays of ARRAY_ROWS rows of ARRAY_COLUMNS points.
+"""
+POINT_COUNTS = (1000, 10000, 100000)
+BLOCK_SIZE = 100
+ARRAY_COLUMNS = ('voltage', 'var', 'watts', 'power_factor')
+ARRAY_ROWS = 250
+
+
+def point_map(kind, point_count):
+    """Return the points config of a map kind with about point_count points."""
+    return {'plain': plain_points,
+            'selector_blocks': selector_block_points,
+            'arrays': array_points}[kind](point_count)
+
+
+def plain_points(point_count):
+    count = point_count // 4
+    points = []
+    for prefix, group, variation in (('AI', 30, 1), ('BI', 1, 2), ('AO', 41, 1), ('BO', 12, 1)):
+        points.extend({'name': '{}{}'.format(prefix, i), 'group': group, 'variation': variation, 'index': i}
+                      for i in range(count))
+    return points
+
+
+def selector_block_points(point_count):
+    points = []
+    for block in range(point_count // (BLOCK_SIZE + 1)):
+        start = block * BLOCK_SIZE
+        points.append({'name': 'Block{}'.format(block), 'group': 41, 'variation': 1, 'index': start,
+                       'type': 'selector_block', 'selector_block_start': start,
+                       'selector_block_end': start + BLOCK_SIZE})
+        points.extend({'name': 'Block{}.Point{}'.format(block, i), 'group': 41, 'variation': 1, 'index': start + i}
+                      for i in range(1, BLOCK_SIZE))
+        points.append({'name': 'Block{}.Save'.format(block), 'group': 12, 'variation': 1, 'index': block,
+                       'save_on_write': 'Block{}'.format(block)})
+    return points
+
+
+def array_points(point_count):
+    array_size = ARRAY_ROWS * len(ARRAY_COLUMNS)
+    return [{'name': 'Array{}'.format(number), 'group': 30, 'variation': 1, 'index': number * array_size,
+             'type': 'array', 'array_points': [{'name': column} for column in ARRAY_COLUMNS],
+             'array_times_repeated': ARRAY_ROWS}
+            for number in range(max(1, point_count // array_size))]
+
+
+def array_json(rows=ARRAY_ROWS):
+    """Return a value of an array point: a list of rows, each a dictionary of column name to value."""
+    return [dict((column, float(row * len(ARRAY_COLUMNS) + number)) for number, column in enumerate(ARRAY_COLUMNS))
+            for row in range(rows)]
@@ -0,0 +1,102 @@
+import threading
+
+from pydnp3 import opendnp3
+from dnp3.command_worker import CommandWorker
+from dnp3.points import PointDefinitions
+from start_service import Processor
+
+from point_maps import plain_points
+
+
+def test_commands_are_processed_in_submission_order():
+    worker = CommandWorker()
+    worker.start()
+    processed = []
+    for number in range(200):
+        assert worker.submit(processed.append, number)
+    worker.wait_until_idle()
+    worker.stop()
+    assert processed == list(range(200))
+    assert worker.stats()['processed'] == 200
+
+
+def test_full_queue_rejects_commands():
+    worker = CommandWorker(max_queue_size=2)
+    processed = []
+    assert worker.submit(processed.append, 1)
+    assert worker.submit(processed.append, 2)
+    assert not worker.submit(processed.append, 3)
+    assert worker.rejected_count == 1
+    worker.start()
+    worker.wait_until_idle()
+    worker.stop()
+    assert processed == [1, 2]
+
+
+def test_failed_command_does_not_stop_the_worker():
+    def fail():
+        raise ValueError('bad command')
+
+    worker = CommandWorker()
+    worker.start()
+    processed = []
+    worker.submit(fail)
+    worker.submit(processed.append, 'after')
+    worker.wait_until_idle()
+    worker.stop()
+    assert processed == ['after']
+    assert (worker.failed_count, worker.processed_count) == (1, 1)
+
+
+def test_stop_processes_queued_commands():
+    worker = CommandWorker()
+    release = threading.Event()
+    processed = []
+    worker.submit(release.wait)
+    for number in range(5):
+        worker.submit(processed.append, number)
+    worker.start()
+    release.set()
+    worker.stop()
+    assert processed == list(range(5))
+    assert not worker.running
+
+
+def _processor(command_worker):
+    point_defs = PointDefinitions()
+    point_defs.load_points(plain_points(40))
+    return Processor(point_defs, command_worker)
+
+
+def test_processor_rejects_commands_when_the_queue_is_full():
+    # Not started, so nothing leaves the queue.
+    processor = _processor(CommandWorker(max_queue_size=1))
+    command = opendnp3.AnalogOutputInt32(7)
+    operate = opendnp3.OperateType.DirectOperate
+    assert processor.process_point_value('Operate', command, 0, operate) == opendnp3.CommandStatus.SUCCESS
+    assert processor.process_point_value('Operate', command, 1, operate) == opendnp3.CommandStatus.TOO_MANY_OPS
+    # A Select is only validated, it is never queued.
+    assert processor.process_point_value('Select', command, 1, None) == opendnp3.CommandStatus.SUCCESS
+
+
+def test_processor_rejects_commands_for_undefined_points():
+    processor = _processor(CommandWorker())
+    status = processor.process_point_value('Operate', opendnp3.AnalogOutputInt32(7), 999,
+                                           opendnp3.OperateType.DirectOperate)
+    assert status == opendnp3.CommandStatus.DOWNSTREAM_FAIL
+    assert processor.command_worker.queue_depth == 0
+
+
+def test_processor_applies_operates_in_order():
+    processor = _processor(CommandWorker())
+    processor.command_worker.start()
+    operated = []
+    processor.command_listeners.append(lambda point_value: operated.append(point_value.value))
+    for value in range(20):
+        processor.process_point_value('Operate', opendnp3.AnalogOutputInt32(value), 3,
+                                      opendnp3.OperateType.DirectOperate)
+    processor.command_worker.wait_until_idle()
+    processor.command_worker.stop()
+    assert operated == list(range(20))
+    point_def = processor.point_definitions.point_named('AO3')
+    assert processor.get_current_point_value_for_def(point_def).value == 19
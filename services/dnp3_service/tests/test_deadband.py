@@ -0,0 +1,114 @@
+import threading
+
+from dnp3.deadband import DeadbandFilter
+from dnp3.points import PointDefinitions, POINT_TYPE_ANALOG_INPUT, POINT_TYPE_BINARY_INPUT, POINT_TYPE_ANALOG_OUTPUT
+
+
+def _point_definitions(points):
+    point_defs = PointDefinitions()
+    point_defs.load_points(points)
+    return point_defs
+
+
+POINTS = [
+    {'name': 'Absolute', 'group': 30, 'variation': 1, 'index': 0, 'deadband': 1.0},
+    {'name': 'Percent', 'group': 30, 'variation': 1, 'index': 1, 'deadband': 10.0, 'deadband_type': 'percent'},
+    {'name': 'NoDeadband', 'group': 30, 'variation': 1, 'index': 2},
+    {'name': 'Breaker', 'group': 1, 'variation': 2, 'index': 0, 'deadband': 5.0},
+]
+
+
+def _significant(deadband_filter, point_type, index, value):
+    return bool(deadband_filter.significant(point_type, [index], [value])[0])
+
+
+def test_first_update_is_always_reported():
+    deadband_filter = DeadbandFilter(_point_definitions(POINTS))
+    assert _significant(deadband_filter, POINT_TYPE_ANALOG_INPUT, 0, 10.0)
+    assert _significant(deadband_filter, POINT_TYPE_BINARY_INPUT, 0, 1.0)
+
+
+def test_absolute_deadband():
+    deadband_filter = DeadbandFilter(_point_definitions(POINTS))
+    assert _significant(deadband_filter, POINT_TYPE_ANALOG_INPUT, 0, 10.0)
+    assert not _significant(deadband_filter, POINT_TYPE_ANALOG_INPUT, 0, 10.5)
+    assert not _significant(deadband_filter, POINT_TYPE_ANALOG_INPUT, 0, 9.0)
+    # Measured from the last reported value, not the last suppressed one.
+    assert _significant(deadband_filter, POINT_TYPE_ANALOG_INPUT, 0, 11.5)
+    assert deadband_filter.suppressed_count(POINT_TYPE_ANALOG_INPUT, 0) == 2
+
+
+def test_percent_deadband():
+    deadband_filter = DeadbandFilter(_point_definitions(POINTS))
+    assert _significant(deadband_filter, POINT_TYPE_ANALOG_INPUT, 1, 200.0)
+    assert not _significant(deadband_filter, POINT_TYPE_ANALOG_INPUT, 1, 215.0)
+    assert _significant(deadband_filter, POINT_TYPE_ANALOG_INPUT, 1, 221.0)
+
+
+def test_points_without_deadband_and_outputs_are_always_reported():
+    deadband_filter = DeadbandFilter(_point_definitions(POINTS))
+    for _ in range(3):
+        assert _significant(deadband_filter, POINT_TYPE_ANALOG_INPUT, 2, 1.0)
+        assert _significant(deadband_filter, POINT_TYPE_ANALOG_OUTPUT, 0, 1.0)
+    # Indexes beyond the configured points are reported too.
+    assert _significant(deadband_filter, POINT_TYPE_ANALOG_INPUT, 99, 1.0)
+
+
+def test_binary_deadband_reports_changes_only():
+    deadband_filter = DeadbandFilter(_point_definitions(POINTS))
+    assert _significant(deadband_filter, POINT_TYPE_BINARY_INPUT, 0, 1.0)
+    assert not _significant(deadband_filter, POINT_TYPE_BINARY_INPUT, 0, 1.0)
+    assert _significant(deadband_filter, POINT_TYPE_BINARY_INPUT, 0, 0.0)
+
+
+def test_significant_updates_keeps_update_order():
+    deadband_filter = DeadbandFilter(_point_definitions(POINTS))
+    deadband_filter.significant_updates([(POINT_TYPE_ANALOG_INPUT, 0, 10.0), (POINT_TYPE_BINARY_INPUT, 0, True)])
+    keep = deadband_filter.significant_updates([(POINT_TYPE_ANALOG_INPUT, 0, 10.2),
+                                                (POINT_TYPE_ANALOG_OUTPUT, 0, 5.0),
+                                                (POINT_TYPE_BINARY_INPUT, 0, False),
+                                                (POINT_TYPE_ANALOG_INPUT, 2, 3.0)])
+    assert keep == [False, True, True, True]
+    assert deadband_filter.suppression_counts() == {POINT_TYPE_ANALOG_INPUT: 1, POINT_TYPE_BINARY_INPUT: 0}
+
+
+def test_reload_resets_changed_points_only():
+    old_defs = _point_definitions(POINTS)
+    deadband_filter = DeadbandFilter(old_defs)
+    for index in (0, 1):
+        _significant(deadband_filter, POINT_TYPE_ANALOG_INPUT, index, 100.0)
+        _significant(deadband_filter, POINT_TYPE_ANALOG_INPUT, index, 100.5)
+
+    new_points = [dict(point) for point in POINTS]
+    new_points[1]['deadband'] = 1.0
+    new_points.append({'name': 'Added', 'group': 30, 'variation': 1, 'index': 5, 'deadband': 1.0})
+    new_defs = _point_definitions(new_points)
+    deadband_filter.reload(new_defs, old_defs.diff(new_defs))
+
+    # Untouched: keeps its last reported value and suppression count.
+    assert deadband_filter.suppressed_count(POINT_TYPE_ANALOG_INPUT, 0) == 1
+    assert not _significant(deadband_filter, POINT_TYPE_ANALOG_INPUT, 0, 100.2)
+    # Changed: starts over with the new 1% deadband.
+    assert deadband_filter.suppressed_count(POINT_TYPE_ANALOG_INPUT, 1) == 0
+    assert _significant(deadband_filter, POINT_TYPE_ANALOG_INPUT, 1, 100.5)
+    assert _significant(deadband_filter, POINT_TYPE_ANALOG_INPUT, 1, 102.0)
+    # Added: its first update is reported, then its deadband applies.
+    assert _significant(deadband_filter, POINT_TYPE_ANALOG_INPUT, 5, 1.0)
+    assert not _significant(deadband_filter, POINT_TYPE_ANALOG_INPUT, 5, 1.5)
+
+
+def test_concurrent_producers_count_every_suppression():
+    deadband_filter = DeadbandFilter(_point_definitions(POINTS))
+    _significant(deadband_filter, POINT_TYPE_ANALOG_INPUT, 0, 10.0)
+    threads_count, updates = 4, 2000
+
+    def produce():
+        for _ in range(updates):
+            deadband_filter.significant(POINT_TYPE_ANALOG_INPUT, [0], [10.5])
+
+    threads = [threading.Thread(target=produce) for _ in range(threads_count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert deadband_filter.suppressed_count(POINT_TYPE_ANALOG_INPUT, 0) == threads_count * updates
@@ -0,0 +1,110 @@
+import json
+
+import pytest
+
+from pydnp3 import opendnp3
+from dnp3.difference_publisher import ForwardDifferencePublisher, SIMULATION_INPUT_TOPIC
+from dnp3.points import PointDefinitions
+
+POINTS = [
+    {'name': 'Regulator.REG1.Step', 'group': 41, 'variation': 1, 'index': 0,
+     'control_mrid': '_reg1', 'control_attribute': 'TapChanger.step'},
+    {'name': 'Inverter.PV1.P', 'group': 41, 'variation': 1, 'index': 1, 'scaling_multiplier': 10,
+     'control_mrid': '_pv1', 'control_attribute': 'PowerElectronicsConnection.p'},
+    {'name': 'Unmapped', 'group': 41, 'variation': 1, 'index': 2},
+    {'name': 'Switch.SW1.Open', 'group': 12, 'variation': 1, 'index': 0,
+     'control_mrid': '_sw1', 'control_attribute': 'Switch.open'},
+]
+
+
+class RecordingConnection(object):
+    """Record the messages sent, in place of a STOMP connection."""
+
+    def __init__(self):
+        self.messages = []
+
+    def send(self, destination, body):
+        self.messages.append((destination, json.loads(body)))
+
+    def disconnect(self):
+        pass
+
+
+@pytest.fixture
+def point_definitions():
+    point_defs = PointDefinitions()
+    point_defs.load_points(POINTS)
+    return point_defs
+
+
+def _publisher(point_definitions, batch_window=60.0):
+    # A long batch window, so only flush() and stop() publish.
+    publisher = ForwardDifferencePublisher(point_definitions, 'sim1', batch_window=batch_window)
+    publisher.connection = RecordingConnection()
+    return publisher
+
+
+def _operate(publisher, point_definitions, command, index):
+    publisher.on_point_value(point_definitions.point_value_for_command(
+        'Operate', command, index, opendnp3.OperateType.DirectOperate))
+
+
+def _differences(message, kind):
+    return [(d['object'], d['attribute'], d['value']) for d in message['input']['message'][kind]]
+
+
+def test_operates_in_a_window_are_one_message(point_definitions):
+    publisher = _publisher(point_definitions)
+    _operate(publisher, point_definitions, opendnp3.AnalogOutputInt32(3), 0)
+    _operate(publisher, point_definitions, opendnp3.ControlRelayOutputBlock(opendnp3.ControlCode.LATCH_ON), 0)
+    _operate(publisher, point_definitions, opendnp3.AnalogOutputInt32(5), 0)
+    _operate(publisher, point_definitions, opendnp3.AnalogOutputInt32(9), 2)
+    assert publisher.connection.messages == []
+    publisher.flush()
+
+    [(destination, message)] = publisher.connection.messages
+    assert destination == SIMULATION_INPUT_TOPIC + 'sim1'
+    assert message['command'] == 'update'
+    # The later operate of an attribute replaces the earlier one, unmapped points are ignored.
+    assert _differences(message, 'forward_differences') == [('_reg1', 'TapChanger.step', 5),
+                                                             ('_sw1', 'Switch.open', 1)]
+    assert _differences(message, 'reverse_differences') == []
+    assert publisher.publish_stats() == {'messages': 1, 'differences': 2}
+
+
+def test_reverse_differences_are_the_last_published_values(point_definitions):
+    publisher = _publisher(point_definitions)
+    _operate(publisher, point_definitions, opendnp3.AnalogOutputInt32(3), 0)
+    publisher.flush()
+    _operate(publisher, point_definitions, opendnp3.AnalogOutputInt32(4), 0)
+    _operate(publisher, point_definitions, opendnp3.ControlRelayOutputBlock(opendnp3.ControlCode.LATCH_OFF), 0)
+    publisher.flush()
+
+    message = publisher.connection.messages[-1][1]
+    assert _differences(message, 'forward_differences') == [('_reg1', 'TapChanger.step', 4),
+                                                             ('_sw1', 'Switch.open', 0)]
+    assert _differences(message, 'reverse_differences') == [('_reg1', 'TapChanger.step', 3)]
+
+
+def test_analog_values_are_unscaled(point_definitions):
+    publisher = _publisher(point_definitions)
+    _operate(publisher, point_definitions, opendnp3.AnalogOutputInt32(250), 1)
+    publisher.flush()
+    message = publisher.connection.messages[0][1]
+    assert _differences(message, 'forward_differences') == [('_pv1', 'PowerElectronicsConnection.p', 25.0)]
+
+
+def test_without_batch_window_every_operate_is_published(point_definitions):
+    publisher = _publisher(point_definitions, batch_window=0)
+    _operate(publisher, point_definitions, opendnp3.AnalogOutputInt32(1), 0)
+    _operate(publisher, point_definitions, opendnp3.AnalogOutputInt32(2), 0)
+    assert len(publisher.connection.messages) == 2
+
+
+def test_stop_publishes_pending_differences(point_definitions):
+    publisher = _publisher(point_definitions)
+    connection = publisher.connection
+    _operate(publisher, point_definitions, opendnp3.AnalogOutputInt32(1), 0)
+    publisher.stop()
+    assert len(connection.messages) == 1
+    assert publisher.connection is None
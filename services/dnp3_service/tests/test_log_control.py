@@ -0,0 +1,64 @@
+import logging
+import sys
+import threading
+
+from dnp3.log_control import AsyncLogHandler
+
+
+class RecordingHandler(logging.Handler):
+    """Record the messages of the records handled, in place of a stream handler."""
+
+    def __init__(self):
+        super(RecordingHandler, self).__init__()
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+def _record(number):
+    return logging.makeLogRecord({'name': 'test', 'levelno': logging.INFO, 'levelname': 'INFO',
+                                  'msg': 'record %d', 'args': (number,)})
+
+
+def test_flush_while_the_writer_runs_writes_every_record_once():
+    recorder = RecordingHandler()
+    handler = AsyncLogHandler([recorder], max_queue_size=100000, interval=0.0001)
+    records = 20000
+    flushing = threading.Event()
+    errors = []
+
+    def flush():
+        while not flushing.is_set():
+            try:
+                handler.flush()
+            except Exception as err:
+                errors.append(err)
+
+    switch_interval = sys.getswitchinterval()
+    # Switch threads often, so the writer and flush() interleave.
+    sys.setswitchinterval(1e-6)
+    flusher = threading.Thread(target=flush)
+    flusher.start()
+    try:
+        for number in range(records):
+            handler.handle(_record(number))
+    finally:
+        flushing.set()
+        flusher.join()
+        sys.setswitchinterval(switch_interval)
+    handler.close()
+    assert errors == []
+    assert sorted(recorder.messages) == sorted('record {}'.format(number) for number in range(records))
+
+
+def test_dropped_records_are_reported_once():
+    recorder = RecordingHandler()
+    handler = AsyncLogHandler([recorder], max_queue_size=2, interval=60)
+    for number in range(5):
+        handler.handle(_record(number))
+    handler.flush()
+    handler.flush()
+    handler.close()
+    assert recorder.messages == ['record 0', 'record 1', 'Dropped 3 log records, the writer fell behind']
+    assert handler.dropped_total == 3
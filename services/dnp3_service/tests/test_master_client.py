@@ -0,0 +1,130 @@
+import json
+
+import pytest
+
+from dnp3.master_client import DNP3MasterClient, MasterDevice, MeasurementTable, check_unique_mrids, \
+    expand_device_entries
+from dnp3.points import PointDefinitions, POINT_TYPE_ANALOG_INPUT, POINT_TYPE_BINARY_INPUT
+
+POINTS = [
+    {'name': 'V1.mag', 'group': 30, 'variation': 1, 'index': 0, 'measurement_mrid': '_v1', 'scaling_multiplier': 10},
+    {'name': 'V1.ang', 'group': 30, 'variation': 1, 'index': 1, 'measurement_mrid': '_v1',
+     'measurement_attribute': 'angle'},
+    {'name': 'Unmeasured', 'group': 30, 'variation': 1, 'index': 2},
+    {'name': 'V2.mag', 'group': 30, 'variation': 1, 'index': 3, 'measurement_mrid': '_v2'},
+    {'name': 'SW1', 'group': 1, 'variation': 2, 'index': 0, 'measurement_mrid': '_sw1'},
+]
+
+
+@pytest.fixture
+def point_definitions():
+    point_defs = PointDefinitions()
+    point_defs.load_points(POINTS)
+    return point_defs
+
+
+def _points_of_type(point_definitions, point_type):
+    return [pt for pt in point_definitions.iter_points()
+            if pt.point_type == point_type and pt.measurement_mrid is not None]
+
+
+def test_table_stores_measured_points_only(point_definitions):
+    table = MeasurementTable(_points_of_type(point_definitions, POINT_TYPE_ANALOG_INPUT), 'magnitude')
+    assert len(table) == 3
+    # Index 2 isn't measured and index 9 is beyond every point.
+    assert table.store([0, 2, 3, 9], [120.0, 5.0, 7.0, 8.0]) == 2
+    assert table.take() == [('_v1', 'magnitude', 12.0), ('_v2', 'magnitude', 7.0)]
+
+
+def test_table_take_returns_latest_values_once(point_definitions):
+    table = MeasurementTable(_points_of_type(point_definitions, POINT_TYPE_ANALOG_INPUT), 'magnitude')
+    table.store([1], [30.0])
+    table.store([1, 3], [45.0, 1.0])
+    assert table.take() == [('_v1', 'angle', 45.0), ('_v2', 'magnitude', 1.0)]
+    assert table.take() == []
+
+
+def test_binary_table_reports_integers(point_definitions):
+    table = MeasurementTable(_points_of_type(point_definitions, POINT_TYPE_BINARY_INPUT), 'value', scaled=False)
+    table.store([0], [True])
+    assert table.take() == [('_sw1', 'value', 1)]
+
+
+def test_device_takes_values_of_every_table(point_definitions):
+    device = MasterDevice({'name': 'rtu'}, point_definitions)
+    device.store(POINT_TYPE_ANALOG_INPUT, [0], [100.0])
+    device.store(POINT_TYPE_BINARY_INPUT, [0], [False])
+    values, first_received = device.take()
+    assert sorted(values) == [('_sw1', 'value', 0), ('_v1', 'magnitude', 10.0)]
+    assert first_received is not None
+    assert device.take() == ([], None)
+    assert device.device_stats()['values'] == 2
+
+
+class RecordingConnection(object):
+    """Record the messages sent, in place of a STOMP connection."""
+
+    def __init__(self):
+        self.messages = []
+
+    def send(self, destination, body):
+        self.messages.append((destination, json.loads(body)))
+
+
+def test_client_publishes_one_message_per_interval(point_definitions):
+    client = DNP3MasterClient({'simulation_id': 'sim1'}, connection=RecordingConnection())
+    client.devices = [MasterDevice({'name': 'rtu-0'}, point_definitions),
+                      MasterDevice({'name': 'rtu-1'}, point_definitions)]
+    client.devices[0].store(POINT_TYPE_ANALOG_INPUT, [0, 1], [100.0, 30.0])
+    client.devices[1].store(POINT_TYPE_ANALOG_INPUT, [3], [2.0])
+    assert client.publish() == 2
+    assert client.publish() == 0
+
+    [(topic, message)] = client.connection.messages
+    assert topic.endswith('sim1')
+    assert message['simulation_id'] == 'sim1'
+    measurements = sorted(message['message']['measurements'], key=lambda m: m['measurement_mrid'])
+    # The attributes of one mRID make up one measurement.
+    assert measurements == [{'measurement_mrid': '_v1', 'magnitude': 10.0, 'angle': 30.0},
+                            {'measurement_mrid': '_v2', 'magnitude': 2.0}]
+    assert client.publish_stats()['measurements'] == 2
+
+
+def test_expand_device_entries():
+    entries = expand_device_entries([{'name': 'rtu', 'count': 2, 'port': 20000,
+                                      'master': {'link_remote_addr': 10}},
+                                     {'name': 'single'}])
+    assert [(e['name'], e.get('port'), e.get('master', {}).get('link_remote_addr')) for e in entries] == \
+        [('rtu-0', 20000, 10), ('rtu-1', 20001, 11), ('single', None, None)]
+
+
+def test_expand_device_entries_numbers_mrid_prefixes():
+    entries = expand_device_entries([{'name': 'rtu', 'count': 2, 'mrid_prefix': 'rtu-{number}_'}])
+    assert [e['mrid_prefix'] for e in entries] == ['rtu-0_', 'rtu-1_']
+
+
+def test_devices_on_one_points_file_publish_their_own_mrids(point_definitions):
+    client = DNP3MasterClient({'simulation_id': 'sim1'}, connection=RecordingConnection())
+    client.devices = [MasterDevice(entry, point_definitions)
+                      for entry in expand_device_entries([{'name': 'rtu', 'count': 2, 'mrid_prefix': 'rtu-{number}_'}])]
+    check_unique_mrids(client.devices)
+    client.devices[0].store(POINT_TYPE_ANALOG_INPUT, [3], [1.0])
+    client.devices[1].store(POINT_TYPE_ANALOG_INPUT, [3], [2.0])
+    assert client.publish() == 2
+
+    [(topic, message)] = client.connection.messages
+    measurements = sorted(message['message']['measurements'], key=lambda m: m['measurement_mrid'])
+    assert measurements == [{'measurement_mrid': 'rtu-0__v2', 'magnitude': 1.0},
+                            {'measurement_mrid': 'rtu-1__v2', 'magnitude': 2.0}]
+
+
+def test_devices_sharing_mrids_are_rejected(point_definitions):
+    devices = [MasterDevice(entry, point_definitions)
+               for entry in expand_device_entries([{'name': 'rtu', 'count': 2}])]
+    with pytest.raises(ValueError):
+        check_unique_mrids(devices)
+    client = DNP3MasterClient({'devices': [{'name': 'rtu', 'count': 2, 'points': POINTS}]},
+                              connection=RecordingConnection())
+    with pytest.raises(ValueError):
+        client.start()
+    assert client.devices == []
@@ -0,0 +1,23 @@
+import threading
+
+from pydnp3 import opendnp3
+
+from dnp3.outstation import DNP3Outstation
+from dnp3.points import POINT_TYPE_ANALOG_INPUT
+
+
+def test_concurrent_updates_count_every_poll_window():
+    # Every batch ends the window of the batch before it, which overran an event buffer of 0.
+    outstation = DNP3Outstation('0.0.0.0', 20000, {'master_poll_interval': 0})
+    threads_count, batches = 4, 500
+
+    def apply_batches():
+        for _ in range(batches):
+            outstation._count_event_updates({opendnp3.Analog: 1})
+
+    threads = [threading.Thread(target=apply_batches) for _ in range(threads_count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert outstation.poll_window_overrun_counts() == {POINT_TYPE_ANALOG_INPUT: threads_count * batches - 1}
@@ -0,0 +1,82 @@
+import pytest
+
+from pydnp3 import opendnp3
+from dnp3.points import PointDefinitions, POINT_TYPE_ANALOG_INPUT, POINT_TYPE_ANALOG_OUTPUT
+
+from point_maps import ARRAY_COLUMNS, ARRAY_ROWS
+
+
+@pytest.fixture
+def point_definitions(points_json):
+    point_defs = PointDefinitions()
+    point_defs.load_points(points_json)
+    return point_defs
+
+
+def _middle_point(points_json):
+    return points_json[len(points_json) // 2]
+
+
+def test_load_points(benchmark, points_json):
+    def load():
+        point_defs = PointDefinitions()
+        point_defs.load_points(points_json)
+        return point_defs
+
+    point_defs = benchmark.pedantic(load, rounds=5, warmup_rounds=1)
+    assert point_defs.point_count > 0
+
+
+def test_point_named(benchmark, point_definitions, points_json):
+    name = _middle_point(points_json)['name']
+    point_def = benchmark(point_definitions.point_named, name)
+    assert point_def.name == name
+
+
+def test_for_point_type_and_index(benchmark, map_kind, point_definitions, points_json):
+    point = _middle_point(points_json)
+    if map_kind == 'arrays':
+        # A point inside an array, found through its head point.
+        point_type = POINT_TYPE_ANALOG_INPUT
+        index = point['index'] + (ARRAY_ROWS // 2) * len(ARRAY_COLUMNS) + 1
+    else:
+        point_type = point_definitions.point_named(point['name']).point_type
+        index = point['index']
+    point_def = benchmark(point_definitions.for_point_type_and_index, point_type, index)
+    assert point_def is not None
+
+
+@pytest.mark.parametrize('map_kind', ['plain', 'selector_blocks'])
+def test_point_value_for_command(benchmark, point_definitions):
+    point_def = [pt for pt in point_definitions.iter_points() if pt.point_type == POINT_TYPE_ANALOG_OUTPUT][-1]
+    command = opendnp3.AnalogOutputInt32(42)
+    point_value = benchmark(point_definitions.point_value_for_command, 'Operate', command, point_def.index,
+                            opendnp3.OperateType.DirectOperate)
+    assert point_value.value == 42
+
+
+def _every_point(point_definitions):
+    return [(pt.name, pt.group, pt.variation, pt.index) for pt in point_definitions.iter_points()]
+
+
+def test_point_named_with_index_every_point(benchmark, point_definitions):
+    """Look every point of the map up by name and index, one PointIndex dictionary lookup per plain point."""
+    points = _every_point(point_definitions)
+
+    def look_up():
+        return sum(1 for name, group, variation, index in points
+                   if point_definitions.point_named(name, index) is not None)
+
+    found = benchmark.pedantic(look_up, rounds=5)
+    assert found == len(points)
+
+
+def test_point_for_variation_and_index_every_point(benchmark, point_definitions):
+    points = _every_point(point_definitions)
+
+    def look_up():
+        return sum(1 for name, group, variation, index in points
+                   if point_definitions.point_for_variation_and_index(group, variation, index) is not None)
+
+    found = benchmark.pedantic(look_up, rounds=5)
+    assert found == len(points)
@@ -0,0 +1,109 @@
+import pytest
+
+from pydnp3 import opendnp3
+from dnp3.command_worker import CommandWorker
+from dnp3.points import DNP3Exception, PointDefinitions, POINT_TYPE_ANALOG_INPUT
+from start_service import Processor
+
+from point_maps import plain_points
+
+
+def _point_definitions(points):
+    point_defs = PointDefinitions()
+    point_defs.load_points(points)
+    return point_defs
+
+
+def _reloaded_points():
+    """plain_points(8) with AO1 removed, a deadband added to AI0 and AI2 added."""
+    points = [dict(point) for point in plain_points(8) if point['name'] != 'AO1']
+    points[0]['deadband'] = 0.5
+    points.append({'name': 'AI2', 'group': 30, 'variation': 1, 'index': 2})
+    return points
+
+
+class ReloadRecordingOutstation(object):
+    """Record reloads, in place of a DNP3Outstation. Reject points that need more than max_index + 1 indexes."""
+
+    def __init__(self, max_index=100):
+        self.max_index = max_index
+        self.reloads = []
+
+    def check_points_fit(self, point_definitions):
+        if point_definitions.database_size(POINT_TYPE_ANALOG_INPUT) > self.max_index + 1:
+            raise DNP3Exception('database too small')
+
+    def points_reloaded(self, diff):
+        self.reloads.append(diff)
+
+    def apply_updates(self, updates):
+        return len(updates)
+
+
+@pytest.fixture
+def processor():
+    processor = Processor(_point_definitions(plain_points(8)), CommandWorker())
+    processor.outstation = ReloadRecordingOutstation()
+    processor.command_worker.start()
+    yield processor
+    processor.command_worker.stop()
+
+
+def test_diff_matches_points_by_type_and_index():
+    old_defs = _point_definitions(plain_points(8))
+    diff = old_defs.diff(_point_definitions(_reloaded_points()))
+    assert [pt.name for pt in diff.added] == ['AI2']
+    assert [pt.name for pt in diff.removed] == ['AO1']
+    assert [(old.name, new.deadband) for old, new in diff.changed] == [('AI0', 0.5)]
+    assert len(diff) == 3
+    assert diff.affected_indexes(POINT_TYPE_ANALOG_INPUT) == {0, 2}
+
+
+def test_diff_of_identical_points_is_empty():
+    assert len(_point_definitions(plain_points(8)).diff(_point_definitions(plain_points(8)))) == 0
+
+
+def test_replace_points_is_seen_by_every_holder():
+    point_defs = _point_definitions(plain_points(8))
+    holder = point_defs
+    point_defs.replace_points(_point_definitions(_reloaded_points()))
+    assert holder.point_named('AI2') is not None
+    assert holder.point_named('AO1') is None
+
+
+def test_processor_reload_swaps_points_and_discards_removed_values(processor):
+    for index in (0, 1):
+        processor.process_point_value('Operate', opendnp3.AnalogOutputInt32(index + 10), index,
+                                      opendnp3.OperateType.DirectOperate)
+    processor.command_worker.wait_until_idle()
+    reloaded = []
+    processor.reload_listeners.append(reloaded.append)
+    ao0 = processor.point_definitions.point_named('AO0')
+
+    diff = processor.reload_point_definitions(_point_definitions(_reloaded_points()))
+    processor.command_worker.wait_until_idle()
+
+    assert len(diff) == 3
+    assert processor.point_definitions.point_named('AI2') is not None
+    assert processor.get_current_point_value_for_def(ao0).value == 10
+    assert processor.get_current_point_value(ao0.point_type, 1) is None
+    assert processor.outstation.reloads == [diff]
+    assert reloaded == [processor.point_definitions]
+
+
+def test_processor_reload_keeps_points_that_do_not_fit(processor):
+    processor.outstation.max_index = 1
+    with pytest.raises(DNP3Exception):
+        processor.reload_point_definitions(_point_definitions(_reloaded_points()))
+    assert processor.point_definitions.point_named('AI2') is None
+    assert processor.point_definitions.point_named('AO1') is not None
+    assert processor.outstation.reloads == []
+
+
+def test_processor_reload_without_changes_does_nothing(processor):
+    reloaded = []
+    processor.reload_listeners.append(reloaded.append)
+    diff = processor.reload_point_definitions(_point_definitions(plain_points(8)))
+    assert len(diff) == 0
+    assert reloaded == []
+    assert processor.outstation.reloads == []
@@ -0,0 +1,70 @@
+import pytest
+
+from dnp3.command_worker import CommandWorker
+from dnp3.points import DNP3Exception, PointDefinitions
+from start_service import Processor
+
+from point_maps import plain_points
+
+
+class BatchRecordingOutstation(object):
+    """Record each batch of updates a Processor applies, in place of a DNP3Outstation."""
+
+    def __init__(self):
+        self.batches = []
+
+    def apply_updates(self, updates):
+        self.batches.append(list(updates))
+        return len(updates)
+
+
+@pytest.fixture
+def processor():
+    point_defs = PointDefinitions()
+    point_defs.load_points(plain_points(40))
+    processor = Processor(point_defs, CommandWorker())
+    processor.outstation = BatchRecordingOutstation()
+    return processor
+
+
+def test_update_input_points_applies_one_batch(processor):
+    applied = processor.update_input_points({'AI0': 1.5, 'AI1': 2.5, 'BI3': True})
+    assert applied == 3
+    assert len(processor.outstation.batches) == 1
+    assert sorted((type(value).__name__, index, value.value) for value, index in processor.outstation.batches[0]) == \
+        [('Analog', 0, 1.5), ('Analog', 1, 2.5), ('Binary', 3, True)]
+
+
+def test_update_input_points_invalid_value_applies_nothing(processor):
+    with pytest.raises(DNP3Exception):
+        processor.update_input_points({'AI0': 1.5, 'AI1': 'not a number'})
+    assert processor.outstation.batches == []
+
+
+class RejectingOutstation(BatchRecordingOutstation):
+    """Reject the first batch the way DNP3Outstation rejects an index beyond its database."""
+
+    def __init__(self):
+        super(RejectingOutstation, self).__init__()
+        self.rejected = False
+
+    def apply_updates(self, updates):
+        if not self.rejected:
+            self.rejected = True
+            raise ValueError('Attempt to set a value for index 0 which exceeds database size 0')
+        return super(RejectingOutstation, self).apply_updates(updates)
+
+
+def test_rejected_batch_is_not_recorded_as_reported():
+    points = plain_points(40)
+    points[0]['deadband'] = 1.0
+    point_defs = PointDefinitions()
+    point_defs.load_points(points)
+    processor = Processor(point_defs, CommandWorker())
+    processor.outstation = RejectingOutstation()
+    with pytest.raises(ValueError):
+        processor.update_input_points({'AI0': 1.5})
+    # Resending the same value reports it, as nothing reached the outstation.
+    assert processor.update_input_points({'AI0': 1.5}) == 1
+    # Once applied, it is the last reported value.
+    assert processor.update_input_points({'AI0': 1.7}) == 0
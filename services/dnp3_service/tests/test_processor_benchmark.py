@@ -0,0 +1,78 @@
+import pytest
+
+from pydnp3 import opendnp3
+from dnp3.command_worker import CommandWorker
+from dnp3.points import PointDefinitions, POINT_TYPE_ANALOG_OUTPUT
+from start_service import Processor
+
+from point_maps import array_json, point_map
+
+
+class RecordingOutstation(object):
+    """Count the updates a Processor applies, in place of a DNP3Outstation."""
+
+    def __init__(self):
+        self.update_count = 0
+
+    def apply_update(self, value, index):
+        self.apply_updates([(value, index)])
+
+    def apply_updates(self, updates):
+        count = len(updates)
+        self.update_count += count
+        return count
+
+
+@pytest.fixture
+def processor(map_kind, point_count):
+    point_defs = PointDefinitions()
+    point_defs.load_points(point_map(map_kind, point_count))
+    # An unbounded queue, so commands the worker hasn't caught up with aren't rejected.
+    processor = Processor(point_defs, CommandWorker(max_queue_size=0))
+    processor.outstation = RecordingOutstation()
+    processor.command_worker.start()
+    yield processor
+    processor.command_worker.stop()
+
+
+def _operate(processor, point_def, value):
+    """Process an Operate on the calling thread, as the command worker would."""
+    command = opendnp3.AnalogOutputInt32(value)
+    point_value = processor.point_definitions.point_value_for_command('Operate', command, point_def.index,
+                                                                       opendnp3.OperateType.DirectOperate)
+    return processor._process_point_value(point_value)
+
+
+@pytest.mark.parametrize('map_kind', ['plain', 'selector_blocks'])
+def test_process_point_value(benchmark, processor):
+    point_def = [pt for pt in processor.point_definitions.iter_points()
+                 if pt.point_type == POINT_TYPE_ANALOG_OUTPUT and not pt.is_selector_block][-1]
+    command = opendnp3.AnalogOutputInt32(42)
+    status = benchmark(processor.process_point_value, 'Operate', command, point_def.index,
+                       opendnp3.OperateType.DirectOperate)
+    assert status == opendnp3.CommandStatus.SUCCESS
+    processor.command_worker.wait_until_idle()
+    assert processor.get_current_point_value_for_def(point_def).value == 42
+
+
+@pytest.mark.parametrize('map_kind', ['arrays'])
+def test_update_input_point_array(benchmark, processor):
+    head_def = processor.point_definitions.point_named('Array0')
+    value = array_json()
+    benchmark(processor.update_input_point, head_def, value)
+    assert processor.outstation.update_count >= len(value)
+
+
+@pytest.mark.parametrize('map_kind', ['selector_blocks'])
+def test_save_selector_block(benchmark, processor):
+    block_def = processor.point_definitions.point_named('Block0')
+    _operate(processor, block_def, 1)
+    for index in range(block_def.selector_block_start + 1, block_def.selector_block_end):
+        _operate(processor, processor.point_definitions.for_point_type_and_index(POINT_TYPE_ANALOG_OUTPUT, index),
+                 index)
+    save_def = processor.point_definitions.point_named('Block0.Save')
+    save_value = processor.point_definitions.point_value_for_command(
+        'Operate', opendnp3.ControlRelayOutputBlock(opendnp3.ControlCode.LATCH_ON), save_def.index,
+        opendnp3.OperateType.DirectOperate)
+    benchmark(processor.save_selector_block, save_value)
+    assert processor.selector_blocks.saved_edit_selectors('Block0') == [1]
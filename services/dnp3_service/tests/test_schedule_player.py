@@ -0,0 +1,95 @@
+import numpy
+import pytest
+
+from dnp3.points import DNP3Exception, PointDefinitions
+from dnp3.schedule_player import INTERPOLATION_STEP, Schedule, SchedulePlayer
+
+PLAYER_FILE = """# zipload schedule
+2009-07-21 00:00:00 UTC,1.0
++1m,2.0;
++30s,4.0
+
+2009-07-21 00:02:30 UTC,0.0  # back to absolute time
+"""
+
+
+@pytest.fixture
+def player_file(tmp_path):
+    path = tmp_path / 'load.player'
+    path.write_text(PLAYER_FILE)
+    return str(path)
+
+
+def test_from_player_file(player_file):
+    schedule = Schedule.from_player_file(player_file)
+    assert schedule.times.tolist() == [0.0, 60.0, 90.0, 150.0]
+    assert schedule.values.tolist() == [1.0, 2.0, 4.0, 0.0]
+    # The last value is held for the median step before the schedule repeats.
+    assert schedule.period == 150.0 + 60.0
+
+
+def test_invalid_player_file_line(tmp_path):
+    path = tmp_path / 'bad.player'
+    path.write_text('2009-07-21 00:00:00 UTC,1.0\n+1w,2.0\n')
+    with pytest.raises(DNP3Exception) as excinfo:
+        Schedule.from_player_file(str(path))
+    assert 'bad.player:2' in str(excinfo.value)
+
+
+def test_empty_player_file(tmp_path):
+    path = tmp_path / 'empty.player'
+    path.write_text('# nothing\n')
+    with pytest.raises(DNP3Exception):
+        Schedule.from_player_file(str(path))
+
+
+def test_linear_interpolation(player_file):
+    schedule = Schedule.from_player_file(player_file)
+    assert schedule.values_at(numpy.array([0.0, 30.0, 75.0, 120.0])).tolist() == [1.0, 1.5, 3.0, 2.0]
+
+
+def test_step_interpolation(player_file):
+    schedule = Schedule.from_player_file(player_file, INTERPOLATION_STEP)
+    assert schedule.values_at(numpy.array([0.0, 59.0, 60.0, 89.0, 200.0])).tolist() == [1.0, 1.0, 2.0, 2.0, 0.0]
+
+
+def test_looping(player_file):
+    schedule = Schedule.from_player_file(player_file)
+    assert schedule.values_at(210.0 + 30.0) == 1.5
+    # Without looping the last value is held.
+    assert schedule.values_at(1000.0, loop=False) == 0.0
+
+
+class RecordingOutstation(object):
+    """Record the updates applied, in place of a DNP3Outstation."""
+
+    def __init__(self):
+        self.updates = []
+
+    def apply_updates(self, updates):
+        self.updates.append(sorted((type(value).__name__, index, value.value) for value, index in updates))
+        return len(updates)
+
+
+def test_player_applies_changed_significant_values(player_file):
+    point_defs = PointDefinitions()
+    point_defs.load_points([
+        {'name': 'Load', 'group': 30, 'variation': 1, 'index': 0, 'schedule': player_file,
+         'scaling_multiplier': 1000, 'deadband': 600},
+        {'name': 'Load2', 'group': 30, 'variation': 1, 'index': 1, 'schedule': player_file},
+        {'name': 'On', 'group': 1, 'variation': 2, 'index': 0, 'schedule': player_file}
+    ])
+    outstation = RecordingOutstation()
+    player = SchedulePlayer(outstation, point_defs)
+    assert len(player) == 3
+
+    assert player.tick(0.0) == 3
+    assert outstation.updates[-1] == [('Analog', 0, 1000.0), ('Analog', 1, 1.0), ('Binary', 0, True)]
+    # Nothing changed.
+    assert player.tick(0.0) == 0
+    # Load moved 500, inside its deadband. The binary value is still on.
+    assert player.tick(30.0) == 1
+    assert outstation.updates[-1] == [('Analog', 1, 1.5)]
+    assert player.tick(150.0) == 3
+    assert outstation.updates[-1] == [('Analog', 0, 0.0), ('Analog', 1, 0.0), ('Binary', 0, False)]
+    assert player.playback_stats()['updates'] == 7
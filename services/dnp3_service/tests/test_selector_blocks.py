@@ -0,0 +1,120 @@
+import pytest
+
+from pydnp3 import opendnp3
+from dnp3.command_worker import CommandWorker
+from dnp3.points import PointDefinitions, POINT_TYPE_ANALOG_OUTPUT
+from dnp3.selector_blocks import SelectorBlockStore
+from start_service import Processor
+
+from point_maps import BLOCK_SIZE, selector_block_points
+
+AO = POINT_TYPE_ANALOG_OUTPUT
+
+
+def _point_definitions(block_count=2):
+    point_defs = PointDefinitions()
+    point_defs.load_points(selector_block_points(block_count * (BLOCK_SIZE + 1)))
+    return point_defs
+
+
+def _current(store, block_name):
+    return dict(store.blocks[block_name].values)
+
+
+def test_block_for_index():
+    store = SelectorBlockStore(_point_definitions())
+    assert store.block_for_index(AO, 5).point_def.name == 'Block0'
+    assert store.block_for_index(AO, BLOCK_SIZE + 50).point_def.name == 'Block1'
+    # A block's own point holds its edit selector, it isn't one of the block's points.
+    assert store.block_for_index(AO, BLOCK_SIZE) is None
+    assert store.block_for_index(AO, 2 * BLOCK_SIZE + 1) is None
+    assert not store.set_point_value(AO, 2 * BLOCK_SIZE + 1, 'value')
+
+
+def test_saved_version_does_not_change_with_later_writes():
+    store = SelectorBlockStore(_point_definitions())
+    store.set_point_value(AO, 1, 'first')
+    store.save('Block0', 1)
+    store.set_point_value(AO, 1, 'second')
+    store.set_point_value(AO, 2, 'added')
+    assert _current(store, 'Block0') == {1: 'second', 2: 'added'}
+
+    store.activate('Block0', 1)
+    assert _current(store, 'Block0') == {1: 'first'}
+    assert store.get_point_value(AO, 1) == 'first'
+
+
+def test_activating_an_unsaved_edit_selector_clears_the_block():
+    store = SelectorBlockStore(_point_definitions())
+    store.set_point_value(AO, 1, 'value')
+    store.activate('Block0', 7)
+    assert _current(store, 'Block0') == {}
+    # Other blocks are unaffected.
+    store.set_point_value(AO, BLOCK_SIZE + 1, 'other')
+    store.activate('Block0', 8)
+    assert store.get_point_value(AO, BLOCK_SIZE + 1) == 'other'
+
+
+def test_least_recently_used_edit_selectors_are_evicted():
+    store = SelectorBlockStore(_point_definitions(), max_saved=2)
+    for edit_selector in (1, 2, 3):
+        store.set_point_value(AO, 1, edit_selector)
+        store.save('Block0', edit_selector)
+    assert store.saved_edit_selectors('Block0') == [2, 3]
+    store.activate('Block0', 2)
+    store.save('Block0', 4)
+    assert store.saved_edit_selectors('Block0') == [2, 4]
+
+
+def test_snapshot_is_not_changed_by_later_writes():
+    store = SelectorBlockStore(_point_definitions())
+    store.set_point_value(AO, 1, 'before')
+    store.save('Block0', 1)
+    snapshot = dict((name, (saved, current)) for name, saved, current in store.snapshot())
+    store.set_point_value(AO, 1, 'after')
+    saved, current = snapshot['Block0']
+    assert current == {1: 'before'}
+    assert saved == [(1, {1: 'before'})]
+
+
+def test_reload_keeps_blocks_whose_range_did_not_change():
+    store = SelectorBlockStore(_point_definitions())
+    store.set_point_value(AO, 1, 'kept')
+    store.set_point_value(AO, BLOCK_SIZE + 1, 'reset')
+    points = selector_block_points(2 * (BLOCK_SIZE + 1))
+    block1 = [point for point in points if point['name'] == 'Block1'][0]
+    block1['selector_block_end'] -= 10
+    reloaded = PointDefinitions()
+    reloaded.load_points(points)
+    store.reload(reloaded)
+    assert store.get_point_value(AO, 1) == 'kept'
+    assert store.get_point_value(AO, BLOCK_SIZE + 1) is None
+
+
+@pytest.fixture
+def processor():
+    processor = Processor(_point_definitions(), CommandWorker())
+    processor.command_worker.start()
+    yield processor
+    processor.command_worker.stop()
+
+
+def _operate(processor, command, index):
+    status = processor.process_point_value('Operate', command, index, opendnp3.OperateType.DirectOperate)
+    assert status == opendnp3.CommandStatus.SUCCESS
+
+
+def test_processor_saves_and_activates_a_block(processor):
+    save_index = processor.point_definitions.point_named('Block0.Save').index
+    _operate(processor, opendnp3.AnalogOutputInt32(1), 0)
+    _operate(processor, opendnp3.AnalogOutputInt32(11), 1)
+    _operate(processor, opendnp3.ControlRelayOutputBlock(opendnp3.ControlCode.LATCH_ON), save_index)
+    _operate(processor, opendnp3.AnalogOutputInt32(2), 0)
+    _operate(processor, opendnp3.AnalogOutputInt32(22), 1)
+    _operate(processor, opendnp3.ControlRelayOutputBlock(opendnp3.ControlCode.LATCH_ON), save_index)
+    processor.command_worker.wait_until_idle()
+    assert processor.selector_blocks.saved_edit_selectors('Block0') == [1, 2]
+
+    _operate(processor, opendnp3.AnalogOutputInt32(1), 0)
+    processor.command_worker.wait_until_idle()
+    assert processor.get_current_point_value(AO, 1).value == 11
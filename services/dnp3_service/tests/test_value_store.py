@@ -0,0 +1,126 @@
+import pytest
+
+from pydnp3 import opendnp3
+from dnp3.command_worker import CommandWorker
+from dnp3.points import PointDefinitions, POINT_TYPE_ANALOG_OUTPUT, POINT_TYPE_BINARY_OUTPUT
+from dnp3.value_store import CurrentValueStore
+from start_service import Processor
+
+from point_maps import plain_points
+
+
+@pytest.fixture
+def point_definitions():
+    point_defs = PointDefinitions()
+    point_defs.load_points(plain_points(40))
+    return point_defs
+
+
+@pytest.fixture
+def store_path(tmp_path):
+    return str(tmp_path / 'values.dat')
+
+
+def _point_value(point_definitions, index, value):
+    return point_definitions.point_value_for_command('Operate', opendnp3.AnalogOutputInt32(value), index,
+                                                     opendnp3.OperateType.DirectOperate)
+
+
+def _write(path, changes, **kwargs):
+    """Load a store, append changes to it as one batch and stop it. Return the store."""
+    store = CurrentValueStore(path, write_interval=60, **kwargs)
+    store.load()
+    store.start()
+    for record, args in changes:
+        getattr(store, record)(*args)
+    store.stop()
+    return store
+
+
+def test_missing_file_loads_nothing(store_path):
+    assert CurrentValueStore(store_path).load() == []
+
+
+def test_records_are_replayed_in_order(point_definitions, store_path):
+    _write(store_path, [('record_value', (_point_value(point_definitions, 1, 10),)),
+                        ('record_activate', ('Block0', 3)),
+                        ('record_discard', (POINT_TYPE_ANALOG_OUTPUT, 2))])
+    _write(store_path, [('record_value', (_point_value(point_definitions, 1, 11),))])
+    assert CurrentValueStore(store_path).load() == [('value', POINT_TYPE_ANALOG_OUTPUT, 1, 10),
+                                                    ('activate', 'Block0', 3),
+                                                    ('discard', POINT_TYPE_ANALOG_OUTPUT, 2),
+                                                    ('value', POINT_TYPE_ANALOG_OUTPUT, 1, 11)]
+
+
+def test_truncated_batch_is_dropped_and_overwritten(point_definitions, store_path):
+    _write(store_path, [('record_value', (_point_value(point_definitions, 1, 10),))])
+    _write(store_path, [('record_value', (_point_value(point_definitions, 2, 20),))])
+    with open(store_path, 'rb') as store_file:
+        data = store_file.read()
+    with open(store_path, 'wb') as store_file:
+        store_file.write(data[:-3])
+
+    assert CurrentValueStore(store_path).load() == [('value', POINT_TYPE_ANALOG_OUTPUT, 1, 10)]
+    # Appending starts after the last complete batch, so the new records are readable.
+    _write(store_path, [('record_value', (_point_value(point_definitions, 3, 30),))])
+    assert CurrentValueStore(store_path).load() == [('value', POINT_TYPE_ANALOG_OUTPUT, 1, 10),
+                                                    ('value', POINT_TYPE_ANALOG_OUTPUT, 3, 30)]
+
+
+def test_file_of_another_version_is_ignored(store_path):
+    with open(store_path, 'wb') as store_file:
+        store_file.write(b'DNP3VAL0 not a store')
+    store = CurrentValueStore(store_path)
+    assert store.load() == []
+    store.start()
+    store.stop()
+    assert store.load() == []
+
+
+def test_compaction_replaces_the_file_with_a_snapshot(point_definitions, store_path):
+    values = [_point_value(point_definitions, 1, value) for value in range(5)]
+    saved = {2: _point_value(point_definitions, 2, 22)}
+    store = CurrentValueStore(store_path, compact_after=5, write_interval=60)
+    store.load()
+    store.start()
+    for point_value in values:
+        store.record_value(point_value)
+    assert store.needs_compaction
+    store.compact([values[-1]], [('Block0', [(7, saved)], {})])
+    assert not store.needs_compaction
+    store.record_discard(POINT_TYPE_BINARY_OUTPUT, 4)
+    store.stop()
+
+    assert store.compactions == 1
+    assert CurrentValueStore(store_path).load() == [('save', 'Block0', 7, ((POINT_TYPE_ANALOG_OUTPUT, 2, 22),)),
+                                                    ('block', 'Block0', ()),
+                                                    ('value', POINT_TYPE_ANALOG_OUTPUT, 1, 4),
+                                                    ('discard', POINT_TYPE_BINARY_OUTPUT, 4)]
+
+
+def test_full_queue_drops_changes_and_asks_for_compaction(point_definitions, store_path):
+    store = CurrentValueStore(store_path, max_queue_size=2)
+    for value in range(3):
+        store.record_value(_point_value(point_definitions, 1, value))
+    assert store.dropped_count == 1
+    assert store.needs_compaction
+
+
+def test_processor_warm_start_restores_values(point_definitions, store_path):
+    processor = Processor(point_definitions, CommandWorker(), CurrentValueStore(store_path, write_interval=60))
+    processor.warm_start()
+    processor.command_worker.start()
+    for index, value in ((1, 10), (2, 20), (1, 11)):
+        processor.process_point_value('Operate', opendnp3.AnalogOutputInt32(value), index,
+                                      opendnp3.OperateType.DirectOperate)
+    processor.process_point_value('Operate', opendnp3.ControlRelayOutputBlock(opendnp3.ControlCode.LATCH_ON), 3,
+                                  opendnp3.OperateType.DirectOperate)
+    processor.command_worker.stop()
+    processor.value_store.stop()
+
+    restarted = Processor(point_definitions, CommandWorker(), CurrentValueStore(store_path))
+    restarted.warm_start()
+    restarted.value_store.stop()
+    assert restarted.get_current_point_value(POINT_TYPE_ANALOG_OUTPUT, 1).value == 11
+    assert restarted.get_current_point_value(POINT_TYPE_ANALOG_OUTPUT, 2).value == 20
+    assert restarted.get_current_point_value(POINT_TYPE_BINARY_OUTPUT, 3).unwrapped_value() is True
@@ -47,6 +47,7 @@ Created on Jan 6, 2017
 import argparse
 import cmath
 from datetime import datetime
+import hashlib
 import json
 import math
 import os
@@ -54,9 +55,17 @@ try:
     from Queue import Queue
 except:
     from queue import Queue
+import stat
 import sys
+import tempfile
+import threading
 import time
 
+try:
+    xrange
+except NameError:
+    xrange = range
+
 import stomp
 import yaml
 
@@ -69,16 +78,30 @@ except:
         sys.stdout.write("Running tests.\n")
         fncs = {}
 
+try:
+    from object_map import CompactObjectMap, write_compact_object_map, EQUIPMENT_TYPES, UNKNOWN_TYPE
+except ImportError:
+    from service.object_map import CompactObjectMap, write_compact_object_map, EQUIPMENT_TYPES, UNKNOWN_TYPE
+
+try:
+    from measurement_ring import MeasurementRingWriter
+except ImportError:
+    MeasurementRingWriter = None
+
 debugFile = open("/tmp/fncs_bridge_log.txt", "w")
 input_from_goss_topic = '/topic/goss.gridappsd.fncs.input' #this should match GridAppsDConstants.topic_FNCS_input
 output_to_simulation_manager = 'goss.gridappsd.fncs.output'
 output_to_goss_topic = '/topic/goss.gridappsd.simulation.output.' #this should match GridAppsDConstants.topic_FNCS_output
 simulation_input_topic = '/topic/goss.gridappsd.simulation.input.'
+#per-user, so that no other user can place a compiled map where a bridge loads it
+model_map_cache_dir = os.environ.get("GRIDAPPSD_MODEL_MAP_CACHE",
+                                     os.path.join(tempfile.gettempdir(), "gridappsd_model_map_cache-{}".format(os.getuid())))
+compiled_object_maps = {} #compiled measurement maps already loaded by this process, keyed by cache file
+measurement_ring_dir = os.environ.get("GRIDAPPSD_MEASUREMENT_RING_DIR") #unset disables the shared-memory measurement ring
 
 goss_connection= None
 is_initialized = False
 simulation_id = None
-stop_simulation = False
 
 difference_attribute_map = {
     "RegulatingControl.mode" : {
@@ -163,16 +186,78 @@ class GOSSListener(object):
 
     def __init__(self, sim_length):
         self.goss_to_fncs_message_queue = Queue()
-        self.start_simulation = False
-        self.stop_simulation = False
+        # Start, stop and GOSS input arrival notify this condition so that the
+        # simulation loop wakes immediately instead of polling.
+        self._state_changed = threading.Condition()
+        self._start_simulation = False
+        self._stop_simulation = False
         self.simulation_finished = True
         self.simulation_length = sim_length
 
+    @property
+    def start_simulation(self):
+        return self._start_simulation
+
+    @start_simulation.setter
+    def start_simulation(self, value):
+        with self._state_changed:
+            self._start_simulation = value
+            self._state_changed.notify_all()
+
+    @property
+    def stop_simulation(self):
+        return self._stop_simulation
+
+    @stop_simulation.setter
+    def stop_simulation(self, value):
+        with self._state_changed:
+            self._stop_simulation = value
+            self._state_changed.notify_all()
+
+    def put_goss_message(self, goss_message):
+        """Queue a GOSS message for the FNCS bus and wake the simulation loop."""
+        with self._state_changed:
+            self.goss_to_fncs_message_queue.put(goss_message)
+            self._state_changed.notify_all()
+
+    def wait_for_start(self):
+        """Block until the simulation is started or stopped.
+
+        Function returns:
+            True if the simulation was started, False if it was stopped first.
+        """
+        with self._state_changed:
+            while not self._start_simulation and not self._stop_simulation:
+                self._state_changed.wait()
+            return not self._stop_simulation
+
+    def wait_for_goss_message(self, deadline):
+        """Block until a GOSS message is queued, the simulation is stopped or the deadline passes.
+
+        Function arguments:
+            deadline -- Type: float. Description: The time.time() value to wait until.
+        Function returns:
+            True if a GOSS message is waiting to be forwarded, False otherwise.
+        """
+        with self._state_changed:
+            while self.goss_to_fncs_message_queue.empty() and not self._stop_simulation:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                self._state_changed.wait(remaining)
+            return not self._stop_simulation and not self.goss_to_fncs_message_queue.empty()
+
+    def _forward_goss_messages(self):
+        """Publish every queued GOSS message to the FNCS bus."""
+        while not self.goss_to_fncs_message_queue.empty():
+            _publish_to_fncs_bus(simulation_id, self.goss_to_fncs_message_queue.get())
+
     def run_simulation(self,run_realtime):
         try:
             message = {}
             current_time = 0;
             message['command'] = 'nextTimeStep'
+            measurement_ring = _open_measurement_ring()
             for current_time in xrange(self.simulation_length):
                 if self.stop_simulation == True:
                     if fncs.is_initialized():
@@ -182,27 +267,38 @@ class GOSSListener(object):
                 message['output'] = _get_fncs_bus_messages(simulation_id)
                 response_msg = json.dumps(message['output'])
                 if message['output']!={}:
+                    if measurement_ring is not None:
+                        measurement_ring.write(message['output']['message']['timestamp'],
+                                               message['output']['message']['measurements'])
                     goss_connection.send(output_to_goss_topic + "{}".format(simulation_id) , response_msg)
                 #forward messages from GOSS to FNCS
-                while not self.goss_to_fncs_message_queue.empty():
-                    _publish_to_fncs_bus(simulation_id, self.goss_to_fncs_message_queue.get())
+                self._forward_goss_messages()
                 _done_with_time_step(current_time) #current_time is incrementing integer 0 ,1, 2.... representing seconds
                 message_str = 'done with timestep '+str(current_time)
                 _send_simulation_status('RUNNING', message_str, 'DEBUG')
                 message_str = 'incrementing to '+str(current_time + 1)
                 _send_simulation_status('RUNNING', message_str, 'DEBUG')
                 if run_realtime == True:
-                    time.sleep(1)
+                    #wait out the rest of the second, forwarding GOSS input as it arrives and waking on stop
+                    deadline = time.time() + 1
+                    while self.wait_for_goss_message(deadline):
+                        self._forward_goss_messages()
+            #a stopped simulation has already been reported as CLOSED
+            reached_end = not self.stop_simulation
             self.stop_simulation = True
-            message['command'] = 'simulationFinished'
-            del message['output']
-            goss_connection.send(output_to_simulation_manager, json.dumps(message))
+            if measurement_ring is not None:
+                measurement_ring.close()
+            if reached_end:
+                _send_simulation_status('COMPLETE', 'Simulation finished', 'INFO')
         except Exception as e:
             message_str = 'Error in run simulation '+str(e)
             _send_simulation_status('ERROR', message_str, 'ERROR')
             self.stop_simulation = True
             if fncs.is_initialized():
                 fncs.die()
+        finally:
+            #the simulation manager waits for this however the simulation ended
+            _send_simulation_finished()
 
 
     def on_message(self, headers, msg):
@@ -215,6 +311,9 @@ class GOSSListener(object):
             else:
                 _send_simulation_status('STARTED', message_str, 'DEBUG')
             json_msg = yaml.safe_load(str(msg))
+            if not _is_for_this_simulation(json_msg):
+                # Control commands on the shared input topic are tagged with the simulation they are meant for.
+                return
             print("\n{}\n".format(json_msg['command']))
             if json_msg['command'] == 'isInitialized':
                 message_str = 'isInitialized check: '+str(is_initialized)
@@ -223,13 +322,14 @@ class GOSSListener(object):
                 else:
                     _send_simulation_status('STARTED', message_str, 'DEBUG')
                 message['command'] = 'isInitialized'
+                message['simulation_id'] = simulation_id
                 message['response'] = str(is_initialized)
                 t_now = datetime.utcnow()
                 message['timestamp'] = int(time.mktime(t_now.timetuple()))
                 goss_connection.send(output_to_simulation_manager , json.dumps(message))
             elif json_msg['command'] == 'update':
                 message['command'] = 'update'
-                self.goss_to_fncs_message_queue.put(json.dumps(json_msg['input']))
+                self.put_goss_message(json.dumps(json_msg['input']))
                 #_publish_to_fncs_bus(simulation_id, json.dumps(json_msg['input'])) #does not return
             elif json_msg['command'] == 'StartSimulation':
                 if self.start_simulation == False:
@@ -279,6 +379,20 @@ class GOSSListener(object):
             fncs.die()
 
 
+def _is_for_this_simulation(json_msg):
+    """Return True if a control message on the shared input topic is meant for this bridge.
+
+    Function arguments:
+        json_msg -- Type: dict. Description: The parsed control message.
+            Messages without a simulation_id are accepted for compatibility
+            with platforms that only run one simulation at a time.
+    Function returns:
+        Boolean.
+    """
+    target_id = json_msg.get('simulation_id', None)
+    return target_id is None or str(target_id) == str(simulation_id)
+
+
 def _register_with_fncs_broker(broker_location='tcp://localhost:5570'):
     """Register with the fncs_broker and return.
 
@@ -473,12 +587,12 @@ def _publish_to_fncs_bus(simulation_id, goss_message):
         goss_message_converted = json.dumps(fncs_input_message)
         _send_simulation_status("RUNNING", "Sending the following message to the simulator. {}".format(goss_message_converted),"INFO")
         if fncs.is_initialized():
-		fncs.publish_anon(fncs_input_topic, goss_message_converted)
+                fncs.publish_anon(fncs_input_topic, goss_message_converted)
     except ValueError as ve:
         raise ValueError(ve)
     except Exception as ex:
-	_send_simulation_status("ERROR","An error occured while trying to translate the update message received","ERROR")
-	#raise RuntimeError("An error occurred while trying to translate the update message recieved.\n{}: {}".format(type(ex).__name__, ex.message))
+        _send_simulation_status("ERROR","An error occured while trying to translate the update message received","ERROR")
+        #raise RuntimeError("An error occurred while trying to translate the update message recieved.\n{}: {}".format(type(ex).__name__, ex.message))
 
 
 
@@ -526,7 +640,7 @@ def _get_fncs_bus_messages(simulation_id):
                 simulation_time = int(sim_dict.get("globals",{"clock" : "0"}).get("clock", "0"))
                 if simulation_time != 0:
                     cim_measurements_dict["message"]["timestamp"] = simulation_time
-                for x in object_property_to_measurement_id.keys():
+                for x in object_property_to_measurement_id:
                     gld_properties_dict = sim_dict.get(x,None)
                     if gld_properties_dict == None:
                         err_msg = "All measurements for object {} are missing from the simulator output.".format(x)
@@ -545,7 +659,12 @@ def _get_fncs_bus_messages(simulation_id):
                             raise RuntimeError("{} measurement for object {} is missing from the simulator output.".format(property_name, x))
                         else:
                             val_str = str(prop_val_str).split(" ")[0]
-                            conducting_equipment_type = str(conducting_equipment_type_str).split("_")[0]
+                            #compiled maps carry the equipment type as a code, dict maps only in the name
+                            equipment_code = y.get("equipment_code", UNKNOWN_TYPE)
+                            if equipment_code != UNKNOWN_TYPE:
+                                conducting_equipment_type = EQUIPMENT_TYPES[equipment_code]
+                            else:
+                                conducting_equipment_type = str(conducting_equipment_type_str).split("_")[0]
                             if conducting_equipment_type == "LinearShuntCompensator":
                                 if property_name in ["shunt_"+phases,"voltage_"+phases]:
                                     val = complex(val_str)
@@ -603,6 +722,34 @@ def _get_fncs_bus_messages(simulation_id):
         return {}
 
 
+def _open_measurement_ring():
+    """Create the shared-memory measurement ring for this simulation.
+
+    The ring is only created when GRIDAPPSD_MEASUREMENT_RING_DIR is set. It has
+    one column per measurement in the measurement map and is written to
+    <GRIDAPPSD_MEASUREMENT_RING_DIR>/<simulation_id>.ring. Use a tmpfs such as
+    /dev/shm so that the ring never touches the disk.
+
+    Function returns:
+        A MeasurementRingWriter, or None if the ring is disabled or could not
+        be created.
+    """
+    if not measurement_ring_dir or object_property_to_measurement_id is None:
+        return None
+    if MeasurementRingWriter is None:
+        _send_simulation_status('STARTED', "numpy is unavailable, the measurement ring is disabled.", 'WARN')
+        return None
+    try:
+        mrids = sorted(y["measurement_mrid"] for x in object_property_to_measurement_id.values() for y in x)
+        ring_file = os.path.join(measurement_ring_dir, "{}.ring".format(simulation_id))
+        measurement_ring = MeasurementRingWriter(ring_file, mrids)
+        _send_simulation_status('STARTED', "Writing measurements to the measurement ring {}".format(ring_file), 'INFO')
+        return measurement_ring
+    except Exception as e:
+        _send_simulation_status('STARTED', "Could not create the measurement ring: {}".format(e), 'WARN')
+        return None
+
+
 def _done_with_time_step(current_time):
     """tell the fncs_broker to move to the next time step.
 
@@ -638,8 +785,41 @@ def _done_with_time_step(current_time):
         _send_simulation_status('ERROR', message_str, 'ERROR')
 
 
+def _connect_to_goss(username, password, goss_server='localhost', stomp_port='61613'):
+    """Open and return a connection to the GOSS server broker.
+
+    Function arguments:
+        username -- Type: string. Description: User name for GOSS connection.
+        password -- Type: string. Description: Password for GOSS connection.
+        goss_server -- Type: string. Description: The ip location
+        for the GOSS server. It must not be an empty string.
+            Default: 'localhost'.
+        stomp_port -- Type: string. Description: The port for Stomp
+        protocol for the GOSS server. It must not be an empty string.
+            Default: '61613'.
+    Function returns:
+        A connected stomp.Connection12.
+    Function exceptions:
+        ValueError()
+    """
+    if (goss_server == None or goss_server == ''
+            or type(goss_server) != str):
+        raise ValueError(
+            'goss_server must be a nonempty string.\n'
+            + 'goss_server = {0}'.format(goss_server))
+    if (stomp_port == None or stomp_port == ''
+            or type(stomp_port) != str):
+        raise ValueError(
+            'stomp_port must be a nonempty string.\n'
+            + 'stomp_port = {0}'.format(stomp_port))
+    connection = stomp.Connection12([(goss_server, stomp_port)])
+    connection.start()
+    connection.connect(username,password, wait=True)
+    return connection
+
+
 def _register_with_goss(sim_id,username,password,goss_server='localhost',
-                      stomp_port='61613', sim_duration=86400):
+                      stomp_port='61613', sim_duration=86400, connection=None):
     """Register with the GOSS server broker and return.
 
     Function arguments:
@@ -653,6 +833,9 @@ def _register_with_goss(sim_id,username,password,goss_server='localhost',
             Default: '61613'.
         username -- Type: string. Description: User name for GOSS connection.
         password -- Type: string. Description: Password for GOSS connection.
+        connection -- Type: stomp.Connection12. Description: An already
+            connected GOSS connection to reuse, e.g. from a warm bridge pool
+            worker. Default: None.
 
     Function returns:
         None.
@@ -663,20 +846,10 @@ def _register_with_goss(sim_id,username,password,goss_server='localhost',
     global goss_connection
     global goss_listener_instance
     simulation_id = sim_id
-    if (goss_server == None or goss_server == ''
-            or type(goss_server) != str):
-        raise ValueError(
-            'goss_server must be a nonempty string.\n'
-            + 'goss_server = {0}'.format(goss_server))
-    if (stomp_port == None or stomp_port == ''
-            or type(stomp_port) != str):
-        raise ValueError(
-            'stomp_port must be a nonempty string.\n'
-            + 'stomp_port = {0}'.format(stomp_port))
     goss_listener_instance = GOSSListener(sim_duration)
-    goss_connection = stomp.Connection12([(goss_server, stomp_port)])
-    goss_connection.start()
-    goss_connection.connect(username,password, wait=True)
+    if connection is None:
+        connection = _connect_to_goss(username, password, goss_server, stomp_port)
+    goss_connection = connection
     goss_connection.set_listener('GOSSListener', goss_listener_instance)
     goss_connection.subscribe(input_from_goss_topic,1)
     goss_connection.subscribe(simulation_input_topic + "{}".format(simulation_id),2)
@@ -685,6 +858,27 @@ def _register_with_goss(sim_id,username,password,goss_server='localhost',
     _send_simulation_status('STARTED', message_str, 'INFO')
 
 
+def _send_simulation_finished():
+    """tell the simulation manager that the bridge is done with the simulation
+
+    The simulation manager waits for this message after starting the
+    simulation, so it is sent whether the simulation reached the end of its
+    duration, was stopped or failed. A lost GOSS connection is only logged.
+
+    Function returns:
+        None.
+    """
+    message = {
+        'command' : 'simulationFinished',
+        'simulation_id' : simulation_id
+    }
+    try:
+        goss_connection.send(output_to_simulation_manager, json.dumps(message))
+    except Exception as e:
+        debugFile.write("could not send simulationFinished: {}\n".format(e))
+        debugFile.flush()
+
+
 def _send_simulation_status(status, message, log_level):
     """send a status message to the GridAPPS-D log manager
 
@@ -751,6 +945,10 @@ def _create_cim_object_map(map_file=None):
         object_mrid_to_name = None
     else:
         try:
+            cached_maps = _load_cached_object_map(map_file)
+            if cached_maps is not None:
+                object_property_to_measurement_id, object_mrid_to_name = cached_maps
+                return
             with open(map_file, "r") as file_input_stream:
                 file_dict = json_load_byteified(file_input_stream)
             feeders = file_dict.get("feeders",[])
@@ -916,12 +1114,99 @@ def _create_cim_object_map(map_file=None):
                         "total_phases" : y.get("phases"),
                         "type" : "switch"
                     }
+            _store_cached_object_map(map_file, object_property_to_measurement_id, object_mrid_to_name)
+            #switch to the compact maps so that the dicts built above can be freed
+            cached_maps = _load_cached_object_map(map_file)
+            if cached_maps is not None:
+                object_property_to_measurement_id, object_mrid_to_name = cached_maps
 
         except Exception as e:
             _send_simulation_status('STARTED', "The measurement map file, {}, couldn't be translated.\nError:{}".format(map_file, e), 'ERROR')
             pass
 
 
+def _model_map_cache_file(map_file):
+    """Return the cache file path for a measurement map file.
+
+    The path is keyed by the content hash of the map file so that every
+    simulation of an identical model shares one compiled map.
+    """
+    with open(map_file, "rb") as file_input_stream:
+        digest = hashlib.sha1(file_input_stream.read()).hexdigest()
+    return os.path.join(model_map_cache_dir, digest + ".omap")
+
+
+def _is_private_path(path):
+    """Return True if path is owned by this user, is not a symbolic link and only this user can write to it."""
+    try:
+        path_stat = os.lstat(path)
+    except OSError:
+        return False
+    return (not stat.S_ISLNK(path_stat.st_mode) and path_stat.st_uid == os.getuid()
+            and not path_stat.st_mode & (stat.S_IWGRP | stat.S_IWOTH))
+
+
+def _load_cached_object_map(map_file):
+    """Return the cached (object_property_to_measurement_id, object_mrid_to_name) pair, or None."""
+    try:
+        cache_file = _model_map_cache_file(map_file)
+        if cache_file not in compiled_object_maps:
+            if not _is_private_path(model_map_cache_dir) or not _is_private_path(cache_file):
+                return None
+            compiled_object_maps[cache_file] = CompactObjectMap(cache_file)
+        compact_map = compiled_object_maps[cache_file]
+        return compact_map.measurements, compact_map.objects
+    except Exception:
+        return None
+
+
+def _preload_object_map_cache(limit=8):
+    """Load the most recently compiled measurement maps into this process.
+
+    Function arguments:
+        limit -- Type: integer. Description: The maximum number of maps to load.
+    Function returns:
+        The number of maps loaded.
+    """
+    if not _is_private_path(model_map_cache_dir):
+        return 0
+    try:
+        cache_files = [os.path.join(model_map_cache_dir, f) for f in os.listdir(model_map_cache_dir)
+                       if f.endswith(".omap") and _is_private_path(os.path.join(model_map_cache_dir, f))]
+    except OSError:
+        return 0
+    cache_files.sort(key=os.path.getmtime, reverse=True)
+    for cache_file in cache_files[:limit]:
+        try:
+            compiled_object_maps[cache_file] = CompactObjectMap(cache_file)
+        except Exception:
+            pass
+    return len(compiled_object_maps)
+
+
+def _store_cached_object_map(map_file, property_map, mrid_map):
+    """Write the compiled measurement maps to the model map cache.
+
+    The file is written under a temporary name and renamed into place so that
+    concurrently starting bridges never read a partially written map.
+    """
+    try:
+        cache_file = _model_map_cache_file(map_file)
+        try:
+            os.makedirs(model_map_cache_dir, 0o700)
+        except OSError:
+            if not os.path.isdir(model_map_cache_dir):
+                raise
+        if not _is_private_path(model_map_cache_dir):
+            raise OSError("{} is not a directory private to this user".format(model_map_cache_dir))
+        temp_file = "{}.{}.tmp".format(cache_file, os.getpid())
+        write_compact_object_map(temp_file, property_map, mrid_map)
+        os.chmod(temp_file, 0o600)
+        os.rename(temp_file, cache_file)
+    except Exception as e:
+        _send_simulation_status('STARTED', "Could not cache the measurement map {}: {}".format(map_file, e), 'WARN')
+
+
 def json_loads_byteified(json_text):
     return _byteify(
         json.loads(json_text, object_hook=_byteify),
@@ -955,18 +1240,16 @@ def _byteify(data, ignore_dicts = False):
 
 
 def _keep_alive(is_realtime):
-    simulation_ran = False
-    while goss_listener_instance.stop_simulation == False:
-        time.sleep(0.1)
-        if goss_listener_instance.start_simulation == True and simulation_ran == False:
-            goss_listener_instance.run_simulation(is_realtime)
-            simulation_ran = True
+    if goss_listener_instance.wait_for_start():
+        goss_listener_instance.run_simulation(is_realtime)
+    else:
+        _send_simulation_finished()
 
 
-def _main(simulation_id, simulation_broker_location='tcp://localhost:5570', measurement_map_dir='', is_realtime=True, sim_duration=86400):
+def _main(simulation_id, simulation_broker_location='tcp://localhost:5570', measurement_map_dir='', is_realtime=True, sim_duration=86400, connection=None):
 
     measurement_map_file=str(measurement_map_dir)+"model_dict.json"
-    _register_with_goss(simulation_id,'system','manager','127.0.0.1','61613', sim_duration)
+    _register_with_goss(simulation_id,'system','manager','127.0.0.1','61613', sim_duration, connection)
     _register_with_fncs_broker(simulation_broker_location)
     _create_cim_object_map(measurement_map_file)
     _keep_alive(is_realtime)
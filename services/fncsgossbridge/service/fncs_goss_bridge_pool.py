@@ -0,0 +1,335 @@
+
+# Copyright (c) 2017, Battelle Memorial Institute All rights reserved.
+# Battelle Memorial Institute (hereinafter Battelle) hereby grants permission to any person or entity
+# lawfully obtaining a copy of this software and associated documentation files (hereinafter the
+# Software) to redistribute and use the Software in source and binary forms, with or without modification.
+# Such person or entity may use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+# the Software, and may permit others to do so, subject to the following conditions:
+# Redistributions of source code must retain the above copyright notice, this list of conditions and the
+# following disclaimers.
+# Redistributions in binary form must reproduce the above copyright notice, this list of conditions and
+# the following disclaimer in the documentation and/or other materials provided with the distribution.
+# Other than as used herein, neither the name Battelle Memorial Institute or Battelle may be used in any
+# form whatsoever without the express written consent of Battelle.
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL
+# BATTELLE OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY,
+# OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE
+# GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED
+# AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED
+# OF THE POSSIBILITY OF SUCH DAMAGE.
+# General disclaimer for use with OSS licenses
+#
+# This material was prepared as an account of work sponsored by an agency of the United States Government.
+# Neither the United States Government nor the United States Department of Energy, nor Battelle, nor any
+# of their employees, nor any jurisdiction or organization that has cooperated in the development of these
+# materials, makes any warranty, express or implied, or assumes any legal liability or responsibility for
+# the accuracy, completeness, or usefulness or any information, apparatus, product, software, or process
+# disclosed, or represents that its use would not infringe privately owned rights.
+#
+# Reference herein to any specific commercial product, process, or service by trade name, trademark, manufacturer,
+# or otherwise does not necessarily constitute or imply its endorsement, recommendation, or favoring by the United
+# States Government or any agency thereof, or Battelle Memorial Institute. The views and opinions of authors expressed
+# herein do not necessarily state or reflect those of the United States Government or any agency thereof.
+#
+# PACIFIC NORTHWEST NATIONAL LABORATORY operated by BATTELLE for the
+# UNITED STATES DEPARTMENT OF ENERGY under Contract DE-AC05-76RL01830
+#-------------------------------------------------------------------------------
+"""
+Warm pool of fncs_goss_bridge workers.
+
+Starting fncs_goss_bridge.py for every simulation pays for the python
+imports, the STOMP connection and the measurement map before the first time
+step. A pool worker does all of that ahead of time: it imports the bridge,
+connects to GOSS, loads the most recently compiled measurement maps and then
+waits for a simulation assignment on the pool control queue. The queue
+delivers every assignment to exactly one idle worker.
+
+FNCS can only be initialized once per process, so a worker serves a single
+simulation and exits. The pool manager replaces it with a fresh warm worker.
+
+Modes:
+    serve    -- run the pool manager, keeping --size warm workers alive.
+    worker   -- run one warm worker (started by the pool manager).
+    dispatch -- hand a simulation to the pool. Takes the same arguments as
+                fncs_goss_bridge.py and is the execution_path in
+                fncsgossbridge.config. If no worker accepts the assignment
+                in time, it runs the bridge in-process instead.
+
+A worker that accepts an assignment waits for the dispatcher to confirm it
+before it starts the simulation, so an acceptance that arrives after the
+dispatcher has given up and started the bridge itself is refused instead of
+running the simulation twice. While the simulation runs the worker sends a
+heartbeat to the dispatcher. If the heartbeats stop, because the worker died
+or lost its GOSS connection, the dispatcher reports the simulation as ERROR.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+import uuid
+
+import stomp
+
+pool_control_queue = '/queue/goss.gridappsd.fncs.bridge.pool'
+pool_reply_prefix = '/temp-queue/goss.gridappsd.fncs.bridge.pool.'
+
+confirm_timeout = 10.0 #seconds a worker waits for the dispatcher to confirm an assignment it accepted
+heartbeat_interval = 5.0 #seconds between a busy worker's heartbeats
+
+goss_username = 'system'
+goss_password = 'manager'
+goss_server = '127.0.0.1'
+goss_stomp_port = '61613'
+
+
+class PoolControlListener(object):
+    """Receive one simulation assignment from the pool control queue."""
+
+    def __init__(self):
+        self.assignment = None
+        self.headers = None
+        self.assigned = threading.Event()
+
+    def on_message(self, headers, msg):
+        if headers.get('destination') != pool_control_queue or self.assigned.is_set():
+            return
+        self.headers = headers
+        self.assignment = json.loads(msg)
+        self.assigned.set()
+
+    def on_error(self, headers, msg):
+        print('bridge pool control error ', msg)
+
+    def on_disconnected(self):
+        self.assigned.set()
+
+
+class ConfirmListener(object):
+    """Receive the dispatcher's answer to an accepted assignment."""
+
+    def __init__(self, confirm_queue):
+        self.confirm_queue = confirm_queue
+        self.confirmed = False
+        self.answered = threading.Event()
+
+    def on_message(self, headers, msg):
+        if headers.get('destination') != self.confirm_queue:
+            return
+        self.confirmed = json.loads(msg).get('status') == 'confirmed'
+        self.answered.set()
+
+    def on_error(self, headers, msg):
+        print('bridge pool confirm error ', msg)
+
+    def on_disconnected(self):
+        self.answered.set()
+
+
+def _send_heartbeats(connection, reply_to, stopped):
+    """Tell the dispatcher every heartbeat_interval seconds that this worker is alive, until stopped is set."""
+    while not stopped.wait(heartbeat_interval):
+        try:
+            connection.send(reply_to, json.dumps({'status': 'alive', 'pid': os.getpid()}))
+        except Exception as e:
+            # Without a connection the dispatcher stops hearing from this worker and reports the simulation.
+            print('bridge pool heartbeat failed ', e)
+            return
+
+
+def _run_worker(preload_limit):
+    """Warm up, wait for one assignment and run its simulation.
+
+    Function arguments:
+        preload_limit -- Type: integer. Description: The maximum number of
+            compiled measurement maps to load before waiting.
+    Function returns:
+        None.
+    """
+    from fncs_goss_bridge import _connect_to_goss, _main, _preload_object_map_cache, debugFile
+
+    _preload_object_map_cache(preload_limit)
+    connection = _connect_to_goss(goss_username, goss_password, goss_server, goss_stomp_port)
+    control_listener = PoolControlListener()
+    connection.set_listener('PoolControlListener', control_listener)
+    # Take one assignment at a time so that a busy worker never holds assignments other workers could run.
+    connection.subscribe(pool_control_queue, 'pool', ack='client-individual',
+                         headers={'activemq.prefetchSize': '1'})
+    control_listener.assigned.wait()
+    if control_listener.assignment is None:
+        return
+    connection.ack(control_listener.headers['ack'])
+    connection.unsubscribe('pool')
+    connection.remove_listener('PoolControlListener')
+
+    assignment = control_listener.assignment
+    reply_to = control_listener.headers.get('reply-to')
+    if not reply_to:
+        # Without a dispatcher to confirm the assignment it might also be run elsewhere.
+        connection.disconnect()
+        return
+    confirm_queue = pool_reply_prefix + uuid.uuid4().hex
+    confirm_listener = ConfirmListener(confirm_queue)
+    connection.set_listener('ConfirmListener', confirm_listener)
+    connection.subscribe(confirm_queue, 'confirm')
+    connection.send(reply_to, json.dumps({'status': 'accepted', 'pid': os.getpid()}),
+                    headers={'reply-to': confirm_queue})
+    confirm_listener.answered.wait(confirm_timeout)
+    connection.unsubscribe('confirm')
+    connection.remove_listener('ConfirmListener')
+    if not confirm_listener.confirmed:
+        # The dispatcher already started the bridge itself.
+        sys.stdout.write('Simulation {} was not confirmed, leaving it to the dispatcher.\n'.format(
+            assignment['simulation_id']))
+        connection.disconnect()
+        return
+
+    heartbeat_stopped = threading.Event()
+    heartbeat_thread = threading.Thread(target=_send_heartbeats, args=(connection, reply_to, heartbeat_stopped))
+    heartbeat_thread.daemon = True
+    heartbeat_thread.start()
+    sim_request = assignment['simulation_request']
+    try:
+        _main(str(assignment['simulation_id']), str(assignment['broker_location']),
+              assignment['simulation_directory'], sim_request["simulation_config"]["run_realtime"],
+              sim_request["simulation_config"]["duration"], connection)
+    finally:
+        heartbeat_stopped.set()
+        connection.send(reply_to, json.dumps({'status': 'finished', 'pid': os.getpid()}))
+        debugFile.close()
+        connection.disconnect()
+
+
+def _run_pool(size, preload_limit):
+    """Keep size warm workers running, replacing each one that exits."""
+    worker_args = [sys.executable, os.path.abspath(__file__), 'worker', '--preload', str(preload_limit)]
+    workers = set()
+    while True:
+        while len(workers) < size:
+            workers.add(subprocess.Popen(worker_args).pid)
+        # Blocks until a worker exits, so an idle pool uses no CPU.
+        pid, status = os.wait()
+        workers.discard(pid)
+
+
+def _report_worker_lost(simulation_id, connection, message):
+    """Report the simulation as ERROR and finished, as the bridge itself would."""
+    import fncs_goss_bridge
+    if not connection.is_connected():
+        connection = fncs_goss_bridge._connect_to_goss(goss_username, goss_password, goss_server, goss_stomp_port)
+    fncs_goss_bridge.simulation_id = simulation_id
+    fncs_goss_bridge.goss_connection = connection
+    fncs_goss_bridge._send_simulation_status('ERROR', message, 'ERROR')
+    fncs_goss_bridge._send_simulation_finished()
+    fncs_goss_bridge.debugFile.close()
+    connection.disconnect()
+
+
+def _dispatch(simulation_id, broker_location, simulation_directory, simulation_request, accept_timeout,
+              heartbeat_timeout):
+    """Assign a simulation to a warm worker and wait for it to finish.
+
+    The first worker to accept is confirmed. If none accepts within
+    accept_timeout seconds the bridge is run in this process instead, and a
+    later acceptance is refused. If the confirmed worker sends no heartbeat
+    for heartbeat_timeout seconds the simulation is reported as ERROR.
+    """
+    state = {'claimed': False, 'fallen_back': False, 'last_heartbeat': time.time()}
+    state_lock = threading.Lock()
+    events = {'accepted': threading.Event(), 'finished': threading.Event()}
+    reply_queue = pool_reply_prefix + uuid.uuid4().hex
+    connection = stomp.Connection12([(goss_server, goss_stomp_port)])
+
+    class DispatchListener(object):
+        def on_message(self, headers, msg):
+            status = json.loads(msg).get('status')
+            if status == 'accepted':
+                # Claim the simulation for exactly one worker, unless the dispatcher already runs it.
+                with state_lock:
+                    confirmed = not state['claimed'] and not state['fallen_back']
+                    state['claimed'] = state['claimed'] or confirmed
+                    state['last_heartbeat'] = time.time()
+                if headers.get('reply-to'):
+                    connection.send(headers['reply-to'], json.dumps({'status': 'confirmed' if confirmed else 'rejected'}))
+                if confirmed:
+                    events['accepted'].set()
+            elif status == 'alive':
+                state['last_heartbeat'] = time.time()
+            elif status == 'finished':
+                events['finished'].set()
+
+        def on_error(self, headers, msg):
+            print('bridge pool dispatch error ', msg)
+
+        def on_disconnected(self):
+            # Heartbeats can no longer arrive, so the wait below times out and reports the simulation.
+            print('bridge pool dispatcher lost its GOSS connection')
+
+    connection.set_listener('DispatchListener', DispatchListener())
+    connection.start()
+    connection.connect(goss_username, goss_password, wait=True)
+    connection.subscribe(reply_queue, 1)
+    assignment = {
+        'simulation_id': simulation_id,
+        'broker_location': broker_location,
+        'simulation_directory': simulation_directory,
+        'simulation_request': simulation_request
+    }
+    # The assignment expires when the timeout does, the extra second covers a worker's late acceptance reply.
+    connection.send(pool_control_queue, json.dumps(assignment),
+                    headers={'reply-to': reply_queue, 'expires': str(int((time.time() + accept_timeout) * 1000))})
+    events['accepted'].wait(accept_timeout + 1)
+    with state_lock:
+        state['fallen_back'] = not state['claimed']
+    if state['claimed']:
+        while not events['finished'].wait(heartbeat_interval):
+            silence = time.time() - state['last_heartbeat']
+            if silence > heartbeat_timeout:
+                _report_worker_lost(simulation_id, connection,
+                                    'The bridge worker for simulation {} has not been heard from for {:.0f} '
+                                    'seconds'.format(simulation_id, silence))
+                return
+        connection.disconnect()
+        return
+    connection.disconnect()
+    sys.stdout.write('No warm bridge worker accepted simulation {}, starting the bridge directly.\n'.format(simulation_id))
+    from fncs_goss_bridge import _main, debugFile
+    _main(simulation_id, broker_location, simulation_directory,
+          simulation_request["simulation_config"]["run_realtime"], simulation_request["simulation_config"]["duration"])
+    debugFile.close()
+
+
+def _get_opts():
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest="mode")
+    serve_parser = subparsers.add_parser("serve", help="Run the pool manager.")
+    serve_parser.add_argument("--size", type=int, default=2, help="The number of warm workers to keep.")
+    serve_parser.add_argument("--preload", type=int, default=8, help="Compiled measurement maps to preload.")
+    worker_parser = subparsers.add_parser("worker", help="Run one warm worker.")
+    worker_parser.add_argument("--preload", type=int, default=8, help="Compiled measurement maps to preload.")
+    dispatch_parser = subparsers.add_parser("dispatch", help="Hand a simulation to a warm worker.")
+    dispatch_parser.add_argument("simulation_id", help="The simulation id to use for responses on the message bus.")
+    dispatch_parser.add_argument("broker_location", help="The location of the FNCS broker.")
+    dispatch_parser.add_argument("simulation_directory", help="The simulation files directory.")
+    dispatch_parser.add_argument("simulation_request", help="The simulation request.")
+    dispatch_parser.add_argument("--accept_timeout", type=float, default=2.0,
+                                 help="Seconds to wait for a worker before starting the bridge directly.")
+    dispatch_parser.add_argument("--heartbeat_timeout", type=float, default=30.0,
+                                 help="Seconds without a heartbeat before the worker's simulation is reported as ERROR.")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    opts = _get_opts()
+    if opts.mode == "serve":
+        _run_pool(opts.size, opts.preload)
+    elif opts.mode == "worker":
+        _run_worker(opts.preload)
+    else:
+        _dispatch(opts.simulation_id, opts.broker_location, opts.simulation_directory,
+                  json.loads(opts.simulation_request.replace("\'","")), opts.accept_timeout, opts.heartbeat_timeout)
@@ -0,0 +1,236 @@
+
+# Copyright (c) 2017, Battelle Memorial Institute All rights reserved.
+# Battelle Memorial Institute (hereinafter Battelle) hereby grants permission to any person or entity
+# lawfully obtaining a copy of this software and associated documentation files (hereinafter the
+# Software) to redistribute and use the Software in source and binary forms, with or without modification.
+# Such person or entity may use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+# the Software, and may permit others to do so, subject to the following conditions:
+# Redistributions of source code must retain the above copyright notice, this list of conditions and the
+# following disclaimers.
+# Redistributions in binary form must reproduce the above copyright notice, this list of conditions and
+# the following disclaimer in the documentation and/or other materials provided with the distribution.
+# Other than as used herein, neither the name Battelle Memorial Institute or Battelle may be used in any
+# form whatsoever without the express written consent of Battelle.
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL
+# BATTELLE OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY,
+# OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE
+# GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED
+# AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED
+# OF THE POSSIBILITY OF SUCH DAMAGE.
+# General disclaimer for use with OSS licenses
+#
+# This material was prepared as an account of work sponsored by an agency of the United States Government.
+# Neither the United States Government nor the United States Department of Energy, nor Battelle, nor any
+# of their employees, nor any jurisdiction or organization that has cooperated in the development of these
+# materials, makes any warranty, express or implied, or assumes any legal liability or responsibility for
+# the accuracy, completeness, or usefulness or any information, apparatus, product, software, or process
+# disclosed, or represents that its use would not infringe privately owned rights.
+#
+# Reference herein to any specific commercial product, process, or service by trade name, trademark, manufacturer,
+# or otherwise does not necessarily constitute or imply its endorsement, recommendation, or favoring by the United
+# States Government or any agency thereof, or Battelle Memorial Institute. The views and opinions of authors expressed
+# herein do not necessarily state or reflect those of the United States Government or any agency thereof.
+#
+# PACIFIC NORTHWEST NATIONAL LABORATORY operated by BATTELLE for the
+# UNITED STATES DEPARTMENT OF ENERGY under Contract DE-AC05-76RL01830
+#-------------------------------------------------------------------------------
+"""
+Shared-memory ring buffer of converted simulation measurements.
+
+The fncs_goss_bridge can write every converted time step into a memory-mapped
+file so that applications on the same host read measurements without JSON
+parsing or broker hops. Remote consumers keep using the simulation output
+topic, which the bridge still publishes.
+
+File layout (little-endian):
+    header    -- magic, version, column count, slot count, mRID width and the
+                 sequence number of the last completed step.
+    mRID table -- one fixed-width, NUL-padded ascii mRID per column.
+    slots     -- slot_count step records. A record holds its step sequence,
+                 the step timestamp and float64 magnitude, angle and value
+                 columns. Columns a step does not report are NaN.
+
+Step n (counting from 1) is written to slot n % slot_count. The writer clears
+the slot sequence before writing a step and sets it afterwards, so a reader
+can tell whether a slot was overwritten while it was being read.
+"""
+import mmap
+import os
+import struct
+
+import numpy
+
+MAGIC = b'GAPDRING'
+VERSION = 1
+HEADER_FORMAT = '<8sIIIIQ'
+HEADER_SIZE = 64
+SEQUENCE_OFFSET = struct.calcsize('<8sIIII')
+DEFAULT_MRID_WIDTH = 64
+DEFAULT_SLOT_COUNT = 64
+
+
+def _slot_dtype(column_count):
+    return numpy.dtype([('sequence', '<u8'),
+                        ('timestamp', '<i8'),
+                        ('magnitude', '<f8', (column_count,)),
+                        ('angle', '<f8', (column_count,)),
+                        ('value', '<f8', (column_count,))])
+
+
+def _mrid_table_size(column_count, mrid_width):
+    size = column_count * mrid_width
+    return size + (-size % 8)
+
+
+class _MeasurementRing(object):
+    """Memory map and numpy views shared by the writer and the reader."""
+
+    def _map(self, file_object, writable):
+        self._file = file_object
+        access = mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ
+        self._mmap = mmap.mmap(file_object.fileno(), 0, access=access)
+        magic, version, column_count, slot_count, mrid_width, sequence = struct.unpack_from(HEADER_FORMAT, self._mmap, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('{} is not a version {} measurement ring'.format(file_object.name, VERSION))
+        self.column_count = column_count
+        self.slot_count = slot_count
+        mrids = numpy.frombuffer(self._mmap, dtype='S{}'.format(mrid_width), count=column_count, offset=HEADER_SIZE)
+        self.mrids = [m.decode('ascii') for m in mrids]
+        self.columns = dict((mrid, column) for column, mrid in enumerate(self.mrids))
+        self._header_sequence = numpy.frombuffer(self._mmap, dtype='<u8', count=1, offset=SEQUENCE_OFFSET)
+        self._slots = numpy.frombuffer(self._mmap, dtype=_slot_dtype(column_count), count=slot_count,
+                                       offset=HEADER_SIZE + _mrid_table_size(column_count, mrid_width))
+        if not writable:
+            self._slots.flags.writeable = False
+
+    @property
+    def sequence(self):
+        """Return the sequence number of the last completed step, 0 if none was written."""
+        return int(self._header_sequence[0])
+
+    def close(self):
+        self._header_sequence = None
+        self._slots = None
+        try:
+            self._mmap.close()
+        except BufferError:
+            # Step views handed out earlier still use the map, it is unmapped when they are released.
+            pass
+        self._file.close()
+
+
+class MeasurementRingWriter(_MeasurementRing):
+    """Write converted measurement steps into a new ring buffer file."""
+
+    def __init__(self, path, mrids, slot_count=DEFAULT_SLOT_COUNT, mrid_width=DEFAULT_MRID_WIDTH):
+        """Create the ring buffer file.
+
+        Function arguments:
+            path -- Type: string. Description: The file to create. Put it on a
+                tmpfs such as /dev/shm to keep it in memory.
+            mrids -- Type: list. Description: The measurement mRIDs, one per column.
+            slot_count -- Type: integer. Description: The number of steps kept.
+            mrid_width -- Type: integer. Description: Bytes reserved per mRID.
+        """
+        column_count = len(mrids)
+        size = HEADER_SIZE + _mrid_table_size(column_count, mrid_width) + slot_count * _slot_dtype(column_count).itemsize
+        temp_path = '{}.{}.tmp'.format(path, os.getpid())
+        with open(temp_path, 'wb') as ring_file:
+            ring_file.write(struct.pack(HEADER_FORMAT, MAGIC, VERSION, column_count, slot_count, mrid_width, 0))
+            ring_file.seek(HEADER_SIZE)
+            for mrid in mrids:
+                encoded = mrid.encode('ascii')
+                if len(encoded) > mrid_width:
+                    raise ValueError('mRID {} is longer than {} bytes'.format(mrid, mrid_width))
+                ring_file.write(encoded.ljust(mrid_width, b'\0'))
+            ring_file.truncate(size)
+        # Readers only ever see a fully initialized file.
+        os.rename(temp_path, path)
+        self._map(open(path, 'r+b'), True)
+        self._slots['sequence'] = 0
+        self._next_sequence = 1
+
+    def write(self, timestamp, measurements):
+        """Write one converted step into the next slot.
+
+        Function arguments:
+            timestamp -- Type: integer. Description: The simulation timestamp.
+            measurements -- Type: list. Description: Measurement dictionaries as
+                in the simulation output message, keyed by measurement_mrid
+                with magnitude and angle, or value.
+        Function returns:
+            The sequence number of the written step.
+        """
+        sequence = self._next_sequence
+        slot = self._slots[sequence % self.slot_count]
+        slot['sequence'] = 0
+        slot['timestamp'] = timestamp
+        slot['magnitude'].fill(numpy.nan)
+        slot['angle'].fill(numpy.nan)
+        slot['value'].fill(numpy.nan)
+        magnitude, angle, value = slot['magnitude'], slot['angle'], slot['value']
+        columns = self.columns
+        for measurement in measurements:
+            column = columns.get(measurement.get('measurement_mrid'))
+            if column is None:
+                continue
+            if 'value' in measurement:
+                value[column] = measurement['value']
+            else:
+                magnitude[column] = measurement['magnitude']
+                angle[column] = measurement['angle']
+        slot['sequence'] = sequence
+        self._header_sequence[0] = sequence
+        self._next_sequence = sequence + 1
+        return sequence
+
+
+class MeasurementStep(object):
+    """Zero-copy numpy views of one step in the ring buffer."""
+
+    def __init__(self, reader, slot):
+        self._reader = reader
+        self._slot = slot
+        self.sequence = int(slot['sequence'])
+        self.timestamp = int(slot['timestamp'])
+        self.magnitude = slot['magnitude']
+        self.angle = slot['angle']
+        self.value = slot['value']
+
+    def is_valid(self):
+        """Return True if the writer has not reused this step's slot since it was read.
+
+        The views change in place when the slot is reused, so check this after
+        using them (or copy the arrays first).
+        """
+        return int(self._slot['sequence']) == self.sequence
+
+
+class MeasurementRingReader(_MeasurementRing):
+    """Read measurement steps from a ring buffer file written by the bridge."""
+
+    def __init__(self, path):
+        self._map(open(path, 'rb'), False)
+
+    def column(self, mrid):
+        """Return the column of a measurement mRID in the step arrays."""
+        return self.columns[mrid]
+
+    def step(self, sequence):
+        """Return the MeasurementStep for a sequence number, or None if it is no longer in the ring."""
+        if sequence < 1 or sequence > self.sequence:
+            return None
+        step = MeasurementStep(self, self._slots[sequence % self.slot_count])
+        if step.sequence != sequence:
+            return None
+        return step
+
+    def latest(self, count=1):
+        """Return up to count of the most recent steps, oldest first."""
+        last = self.sequence
+        first = max(1, last - min(count, self.slot_count - 1) + 1)
+        steps = [self.step(sequence) for sequence in range(first, last + 1)]
+        return [step for step in steps if step is not None]
@@ -0,0 +1,424 @@
+
+# Copyright (c) 2017, Battelle Memorial Institute All rights reserved.
+# Battelle Memorial Institute (hereinafter Battelle) hereby grants permission to any person or entity
+# lawfully obtaining a copy of this software and associated documentation files (hereinafter the
+# Software) to redistribute and use the Software in source and binary forms, with or without modification.
+# Such person or entity may use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+# the Software, and may permit others to do so, subject to the following conditions:
+# Redistributions of source code must retain the above copyright notice, this list of conditions and the
+# following disclaimers.
+# Redistributions in binary form must reproduce the above copyright notice, this list of conditions and
+# the following disclaimer in the documentation and/or other materials provided with the distribution.
+# Other than as used herein, neither the name Battelle Memorial Institute or Battelle may be used in any
+# form whatsoever without the express written consent of Battelle.
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL
+# BATTELLE OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY,
+# OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE
+# GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED
+# AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED
+# OF THE POSSIBILITY OF SUCH DAMAGE.
+# General disclaimer for use with OSS licenses
+#
+# This material was prepared as an account of work sponsored by an agency of the United States Government.
+# Neither the United States Government nor the United States Department of Energy, nor Battelle, nor any
+# of their employees, nor any jurisdiction or organization that has cooperated in the development of these
+# materials, makes any warranty, express or implied, or assumes any legal liability or responsibility for
+# the accuracy, completeness, or usefulness or any information, apparatus, product, software, or process
+# disclosed, or represents that its use would not infringe privately owned rights.
+#
+# Reference herein to any specific commercial product, process, or service by trade name, trademark, manufacturer,
+# or otherwise does not necessarily constitute or imply its endorsement, recommendation, or favoring by the United
+# States Government or any agency thereof, or Battelle Memorial Institute. The views and opinions of authors expressed
+# herein do not necessarily state or reflect those of the United States Government or any agency thereof.
+#
+# PACIFIC NORTHWEST NATIONAL LABORATORY operated by BATTELLE for the
+# UNITED STATES DEPARTMENT OF ENERGY under Contract DE-AC05-76RL01830
+#-------------------------------------------------------------------------------
+"""
+Compact, read-only form of the bridge's measurement maps.
+
+_create_cim_object_map builds object_property_to_measurement_id, one dict per
+measurement, and object_mrid_to_name, one dict per controllable object. At
+feeder scale most of that memory is dict overhead and repeated copies of the
+same property, phase and equipment strings. This module writes both maps to a
+file in which every distinct string is stored once and every record is a
+fixed-size row of string ids and small integer type codes. Bridge processes
+memory-map the file read-only, so they share its pages through the page cache,
+and see it through dict-like views that return __slots__ records.
+
+File layout (little-endian):
+    header       -- magic, version and the number of strings, objects,
+                    measurements and mRIDs.
+    string table -- one uint32 end offset per string followed by the utf-8
+                    bytes of every distinct string.
+    objects      -- per simulator object: name string, first measurement row
+                    and measurement count.
+    measurements -- per measurement: property, conducting equipment, mRID and
+                    phases strings plus an EQUIPMENT_TYPES code.
+    mRIDs        -- per controllable object mRID: mRID, name, phases and total
+                    phases strings plus an OBJECT_TYPES code. Sorted by mRID.
+
+Usage:
+    python object_map.py --measurements 100000
+prints the memory used by both representations of a synthetic feeder.
+"""
+import argparse
+import mmap
+import os
+import struct
+import sys
+import tempfile
+
+try:
+    intern
+except NameError:
+    from sys import intern
+
+MAGIC = b'GAPDOMAP'
+VERSION = 1
+HEADER = struct.Struct('<8sIIIII')
+STRING_END = struct.Struct('<I')
+OBJECT_ROW = struct.Struct('<III')
+MEASUREMENT_ROW = struct.Struct('<IIIIB3x')
+MRID_ROW = struct.Struct('<IIIIB3x')
+NO_STRING = 0xFFFFFFFF
+UNKNOWN_TYPE = 255
+
+EQUIPMENT_TYPES = ('ACLineSegment', 'EnergyConsumer', 'LinearShuntCompensator', 'LoadBreakSwitch',
+                   'PowerElectronicsConnection', 'PowerTransformer', 'RatioTapChanger')
+OBJECT_TYPES = ('capacitor', 'regulator', 'switch')
+
+if bytes is str:
+    def _decode(data):
+        return data
+else:
+    def _decode(data):
+        return data.decode('utf-8')
+
+
+def _encode(value):
+    if isinstance(value, bytes):
+        return value
+    return value.encode('utf-8')
+
+
+class _Record(object):
+    """Read-only record that also answers the dict lookups of the maps it replaces."""
+    __slots__ = ()
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key)
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+    def as_dict(self):
+        return dict((key, getattr(self, key)) for key in self.__slots__)
+
+
+class MeasurementRecord(_Record):
+    """One measurement of a simulator object."""
+    __slots__ = ('property', 'conducting_equipment_type', 'measurement_mrid', 'phases', 'equipment_code')
+
+    def __init__(self, property_name, conducting_equipment_type, measurement_mrid, phases, equipment_code):
+        self.property = property_name
+        self.conducting_equipment_type = conducting_equipment_type
+        self.measurement_mrid = measurement_mrid
+        self.phases = phases
+        self.equipment_code = equipment_code
+
+
+class ObjectRecord(_Record):
+    """The simulator object behind a controllable object mRID."""
+    __slots__ = ('name', 'phases', 'total_phases', 'type')
+
+    def __init__(self, name, phases, total_phases, object_type):
+        self.name = name
+        self.phases = phases
+        self.total_phases = total_phases
+        self.type = object_type
+
+
+def write_compact_object_map(path, property_map, mrid_map):
+    """Write the measurement maps to a compact object map file.
+
+    Function arguments:
+        path -- Type: string. Description: The file to write.
+        property_map -- Type: dict. Description: object_property_to_measurement_id.
+        mrid_map -- Type: dict. Description: object_mrid_to_name.
+    Function returns:
+        None.
+    """
+    string_ids = {}
+    strings = []
+
+    def string_id(value):
+        if value is None:
+            return NO_STRING
+        encoded = _encode(value)
+        if encoded not in string_ids:
+            string_ids[encoded] = len(strings)
+            strings.append(encoded)
+        return string_ids[encoded]
+
+    object_rows = []
+    measurement_rows = []
+    for object_name, measurements in property_map.items():
+        object_rows.append(OBJECT_ROW.pack(string_id(object_name), len(measurement_rows), len(measurements)))
+        for y in measurements:
+            equipment_type = str(y["conducting_equipment_type"]).split("_")[0]
+            measurement_rows.append(MEASUREMENT_ROW.pack(
+                string_id(y["property"]), string_id(y["conducting_equipment_type"]),
+                string_id(y["measurement_mrid"]), string_id(y["phases"]),
+                EQUIPMENT_TYPES.index(equipment_type) if equipment_type in EQUIPMENT_TYPES else UNKNOWN_TYPE))
+    mrid_rows = []
+    for mrid in sorted(mrid_map.keys(), key=_encode):
+        y = mrid_map[mrid]
+        mrid_rows.append(MRID_ROW.pack(
+            string_id(mrid), string_id(y["name"]), string_id(y["phases"]), string_id(y["total_phases"]),
+            OBJECT_TYPES.index(y["type"]) if y["type"] in OBJECT_TYPES else UNKNOWN_TYPE))
+
+    with open(path, 'wb') as map_file:
+        map_file.write(HEADER.pack(MAGIC, VERSION, len(strings), len(object_rows), len(measurement_rows),
+                                   len(mrid_rows)))
+        end = 0
+        for encoded in strings:
+            end += len(encoded)
+            map_file.write(STRING_END.pack(end))
+        map_file.write(b''.join(strings))
+        map_file.write(b''.join(object_rows))
+        map_file.write(b''.join(measurement_rows))
+        map_file.write(b''.join(mrid_rows))
+
+
+class CompactObjectMap(object):
+    """A compact object map file mapped read-only into this process.
+
+    measurements replaces object_property_to_measurement_id and objects
+    replaces object_mrid_to_name.
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as map_file:
+            self._mmap = mmap.mmap(map_file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, string_count, object_count, measurement_count, mrid_count = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('{} is not a version {} compact object map'.format(path, VERSION))
+        offset = HEADER.size
+        ends = struct.unpack_from('<{}I'.format(string_count), self._mmap, offset)
+        offset += STRING_END.size * string_count
+        start = 0
+        # Every distinct string is decoded and interned once, records only hold references to these.
+        self.strings = []
+        for end in ends:
+            self.strings.append(intern(_decode(self._mmap[offset + start:offset + end])))
+            start = end
+        offset += start
+        self._object_offset = offset
+        self._measurement_offset = self._object_offset + OBJECT_ROW.size * object_count
+        self._mrid_offset = self._measurement_offset + MEASUREMENT_ROW.size * measurement_count
+        self.object_count = object_count
+        self.measurement_count = measurement_count
+        self.mrid_count = mrid_count
+        self.measurements = MeasurementMap(self)
+        self.objects = ObjectMridMap(self)
+
+    def _string(self, string_id):
+        if string_id == NO_STRING:
+            return None
+        return self.strings[string_id]
+
+    def _object_row(self, row):
+        return OBJECT_ROW.unpack_from(self._mmap, self._object_offset + OBJECT_ROW.size * row)
+
+    def _measurement(self, row):
+        property_id, equipment_id, mrid_id, phases_id, equipment_code = MEASUREMENT_ROW.unpack_from(
+            self._mmap, self._measurement_offset + MEASUREMENT_ROW.size * row)
+        strings = self.strings
+        return MeasurementRecord(strings[property_id], strings[equipment_id], strings[mrid_id],
+                                 self._string(phases_id), equipment_code)
+
+    def _mrid_row(self, row):
+        return MRID_ROW.unpack_from(self._mmap, self._mrid_offset + MRID_ROW.size * row)
+
+
+class MeasurementMap(object):
+    """Read-only view of object_property_to_measurement_id backed by a CompactObjectMap.
+
+    The bridge reads every object's measurements on every time step, so each
+    object's records are decoded on its first lookup and the same list is
+    returned from then on. Callers must not modify it.
+    """
+
+    def __init__(self, compact_map):
+        self._map = compact_map
+        self._rows = dict((compact_map.strings[compact_map._object_row(row)[0]], row)
+                          for row in range(compact_map.object_count))
+        self._records = {}
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __contains__(self, object_name):
+        return object_name in self._rows
+
+    def __iter__(self):
+        return iter(self._rows)
+
+    def keys(self):
+        return list(self._rows)
+
+    def __getitem__(self, object_name):
+        records = self._records.get(object_name)
+        if records is None:
+            name_id, first, count = self._map._object_row(self._rows[object_name])
+            records = [self._map._measurement(row) for row in range(first, first + count)]
+            self._records[object_name] = records
+        return records
+
+    def get(self, object_name, default=None):
+        if object_name not in self._rows:
+            return default
+        return self[object_name]
+
+    def values(self):
+        return [self[object_name] for object_name in self._rows]
+
+    def items(self):
+        return [(object_name, self[object_name]) for object_name in self._rows]
+
+
+class ObjectMridMap(object):
+    """Read-only view of object_mrid_to_name backed by a CompactObjectMap."""
+
+    def __init__(self, compact_map):
+        self._map = compact_map
+
+    def __len__(self):
+        return self._map.mrid_count
+
+    def _find(self, mrid):
+        """Return the row of an mRID, or None. The rows are sorted by mRID."""
+        if isinstance(mrid, bytes) and bytes is not str:
+            mrid = _decode(mrid)
+        strings = self._map.strings
+        low, high = 0, self._map.mrid_count
+        while low < high:
+            middle = (low + high) // 2
+            if strings[self._map._mrid_row(middle)[0]] < mrid:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self._map.mrid_count and strings[self._map._mrid_row(low)[0]] == mrid:
+            return low
+        return None
+
+    def __contains__(self, mrid):
+        return self._find(mrid) is not None
+
+    def __getitem__(self, mrid):
+        row = self._find(mrid)
+        if row is None:
+            raise KeyError(mrid)
+        mrid_id, name_id, phases_id, total_phases_id, type_code = self._map._mrid_row(row)
+        return ObjectRecord(self._map._string(name_id), self._map._string(phases_id),
+                            self._map._string(total_phases_id),
+                            OBJECT_TYPES[type_code] if type_code != UNKNOWN_TYPE else None)
+
+    def get(self, mrid, default=None):
+        try:
+            return self[mrid]
+        except KeyError:
+            return default
+
+    def keys(self):
+        return [self._map.strings[self._map._mrid_row(row)[0]] for row in range(self._map.mrid_count)]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+
+def _deep_sizeof(value, seen=None):
+    """Return the bytes used by value and everything it references, counting shared objects once."""
+    if seen is None:
+        seen = set()
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(_deep_sizeof(k, seen) + _deep_sizeof(v, seen) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set)):
+        size += sum(_deep_sizeof(v, seen) for v in value)
+    elif hasattr(value, '__slots__'):
+        size += sum(_deep_sizeof(getattr(value, k), seen) for k in value.__slots__ if hasattr(value, k))
+    elif hasattr(value, '__dict__'):
+        size += _deep_sizeof(value.__dict__, seen)
+    return size
+
+
+def _synthetic_maps(measurement_count):
+    """Return dict maps shaped like the output of _create_cim_object_map for a synthetic feeder."""
+    equipment = ['ACLineSegment', 'EnergyConsumer', 'LinearShuntCompensator', 'PowerTransformer']
+    property_map = {}
+    mrid_map = {}
+    for n in range(measurement_count):
+        object_name = 'line_{}'.format(n // 6)
+        phases = 'ABC'[n % 3]
+        # Built with format so that, as when read from json, equal strings are separate objects.
+        property_map.setdefault(object_name, []).append({
+            "property": "{}_{}".format(['voltage', 'current_in'][n % 2], phases),
+            "conducting_equipment_type": "{}_{}".format(equipment[n % len(equipment)], 'measurement'),
+            "measurement_mrid": "_{:08X}-0000-4000-8000-{:012X}".format(n, n),
+            "phases": "{}".format(phases)
+        })
+        if n % 50 == 0:
+            mrid_map["_{:08X}-1111-4000-8000-{:012X}".format(n, n)] = {
+                "name": "cap_{}".format(n), "phases": "{}".format("ABC"), "total_phases": "{}".format("ABC"),
+                "type": "{}".format("capacitor")
+            }
+    return property_map, mrid_map
+
+
+def benchmark(measurement_count):
+    """Compare the memory of the dict maps and the compact maps for a synthetic feeder.
+
+    Function returns:
+        A dict of byte counts.
+    """
+    property_map, mrid_map = _synthetic_maps(measurement_count)
+    dict_bytes = _deep_sizeof((property_map, mrid_map))
+    handle, path = tempfile.mkstemp(suffix='.omap')
+    os.close(handle)
+    try:
+        write_compact_object_map(path, property_map, mrid_map)
+        compact_map = CompactObjectMap(path)
+        compact_bytes = _deep_sizeof((compact_map.strings, compact_map.measurements._rows))
+        file_bytes = os.path.getsize(path)
+    finally:
+        os.remove(path)
+    return {
+        'measurements': measurement_count,
+        'dict_bytes': dict_bytes,
+        'compact_process_bytes': compact_bytes,
+        'compact_shared_file_bytes': file_bytes
+    }
+
+
+def _get_opts():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--measurements", type=int, default=100000, help="Measurements in the synthetic feeder.")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    opts = _get_opts()
+    result = benchmark(opts.measurements)
+    print('{measurements} measurements: dict maps {dict_bytes} bytes, compact maps {compact_process_bytes} bytes '
+          'per process plus a {compact_shared_file_bytes} byte shared file'.format(**result))
@@ -0,0 +1,125 @@
+import json
+import sys
+import threading
+
+import mock
+from mock import patch
+
+from service import fncs_goss_bridge_pool as pool
+
+simulation_request = {"simulation_config": {"run_realtime": True, "duration": 10}}
+
+
+class FakeConnection(object):
+    """A STOMP connection whose pool control queue is served by a scripted worker."""
+
+    def __init__(self, worker):
+        self.worker = worker
+        self.listener = None
+        self.sent = []
+
+    def set_listener(self, name, listener):
+        self.listener = listener
+
+    def start(self):
+        pass
+
+    def connect(self, *args, **kwargs):
+        pass
+
+    def subscribe(self, *args, **kwargs):
+        pass
+
+    def is_connected(self):
+        return True
+
+    def disconnect(self):
+        pass
+
+    def send(self, destination, body, headers=None):
+        self.sent.append((destination, json.loads(body)))
+        if destination == pool.pool_control_queue:
+            thread = threading.Thread(target=self.worker, args=(self, headers['reply-to']))
+            thread.daemon = True
+            thread.start()
+
+    def reply(self, reply_to, status):
+        self.listener.on_message({'destination': reply_to, 'reply-to': '/temp-queue/worker'},
+                                 json.dumps({'status': status}))
+
+    def answers(self):
+        return [body['status'] for destination, body in self.sent if destination == '/temp-queue/worker']
+
+
+def _dispatch(worker, accept_timeout=1.0, heartbeat_timeout=30.0):
+    connection = FakeConnection(worker)
+    with patch('stomp.Connection12', return_value=connection), patch.object(pool, 'heartbeat_interval', 0.05):
+        pool._dispatch('123', 'tcp://127.0.0.1:5570', '/tmp/sim/', simulation_request, accept_timeout,
+                       heartbeat_timeout)
+    return connection
+
+
+def test_dispatch_confirms_the_accepting_worker():
+    def worker(connection, reply_to):
+        connection.reply(reply_to, 'accepted')
+        connection.reply(reply_to, 'alive')
+        connection.reply(reply_to, 'finished')
+
+    connection = _dispatch(worker)
+    assert connection.answers() == ['confirmed']
+
+
+def test_dispatch_confirms_only_one_worker():
+    def worker(connection, reply_to):
+        connection.reply(reply_to, 'accepted')
+        connection.reply(reply_to, 'accepted')
+        connection.reply(reply_to, 'finished')
+
+    connection = _dispatch(worker)
+    assert connection.answers() == ['confirmed', 'rejected']
+
+
+def test_dispatch_reports_a_silent_worker():
+    def worker(connection, reply_to):
+        connection.reply(reply_to, 'accepted')
+
+    with patch.object(pool, '_report_worker_lost') as report:
+        _dispatch(worker, heartbeat_timeout=0.2)
+    assert report.call_count == 1
+    assert report.call_args[0][0] == '123'
+
+
+def test_dispatch_rejects_a_late_worker():
+    bridge = mock.Mock()
+    accepted_late = threading.Event()
+
+    def worker(connection, reply_to):
+        pass
+
+    def run_bridge(*args):
+        # The worker's acceptance arrives only after the dispatcher started the bridge itself.
+        connection.reply(reply_to[0], 'accepted')
+        accepted_late.set()
+
+    bridge._main.side_effect = run_bridge
+    connection = FakeConnection(worker)
+    reply_to = []
+    connection.worker = lambda conn, queue: reply_to.append(queue)
+    with patch('stomp.Connection12', return_value=connection), patch.dict(sys.modules, {'fncs_goss_bridge': bridge}):
+        pool._dispatch('123', 'tcp://127.0.0.1:5570', '/tmp/sim/', simulation_request, 0.1, 30.0)
+    assert accepted_late.is_set()
+    assert bridge._main.call_count == 1
+    assert connection.answers() == ['rejected']
+
+
+def test_report_worker_lost_sends_simulation_finished():
+    from service import fncs_goss_bridge as bridge
+    connection = mock.Mock()
+    with patch.dict(sys.modules, {'fncs_goss_bridge': bridge}), \
+            patch.object(bridge, 'debugFile'), patch.object(bridge, '_send_simulation_status') as send_status:
+        pool._report_worker_lost('123', connection, 'worker lost')
+    send_status.assert_called_once_with('ERROR', 'worker lost', 'ERROR')
+    connection.send.assert_called_once_with(
+        bridge.output_to_simulation_manager,
+        json.dumps({'command': 'simulationFinished', 'simulation_id': '123'}))
+    assert connection.disconnect.called
@@ -0,0 +1,58 @@
+import json
+
+import mock
+from mock import patch
+
+from service import fncs_goss_bridge as bridge
+
+
+def _run(listener, done_with_time_step=None):
+    """Run a simulation against mocked GOSS and FNCS connections and return the mocks."""
+    connection = mock.Mock()
+    with patch.object(bridge, 'goss_connection', connection, create=True), \
+            patch.object(bridge, 'simulation_id', '123', create=True), \
+            patch.object(bridge, 'fncs') as fncs, \
+            patch.object(bridge, '_get_fncs_bus_messages', return_value={}), \
+            patch.object(bridge, '_open_measurement_ring', return_value=None), \
+            patch.object(bridge, '_done_with_time_step', side_effect=done_with_time_step), \
+            patch.object(bridge, '_send_simulation_status') as send_status:
+        fncs.is_initialized.return_value = True
+        listener.run_simulation(False)
+    return connection, send_status
+
+
+def _simulation_finished(connection):
+    return [json.loads(args[1]) for args, kwargs in connection.send.call_args_list
+            if args[0] == bridge.output_to_simulation_manager]
+
+
+def _statuses(send_status):
+    return [args[0] for args, kwargs in send_status.call_args_list]
+
+
+def test_run_simulation_finishes_at_end_of_duration():
+    connection, send_status = _run(bridge.GOSSListener(3))
+    assert _simulation_finished(connection) == [{'command': 'simulationFinished', 'simulation_id': '123'}]
+    assert 'COMPLETE' in _statuses(send_status)
+
+
+def test_run_simulation_stopped_mid_run_sends_simulation_finished():
+    listener = bridge.GOSSListener(10)
+
+    def stop_after_step(current_time):
+        if current_time == 2:
+            listener.stop_simulation = True
+
+    connection, send_status = _run(listener, stop_after_step)
+    assert _simulation_finished(connection) == [{'command': 'simulationFinished', 'simulation_id': '123'}]
+    assert 'COMPLETE' not in _statuses(send_status)
+
+
+def test_run_simulation_error_sends_simulation_finished():
+    def fail(current_time):
+        raise RuntimeError('fncs went away')
+
+    connection, send_status = _run(bridge.GOSSListener(10), fail)
+    assert _simulation_finished(connection) == [{'command': 'simulationFinished', 'simulation_id': '123'}]
+    assert 'ERROR' in _statuses(send_status)
+    assert 'COMPLETE' not in _statuses(send_status)
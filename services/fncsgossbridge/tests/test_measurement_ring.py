@@ -0,0 +1,52 @@
+import math
+
+import pytest
+
+numpy = pytest.importorskip("numpy")
+
+from service.measurement_ring import MeasurementRingReader, MeasurementRingWriter
+
+
+def _measurements(step):
+    return [
+        {"measurement_mrid": "_m1", "magnitude": 100.0 + step, "angle": -30.0},
+        {"measurement_mrid": "_m3", "value": step},
+        {"measurement_mrid": "_not_in_ring", "value": 1}
+    ]
+
+
+def test_reader_sees_written_steps(tmpdir):
+    ring_file = str(tmpdir.join("1234.ring"))
+    writer = MeasurementRingWriter(ring_file, ["_m1", "_m2", "_m3"], slot_count=4)
+    reader = MeasurementRingReader(ring_file)
+    assert reader.mrids == ["_m1", "_m2", "_m3"]
+    assert reader.sequence == 0
+    assert reader.latest() == []
+
+    writer.write(1500000000, _measurements(1))
+    step = reader.latest()[0]
+    assert step.sequence == 1
+    assert step.timestamp == 1500000000
+    assert step.magnitude[reader.column("_m1")] == 101.0
+    assert step.angle[reader.column("_m1")] == -30.0
+    assert step.value[reader.column("_m3")] == 1
+    assert math.isnan(step.magnitude[reader.column("_m2")])
+    assert step.is_valid()
+    writer.close()
+    reader.close()
+
+
+def test_reader_detects_overwritten_slots(tmpdir):
+    ring_file = str(tmpdir.join("1234.ring"))
+    writer = MeasurementRingWriter(ring_file, ["_m1", "_m3"], slot_count=4)
+    reader = MeasurementRingReader(ring_file)
+    writer.write(1, _measurements(1))
+    first = reader.step(1)
+    for step in range(2, 7):
+        writer.write(step, _measurements(step))
+    assert not first.is_valid()
+    assert reader.step(1) is None
+    assert [s.sequence for s in reader.latest(10)] == [4, 5, 6]
+    assert [s.timestamp for s in reader.latest(2)] == [5, 6]
+    writer.close()
+    reader.close()
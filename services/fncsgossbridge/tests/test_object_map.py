@@ -0,0 +1,55 @@
+from service.object_map import CompactObjectMap, MeasurementRecord, write_compact_object_map, EQUIPMENT_TYPES
+
+property_map = {
+    "cap_cap1": [
+        {"property": "shunt_A", "conducting_equipment_type": "LinearShuntCompensator_cap1",
+         "measurement_mrid": "_m1", "phases": "A"},
+        {"property": "voltage_A", "conducting_equipment_type": "LinearShuntCompensator_cap1",
+         "measurement_mrid": "_m2", "phases": "A"}
+    ],
+    "node_650": [
+        {"property": "voltage_B", "conducting_equipment_type": "PowerTransformer_xf1",
+         "measurement_mrid": "_m3", "phases": "B"}
+    ]
+}
+mrid_map = {
+    "_sw1": {"name": "sw1", "phases": "ABC", "total_phases": "ABC", "type": "switch"},
+    "_reg1": {"name": "reg1", "phases": "A", "total_phases": "AB", "type": "regulator"},
+    "_cap1": {"name": "cap1", "phases": None, "total_phases": None, "type": "capacitor"}
+}
+
+
+def test_compact_map_matches_dict_maps(tmpdir):
+    map_file = str(tmpdir.join("model.omap"))
+    write_compact_object_map(map_file, property_map, mrid_map)
+    compact_map = CompactObjectMap(map_file)
+
+    measurements = compact_map.measurements
+    assert sorted(measurements.keys()) == sorted(property_map.keys())
+    for object_name, expected in property_map.items():
+        records = measurements[object_name]
+        assert all(isinstance(r, MeasurementRecord) for r in records)
+        assert [dict((k, r[k]) for k in e) for r, e in zip(records, expected)] == expected
+    assert EQUIPMENT_TYPES[measurements["node_650"][0].equipment_code] == "PowerTransformer"
+    assert "missing" not in measurements
+
+    objects = compact_map.objects
+    assert len(objects) == 3
+    for mrid, expected in mrid_map.items():
+        assert objects[mrid].as_dict() == expected
+        assert objects.get(mrid).get("name") == expected["name"]
+    assert objects.get("_missing") is None
+    # Strings are stored once no matter how many records use them.
+    assert compact_map.strings.count("LinearShuntCompensator_cap1") == 1
+
+
+def test_measurement_lookups_reuse_decoded_records(tmpdir):
+    map_file = str(tmpdir.join("model.omap"))
+    write_compact_object_map(map_file, property_map, mrid_map)
+    measurements = CompactObjectMap(map_file).measurements
+
+    records = measurements["cap_cap1"]
+    assert measurements["cap_cap1"] is records
+    assert measurements.get("cap_cap1") is records
+    assert sorted(measurements) == sorted(property_map.keys())
+    assert [EQUIPMENT_TYPES[r.equipment_code] for r in records] == ["LinearShuntCompensator"] * 2